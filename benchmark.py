@@ -0,0 +1,638 @@
+# ベンチマーク
+# ルール, 盤面の描画, 履歴, データベース, 観戦の復元, 起動の各処理の時間を計り, 基準の結果と比べる.
+# 対局は乱数の種を固定して作った同じ棋譜を使い, 計測中はガベージコレクションを止めるので, 同じ環境では同じ条件で計れる.
+# tkinter の画面やデータベースが使えない環境では, それらを必要とするベンチマークを飛ばす.
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from bitboard import legal_moves, play, iter_squares, to_coordinate, INITIAL_BLACK, INITIAL_WHITE
+
+
+DEFAULT_REPEATS = 7
+DEFAULT_THRESHOLD = .1     # 基準より中央値がこの割合を超えて遅くなったら劣化とみなす
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+BOARD_DISPLAY_SIZE = (480, 480)
+MANAGER_DISPLAY_SIZE = (240, 480)
+GRID_WIDTH = 5
+HISTORY_APPEND_COUNT = 1000
+RULES_GAME_COUNT = 20
+STARTUP_TIMEOUT = 60
+MICRO = "micro"
+MACRO = "macro"
+
+# 起動のベンチマークで子プロセスが実行するスクリプト.
+# `mainloop` に入った時点で保留中の描画を済ませて経過時間を出力し, ウィンドウを閉じる.
+# X11 の Tk には "zoomed" 状態がないので, 代わりに "-zoomed" 属性で最大化する
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import tkinter
+state = tkinter.Wm.wm_state
+def zoom(self, newstate=None):
+    if newstate == "zoomed" and self._windowingsystem == "x11":
+        return self.attributes("-zoomed", True)
+    return state(self, newstate)
+tkinter.Tk.state = tkinter.Tk.wm_state = zoom
+def mainloop(self, n=0):
+    self.update()
+    print(time.perf_counter() - start)
+    self.destroy()
+tkinter.Tk.mainloop = mainloop
+import othello
+othello.main()
+"""
+
+
+@dataclass
+class Case:
+    """1つのベンチマークで計測する処理を保持するデータクラス
+
+    Attributes:
+        run(Callable[[], None]): 計測する処理
+        operations(int): `run` 1回あたりの操作の数. 結果は1操作あたりの時間で表す
+        prepare(Callable[[], None] | None): `run` の前に毎回呼ぶ, 計測しない準備の処理
+        cleanup(Callable[[], None] | None): 全ての計測のあとに呼ぶ後始末の処理"""
+    run: Callable[[], None]
+    operations: int = 1
+    prepare: Callable[[], None] | None = None
+    cleanup: Callable[[], None] | None = None
+
+
+@dataclass
+class Benchmark:
+    """ベンチマークを保持するデータクラス
+
+    Attributes:
+        name(str): ベンチマークの名前
+        group(str): `MICRO` か `MACRO`
+        requires(tuple[str, ...]): 必要な環境. `"tk"`, `"database"`, `"display"` を指定できる
+        create_case(Callable[[BenchmarkContext], Case]): 計測する処理を作成する関数"""
+    name: str
+    group: str
+    requires: tuple[str, ...]
+    create_case: Callable[[BenchmarkContext], Case]
+
+
+@dataclass
+class BenchmarkResult:
+    """ベンチマークの結果を保持するデータクラス
+
+    Attributes:
+        name(str): ベンチマークの名前
+        samples(list[float]): 計測ごとの1操作あたりの秒数
+        operations(int): 1回の計測あたりの操作の数
+        skipped(str | None): 計測しなかったときの理由"""
+    name: str
+    samples: list[float] = field(default_factory=list)
+    operations: int = 1
+    skipped: str | None = None
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.samples)
+
+    @property
+    def minimum(self) -> float:
+        return min(self.samples)
+
+    def to_dict(self) -> dict:
+        return {"median": self.median, "min": self.minimum, "operations": self.operations}
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def register(name: str, group: str, requires: tuple[str, ...] = ()):
+    """ベンチマークを登録するデコレータ
+
+    Args:
+        name(str): ベンチマークの名前
+        group(str): `MICRO` か `MACRO`
+        requires(tuple[str, ...], optional): 必要な環境. default to ()."""
+    def decorator(create_case: Callable[[BenchmarkContext], Case]) -> Callable[[BenchmarkContext], Case]:
+        BENCHMARKS[name] = Benchmark(name, group, requires, create_case)
+        return create_case
+    return decorator
+
+
+class BenchmarkContext:
+    """ベンチマークの間で共有する資源を保持するクラス
+
+    tkinter のルートウィンドウとデータベースへの接続は, 最初に必要になったときに作成する."""
+
+    def __init__(self):
+        self.__root = None
+        self.__unavailable: dict[str, str] = {}
+
+    @property
+    def root(self):
+        """画面に表示しないルートウィンドウ"""
+        if self.__root is None:
+            import tkinter
+            self.__root = tkinter.Tk()
+            self.__root.withdraw()
+        return self.__root
+
+    def check(self, requirement: str) -> str | None:
+        """環境が使えるかを確認するメソッド
+
+        Args:
+            requirement(str): 確認する環境
+
+        Returns:
+            str | None: 使えないときはその理由. 使えるときは `None`"""
+        if requirement in self.__unavailable:
+            return self.__unavailable[requirement]
+        reason = None
+        try:
+            if requirement == "tk":
+                self.root
+            elif requirement == "database":
+                from history import DBController
+                DBController.initialize()
+            elif requirement == "display":
+                if not os.environ.get("DISPLAY") and shutil.which("xvfb-run") is None:
+                    reason = "no DISPLAY and xvfb-run is not installed"
+            else:
+                reason = f"unknown requirement {requirement!r}"
+        except Exception as error:
+            reason = f"{requirement} unavailable: {error}"
+        self.__unavailable[requirement] = reason
+        return reason
+
+    def destroy(self):
+        """作成した資源を解放するメソッド"""
+        if self.__root is not None:
+            self.__root.destroy()
+            self.__root = None
+
+
+def benchmark_game(seed: int = 0) -> list[tuple[int, int]]:
+    """ベンチマークに使う棋譜を返す関数
+
+    パスのカットインは時間を計る対象ではないので, `seed` から順に種を試し, パスが起こらずに終局する最初の対局を使う.
+
+    Returns:
+        list[tuple[int, int]]: 着手の座標の並び"""
+    while True:
+        generator = random.Random(seed)
+        player, opponent = INITIAL_BLACK, INITIAL_WHITE
+        coordinates = []
+        while True:
+            moves = legal_moves(player, opponent)
+            if moves == 0:
+                break
+            move = generator.choice(list(iter_squares(moves)))
+            player, opponent = play(player, opponent, move)
+            coordinates.append(to_coordinate(move))
+        if legal_moves(opponent, player) == 0:
+            return coordinates
+        seed += 1
+
+
+def _create_game_manager(context: BenchmarkContext):
+    """人間同士の対局の `GameManager` を作成する関数
+
+    背景で動く完全読みは計測の邪魔になるので行わない."""
+    from objects import OthelloBoard
+    from game_manager import GameManager
+    from systems import OthelloPlayer, Color
+    from endgame import EndgameSolver
+
+    board = OthelloBoard(context.root, BOARD_DISPLAY_SIZE, GRID_WIDTH)
+    manager = GameManager(board, (OthelloPlayer(Color.BLACK, "先手"), OthelloPlayer(Color.WHITE, "後手")))
+    manager.create_manager_display(context.root, MANAGER_DISPLAY_SIZE)
+    manager.endgame_solver = EndgameSolver(0)
+    manager.is_hint_visible = False
+    return manager
+
+
+def _play_moves(manager, coordinates: list[tuple[int, int]]):
+    """`GameManager.put_stone` で棋譜どおりに石を置く関数"""
+    from objects import Stone
+
+    for coordinate in coordinates:
+        manager.put_stone(Stone(manager.turn_player.color), coordinate)
+
+
+def _create_history(context: BenchmarkContext):
+    """ベンチマークの棋譜の `History` を作成する関数. 盤面は `GameManager` で実際に打って記録する"""
+    manager = _create_game_manager(context)
+    manager.start_new_game()
+    _play_moves(manager, benchmark_game()[:-1])
+    manager.history.append(manager.othello_board.board, manager.turn_player)
+    manager.executor.shutdown()
+    return manager.history
+
+
+@register("bitboard.legal_moves+play", MICRO)
+def bench_bitboard_rules(context: BenchmarkContext) -> Case:
+    """ビットボードで対局を最後まで進める. 探索エンジンと自己対戦の土台"""
+    games = [benchmark_game(seed) for seed in range(RULES_GAME_COUNT)]
+    moves = [[y * 8 + x for x, y in game] for game in games]
+
+    def run():
+        for game in moves:
+            player, opponent = INITIAL_BLACK, INITIAL_WHITE
+            for move in game:
+                legal_moves(player, opponent)
+                player, opponent = play(player, opponent, move)
+
+    return Case(run, sum(len(game) for game in moves))
+
+
+@register("Board.put", MICRO, ("tk",))
+def bench_board_put(context: BenchmarkContext) -> Case:
+    """全てのマスに石を置き直す"""
+    from objects import OthelloBoard, Stone
+    from systems import Color
+
+    board = OthelloBoard(context.root, BOARD_DISPLAY_SIZE, GRID_WIDTH)
+    stones = [Stone(Color.BLACK if (x + y) % 2 else Color.WHITE) for y in range(8) for x in range(8)]
+
+    def run():
+        for index, stone in enumerate(stones):
+            board.put(stone, (index % 8, index // 8))
+
+    return Case(run, len(stones), cleanup=board.destroy)
+
+
+@register("Board.take_all_pieces", MICRO, ("tk",))
+def bench_board_take_all_pieces(context: BenchmarkContext) -> Case:
+    """石で埋まった盤面から全ての石を取り除く"""
+    from objects import OthelloBoard, Stone
+    from systems import Color
+
+    board = OthelloBoard(context.root, BOARD_DISPLAY_SIZE, GRID_WIDTH)
+
+    def prepare():
+        for index in range(64):
+            board.put(Stone(Color.BLACK if index % 2 else Color.WHITE), (index % 8, index // 8))
+
+    return Case(board.take_all_pieces, prepare=prepare, cleanup=board.destroy)
+
+
+@register("GameManager.put_stone", MICRO, ("tk",))
+def bench_put_stone(context: BenchmarkContext) -> Case:
+    """1手ごとの `put_stone` (石を返し, `change_turn` で置けるマスを探してタイルを置き直す)"""
+    manager = _create_game_manager(context)
+    coordinates = benchmark_game()[:-1]     # 最後の手で終局すると履歴を保存しようとするので打たない
+
+    return Case(
+        lambda: _play_moves(manager, coordinates),
+        len(coordinates),
+        prepare=manager.start_new_game,
+        cleanup=manager.executor.shutdown,
+    )
+
+
+@register("GameManager.change_turn", MICRO, ("tk",))
+def bench_change_turn(context: BenchmarkContext) -> Case:
+    """中盤の局面で `change_turn` を2回呼び, 手番を元に戻す"""
+    manager = _create_game_manager(context)
+    manager.start_new_game()
+    _play_moves(manager, benchmark_game()[:30])
+
+    def run():
+        manager.change_turn()
+        manager.change_turn()
+
+    return Case(run, 2, cleanup=manager.executor.shutdown)
+
+
+@register("GameManager.game", MACRO, ("tk",))
+def bench_game(context: BenchmarkContext) -> Case:
+    """新しいゲームを始めて, 終局の直前まで打つ"""
+    manager = _create_game_manager(context)
+    coordinates = benchmark_game()[:-1]
+
+    def run():
+        manager.start_new_game()
+        _play_moves(manager, coordinates)
+
+    return Case(run, cleanup=manager.executor.shutdown)
+
+
+@register("History.append", MICRO, ("tk",))
+def bench_history_append(context: BenchmarkContext) -> Case:
+    """盤面とターンプレイヤーを履歴に追加する"""
+    from history import History
+
+    manager = _create_game_manager(context)
+    manager.start_new_game()
+    board = manager.othello_board.board
+    player = manager.turn_player
+    manager.executor.shutdown()
+
+    def run():
+        history = History()
+        for _ in range(HISTORY_APPEND_COUNT):
+            history.append(board, player)
+
+    return Case(run, HISTORY_APPEND_COUNT)
+
+
+@register("DBController.save", MACRO, ("tk", "database"))
+def bench_db_save(context: BenchmarkContext) -> Case:
+    """1局分の履歴をデータベースに保存する. 1行あたりの時間を計る. 保存した履歴は最後に削除する"""
+    from history import DBController
+
+    history = _create_history(context)
+    saved: list[str] = []
+
+    def prepare():
+        # 差分だけの保存にならないよう, 毎回新しい履歴として保存する
+        history.uuid = str(uuid.uuid4())
+        history.saved_scene_count = history.clean_scene_count = 0
+        history.saved_is_finished = None
+        history.storage_format = None
+        saved.append(history.uuid)
+
+    def cleanup():
+        for saved_uuid in saved:
+            DBController.delete(uuid.UUID(saved_uuid).bytes)
+
+    return Case(lambda: DBController.save(history), len(history), prepare=prepare, cleanup=cleanup)
+
+
+@register("DBController.restore", MACRO, ("tk", "database"))
+def bench_db_restore(context: BenchmarkContext) -> Case:
+    """1局分の履歴をデータベースから復元する. 保持している履歴は使わない"""
+    from history import DBController
+
+    history = _create_history(context)
+    DBController.save(history)
+    uuid_bytes = uuid.UUID(history.uuid).bytes
+
+    return Case(
+        lambda: DBController.restore(uuid_bytes),
+        prepare=DBController.cache.clear,
+        cleanup=lambda: DBController.delete(uuid_bytes),
+    )
+
+
+@register("DBController.restore (cached)", MACRO, ("tk", "database"))
+def bench_db_restore_cached(context: BenchmarkContext) -> Case:
+    """直前に復元した1局分の履歴を, 保持している履歴から復元する"""
+    from history import DBController
+
+    history = _create_history(context)
+    DBController.save(history)
+    uuid_bytes = uuid.UUID(history.uuid).bytes
+    DBController.restore(uuid_bytes)
+
+    return Case(lambda: DBController.restore(uuid_bytes), cleanup=lambda: DBController.delete(uuid_bytes))
+
+
+def _benchmark_scene_records() -> list[tuple[list, str]]:
+    """ベンチマークの棋譜のシーンを, `HistoryRecord` の形でビットボードから作成する関数"""
+    from bitboard import to_names
+
+    player, opponent = INITIAL_BLACK, INITIAL_WHITE
+    turn, other = "BLACK", "WHITE"
+    scenes = []
+    for x, y in benchmark_game():
+        black, white = (player, opponent) if turn == "BLACK" else (opponent, player)
+        scenes.append((to_names(black, white), turn))
+        player, opponent = play(player, opponent, y * 8 + x)
+        turn, other = other, turn
+    black, white = (player, opponent) if turn == "BLACK" else (opponent, player)
+    scenes.append((to_names(black, white), turn))
+    return scenes
+
+
+def _open_temporary_sqlite() -> tuple[object, Callable[[], None]]:
+    """一時ディレクトリに SQLite の保存先を開く関数. 閉じて削除する関数とともに返す"""
+    from storage import SQLiteStorage
+
+    directory = tempfile.TemporaryDirectory()
+    sqlite_storage = SQLiteStorage(os.path.join(directory.name, "benchmark.sqlite3"))
+
+    def cleanup():
+        sqlite_storage.close()
+        directory.cleanup()
+
+    return sqlite_storage, cleanup
+
+
+@register("SQLiteStorage.save", MACRO)
+def bench_sqlite_save(context: BenchmarkContext) -> Case:
+    """1局分の履歴をシーンごとの形式で SQLite に保存する. 1行あたりの時間を計る. MySQL のサーバーはいらない"""
+    from storage import HistoryRecord, SCENES_FORMAT
+
+    sqlite_storage, cleanup = _open_temporary_sqlite()
+    record = HistoryRecord("", "benchmark", True, _benchmark_scene_records(), SCENES_FORMAT)
+
+    def prepare():
+        # 差分だけの保存にならないよう, 毎回新しい履歴として保存する
+        record.uuid = str(uuid.uuid4())
+        record.saved_scene_count = record.clean_scene_count = 0
+        record.saved_is_finished = None
+
+    return Case(lambda: sqlite_storage.save(record), len(record.scenes), prepare=prepare, cleanup=cleanup)
+
+
+@register("SQLiteStorage.load", MACRO)
+def bench_sqlite_load(context: BenchmarkContext) -> Case:
+    """手の並びで保存した1局分の履歴を SQLite から読み込む"""
+    from storage import HistoryRecord, MOVES_FORMAT
+
+    sqlite_storage, cleanup = _open_temporary_sqlite()
+    record = HistoryRecord(str(uuid.uuid4()), "benchmark", True, _benchmark_scene_records(), MOVES_FORMAT)
+    sqlite_storage.save(record)
+    uuid_bytes = uuid.UUID(record.uuid).bytes
+
+    return Case(lambda: sqlite_storage.load(uuid_bytes), cleanup=cleanup)
+
+
+@register("SpectatingManager.restore_scene", MICRO, ("tk",))
+def bench_restore_scene(context: BenchmarkContext) -> Case:
+    """観戦モードで最初から最後まで1ターンずつ盤面を復元する"""
+    from objects import OthelloBoard
+    from game_manager import SpectatingManager
+
+    history = _create_history(context)
+    board = OthelloBoard(context.root, BOARD_DISPLAY_SIZE, GRID_WIDTH)
+    manager = SpectatingManager(board)
+    manager.create_manager_display(context.root, MANAGER_DISPLAY_SIZE)
+    manager.create_game(history)
+
+    def run():
+        for turn_index in range(len(history)):
+            manager.restore_scene(turn_index)
+
+    return Case(run, len(history), prepare=lambda: manager.restore_scene(0), cleanup=board.destroy)
+
+
+@register("othello.main startup", MACRO, ("display",))
+def bench_startup(context: BenchmarkContext) -> Case:
+    """`othello.main` を別プロセスで起動し, イベントループに入るまでの時間. 画面がなければ仮想Xサーバーを使う"""
+    command = [sys.executable, "-c", STARTUP_SCRIPT]
+    if not os.environ.get("DISPLAY"):
+        command = ["xvfb-run", "-a"] + command
+
+    def run():
+        subprocess.run(command, check=True, capture_output=True, timeout=STARTUP_TIMEOUT)
+
+    return Case(run)
+
+
+def run_benchmark(benchmark: Benchmark, context: BenchmarkContext, repeats: int) -> BenchmarkResult:
+    """ベンチマークを計測する関数
+
+    1回目は計測せずに実行し, そのあと `repeats` 回計測する.
+
+    Args:
+        benchmark(Benchmark): ベンチマーク
+        context(BenchmarkContext): 共有する資源
+        repeats(int): 計測する回数
+
+    Returns:
+        BenchmarkResult: 結果"""
+    result = BenchmarkResult(benchmark.name)
+    for requirement in benchmark.requires:
+        reason = context.check(requirement)
+        if reason is not None:
+            result.skipped = reason
+            return result
+    try:
+        case = benchmark.create_case(context)
+    except ImportError as error:
+        result.skipped = f"import failed: {error}"
+        return result
+    result.operations = case.operations
+    try:
+        for repeat in range(repeats + 1):
+            if case.prepare is not None:
+                case.prepare()
+            is_gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                case.run()
+                elapsed = time.perf_counter() - start
+            finally:
+                if is_gc_enabled:
+                    gc.enable()
+            if repeat > 0:
+                result.samples.append(elapsed / case.operations)
+    finally:
+        if case.cleanup is not None:
+            case.cleanup()
+    return result
+
+
+def format_seconds(seconds: float) -> str:
+    """秒数を読みやすい単位の文字列に変換する関数"""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+def compare(results: list[BenchmarkResult], baseline: dict, threshold: float) -> list[str]:
+    """結果を基準と比べ, 劣化したベンチマークの名前を返す関数
+
+    Args:
+        results(list[BenchmarkResult]): 結果
+        baseline(dict): `save_results` で保存した基準
+        threshold(float): 中央値がこの割合を超えて遅くなったら劣化とみなす
+
+    Returns:
+        list[str]: 劣化したベンチマークの名前"""
+    regressions = []
+    for result in results:
+        expected = baseline["results"].get(result.name)
+        if result.skipped is not None or expected is None:
+            continue
+        ratio = result.median / expected["median"]
+        is_regression = ratio > 1 + threshold
+        print(f"  {result.name}: {ratio:.2f}x baseline{' REGRESSION' if is_regression else ''}")
+        if is_regression:
+            regressions.append(result.name)
+    return regressions
+
+
+def save_results(path: str, results: list[BenchmarkResult], repeats: int):
+    """結果を基準としてJSONファイルに保存する関数"""
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeats": repeats,
+        "results": {result.name: result.to_dict() for result in results if result.skipped is None},
+    }
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2, ensure_ascii=False)
+
+
+def main():
+    """ベンチマークを計測し, 基準と比べるコマンド
+
+    基準より劣化したベンチマークがあったときは終了コード1で終わる."""
+    parser = argparse.ArgumentParser(description="ルール, 描画, 履歴, データベース, 起動の処理時間を計測する")
+    parser.add_argument("--group", choices=(MICRO, MACRO), default=None, help="計測するベンチマークの種類")
+    parser.add_argument("--filter", default=None, help="名前にこの文字列を含むベンチマークだけを計測する")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="計測する回数")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE_PATH, default=None, help="結果を基準として保存するパス")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE_PATH, default=None, help="比べる基準のパス")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="劣化とみなす遅くなった割合")
+    parser.add_argument("--list", action="store_true", help="ベンチマークの一覧を表示する")
+    args = parser.parse_args()
+
+    benchmarks = [
+        benchmark for benchmark in BENCHMARKS.values()
+        if (args.group is None or benchmark.group == args.group)
+        and (args.filter is None or args.filter in benchmark.name)
+    ]
+    if args.list:
+        for benchmark in benchmarks:
+            requires = f" (requires {', '.join(benchmark.requires)})" if benchmark.requires else ""
+            print(f"{benchmark.group} {benchmark.name}{requires}")
+        return
+
+    context = BenchmarkContext()
+    results = []
+    try:
+        for benchmark in benchmarks:
+            result = run_benchmark(benchmark, context, args.repeats)
+            results.append(result)
+            if result.skipped is not None:
+                print(f"{benchmark.group} {benchmark.name}: skipped ({result.skipped})")
+            else:
+                print(
+                    f"{benchmark.group} {benchmark.name}: median {format_seconds(result.median)} "
+                    f"min {format_seconds(result.minimum)} per op, {1 / result.median:.0f} ops/s "
+                    f"({result.operations} ops x {args.repeats})"
+                )
+    finally:
+        context.destroy()
+
+    regressions = []
+    if args.baseline is not None and os.path.exists(args.baseline):
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        print(f"compared with {args.baseline}:")
+        regressions = compare(results, baseline, args.threshold)
+    if args.save is not None:
+        save_results(args.save, results, args.repeats)
+        print(f"results saved to {args.save}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# 探索用の高速な盤面表現
+# 盤面を手番側と相手側の2つの64bit整数で表し, マス (x, y) はビット y * 8 + x に対応する.
+# tkinter に依存しないので, 別スレッドや別プロセスからも使用できる.
+from __future__ import annotations
+
+from typing import Iterator, Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+BOARD_LENGTH = 8
+SQUARE_COUNT = BOARD_LENGTH * BOARD_LENGTH
+FULL_MASK = 0xFFFF_FFFF_FFFF_FFFF
+NOT_A_FILE = 0xFEFE_FEFE_FEFE_FEFE     # x == 0 の列を除くマスク
+NOT_H_FILE = 0x7F7F_7F7F_7F7F_7F7F     # x == 7 の列を除くマスク
+
+PASS = -1
+
+# init_board と同じ初期配置
+INITIAL_BLACK = (1 << 28) | (1 << 35)
+INITIAL_WHITE = (1 << 27) | (1 << 36)
+
+SYMMETRY_COUNT = 8     # 盤面の対称変換(回転と反転)の数
+
+
+def _shift_east(b: int) -> int:
+    return (b << 1) & NOT_A_FILE & FULL_MASK
+
+def _shift_west(b: int) -> int:
+    return (b >> 1) & NOT_H_FILE
+
+def _shift_south(b: int) -> int:
+    return (b << 8) & FULL_MASK
+
+def _shift_north(b: int) -> int:
+    return b >> 8
+
+def _shift_south_east(b: int) -> int:
+    return (b << 9) & NOT_A_FILE & FULL_MASK
+
+def _shift_south_west(b: int) -> int:
+    return (b << 7) & NOT_H_FILE & FULL_MASK
+
+def _shift_north_east(b: int) -> int:
+    return (b >> 7) & NOT_A_FILE
+
+def _shift_north_west(b: int) -> int:
+    return (b >> 9) & NOT_H_FILE
+
+
+SHIFTS = (
+    _shift_east,
+    _shift_west,
+    _shift_south,
+    _shift_north,
+    _shift_south_east,
+    _shift_south_west,
+    _shift_north_east,
+    _shift_north_west,
+)
+
+
+def legal_moves(player: int, opponent: int) -> int:
+    """手番側が石を置けるマスを返す関数
+
+    Args:
+        player(int): 手番側の石
+        opponent(int): 相手側の石
+
+    Returns:
+        int: 置けるマスのビットを立てた整数"""
+    empty = ~(player | opponent) & FULL_MASK
+    moves = 0
+    for shift in SHIFTS:
+        x = shift(player) & opponent
+        x |= shift(x) & opponent
+        x |= shift(x) & opponent
+        x |= shift(x) & opponent
+        x |= shift(x) & opponent
+        x |= shift(x) & opponent
+        moves |= shift(x) & empty
+    return moves
+
+
+def flips(player: int, opponent: int, square: int) -> int:
+    """指定のマスに置いたときにひっくり返る石を返す関数
+
+    Args:
+        player(int): 手番側の石
+        opponent(int): 相手側の石
+        square(int): 石を置くマス
+
+    Returns:
+        int: ひっくり返る石のビットを立てた整数. 置けないときは `0`"""
+    move = 1 << square
+    flipped = 0
+    for shift in SHIFTS:
+        line = 0
+        x = shift(move)
+        while x & opponent:
+            line |= x
+            x = shift(x)
+        if x & player:
+            flipped |= line
+    return flipped
+
+
+def play(player: int, opponent: int, square: int) -> tuple[int, int]:
+    """石を置いたあとの局面を, 次の手番側から見た形で返す関数
+
+    `square` に `PASS` を渡すと, 手番だけを交代する.
+
+    Returns:
+        tuple[int, int]: 次の手番側の石と, その相手側の石"""
+    if square == PASS:
+        return opponent, player
+    flipped = flips(player, opponent, square)
+    return opponent & ~flipped, player | flipped | (1 << square)
+
+
+def iter_squares(bits: int) -> Iterator[int]:
+    """立っているビットのマスを小さい順に返すジェネレータ"""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def count(bits: int) -> int:
+    """立っているビットの数を返す関数"""
+    return bits.bit_count()
+
+
+def to_coordinate(square: int) -> tuple[int, int]:
+    """マスの番号を盤面の座標に変換する関数"""
+    return square % BOARD_LENGTH, square // BOARD_LENGTH
+
+
+def to_square(coordinate: Sequence[int]) -> int:
+    """盤面の座標をマスの番号に変換する関数"""
+    x, y = coordinate
+    return y * BOARD_LENGTH + x
+
+
+def to_notation(square: int) -> str:
+    """マスの番号を棋譜の表記("a1" から "h8". 列が英字, 行が数字)に変換する関数"""
+    x, y = to_coordinate(square)
+    return "abcdefgh"[x] + str(y + 1)
+
+
+def from_notation(notation: str) -> int:
+    """棋譜の表記("a1" から "h8")をマスの番号に変換する関数
+
+    Raises:
+        ValueError: 表記が正しくないときに生じる"""
+    if len(notation) != 2 or notation[0].lower() not in "abcdefgh" or notation[1] not in "12345678":
+        raise ValueError(f"invalid square notation: {notation!r}")
+    return to_square(("abcdefgh".index(notation[0].lower()), int(notation[1]) - 1))
+
+
+def from_names(rows: Sequence[Sequence[str | None]]) -> tuple[int, int]:
+    """色の名前("BLACK" / "WHITE")の二次元リストから黒と白の石を作成する関数
+
+    Returns:
+        tuple[int, int]: 黒の石と白の石"""
+    black = white = 0
+    for y, row in enumerate(rows):
+        for x, name in enumerate(row):
+            if name == "BLACK":
+                black |= 1 << (y * BOARD_LENGTH + x)
+            elif name == "WHITE":
+                white |= 1 << (y * BOARD_LENGTH + x)
+    return black, white
+
+
+def from_board(board: Sequence[Sequence[object | None]]) -> tuple[int, int]:
+    """`Stone` か `None` を保持する二次元リストから黒と白の石を作成する関数
+
+    Returns:
+        tuple[int, int]: 黒の石と白の石"""
+    return from_names([[None if stone is None else stone.color.name for stone in row] for row in board])
+
+
+def to_names(black: int, white: int) -> list[list[str | None]]:
+    """黒と白の石から色の名前の二次元リストを作成する関数"""
+    rows = []
+    for y in range(BOARD_LENGTH):
+        row = []
+        for x in range(BOARD_LENGTH):
+            bit = 1 << (y * BOARD_LENGTH + x)
+            row.append("BLACK" if black & bit else "WHITE" if white & bit else None)
+        rows.append(row)
+    return rows
+
+
+_BYTE_REVERSED = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def flip_vertical(bits: int) -> int:
+    """盤面を上下に反転する関数"""
+    return int.from_bytes(bits.to_bytes(8, "little"), "big")
+
+
+def mirror_horizontal(bits: int) -> int:
+    """盤面を左右に反転する関数"""
+    return int.from_bytes(bits.to_bytes(8, "little").translate(_BYTE_REVERSED), "little")
+
+
+def transpose(bits: int) -> int:
+    """盤面を左上から右下への対角線で反転する関数"""
+    t = 0x0F0F_0F0F_0000_0000 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333_0000_3333_0000 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500_5500_5500_5500 & (bits ^ (bits << 7))
+    bits ^= t ^ (t >> 7)
+    return bits & FULL_MASK
+
+
+def transform(bits: int, symmetry: int) -> int:
+    """盤面に対称変換を施す関数
+
+    Args:
+        bits(int): 変換する盤面
+        symmetry(int): 0 から 7 までの変換の番号
+
+    Returns:
+        int: 変換した盤面"""
+    if symmetry & 1:
+        bits = flip_vertical(bits)
+    if symmetry & 2:
+        bits = mirror_horizontal(bits)
+    if symmetry & 4:
+        bits = transpose(bits)
+    return bits
+
+
+def inverse_transform(bits: int, symmetry: int) -> int:
+    """`transform` で施した対称変換を元に戻す関数"""
+    if symmetry & 4:
+        bits = transpose(bits)
+    if symmetry & 2:
+        bits = mirror_horizontal(bits)
+    if symmetry & 1:
+        bits = flip_vertical(bits)
+    return bits
+
+
+def transform_square(square: int, symmetry: int, inverse: bool = False) -> int:
+    """マスの番号に対称変換を施す関数"""
+    if square == PASS:
+        return PASS
+    convert = inverse_transform if inverse else transform
+    return convert(1 << square, symmetry).bit_length() - 1
+
+
+# 以下は NumPy の uint64 の配列で多数の盤面をまとめて扱う関数. NumPy がないときは使用できない
+
+def popcount_array(bits):
+    """`count` の配列版"""
+    return numpy.unpackbits(bits.view(numpy.uint8).reshape(-1, 8), axis=1).sum(axis=1, dtype=numpy.int64)
+
+
+def transpose_array(bits):
+    """`transpose` の配列版"""
+    for mask, shift in (
+        (0x0F0F_0F0F_0000_0000, 28),
+        (0x3333_0000_3333_0000, 14),
+        (0x5500_5500_5500_5500, 7),
+    ):
+        mask, shift = numpy.uint64(mask), numpy.uint64(shift)
+        t = mask & (bits ^ (bits << shift))
+        bits = bits ^ t ^ (t >> shift)
+    return bits
+
+
+def _array_shifts() -> tuple:
+    """`SHIFTS` の配列版"""
+    not_a_file = numpy.uint64(NOT_A_FILE)
+    not_h_file = numpy.uint64(NOT_H_FILE)
+    return (
+        lambda b: (b << numpy.uint64(1)) & not_a_file,
+        lambda b: (b >> numpy.uint64(1)) & not_h_file,
+        lambda b: b << numpy.uint64(8),
+        lambda b: b >> numpy.uint64(8),
+        lambda b: (b << numpy.uint64(9)) & not_a_file,
+        lambda b: (b << numpy.uint64(7)) & not_h_file,
+        lambda b: (b >> numpy.uint64(7)) & not_a_file,
+        lambda b: (b >> numpy.uint64(9)) & not_h_file,
+    )
+
+
+def legal_moves_array(players, opponents):
+    """`legal_moves` の配列版"""
+    empty = ~(players | opponents)
+    moves = numpy.zeros_like(players)
+    for shift in _array_shifts():
+        x = shift(players) & opponents
+        for _ in range(5):
+            x |= shift(x) & opponents
+        moves |= shift(x) & empty
+    return moves
+
+
+def flips_array(players, opponents, moves):
+    """`flips` の配列版. `moves` は置くマスのビットだけを立てた配列で, `0` の要素は置かないことを表す"""
+    zero = numpy.uint64(0)
+    flipped = numpy.zeros_like(players)
+    for shift in _array_shifts():
+        x = shift(moves) & opponents
+        for _ in range(5):
+            x |= shift(x) & opponents
+        flipped |= numpy.where(shift(x) & players != zero, x, zero)
+    return flipped
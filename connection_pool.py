@@ -0,0 +1,187 @@
+# データベース接続のプール
+# 接続を使い回し, しばらく使っていなかった接続は使う前に生きているかを確かめる.
+# 接続できないときは間隔を倍にしながら接続し直し, 操作の途中で接続が切れたときは新しい接続で1度だけやり直す.
+# 接続は1つの操作の間だけ1つのスレッドが使うので, 画面とバックグラウンドの処理が同時にデータベースを使用できる.
+# 特定のデータベースのライブラリには依存せず, 接続を作成する関数と, 切断による例外を判定する関数を受け取る.
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TypeVar
+import queue
+import threading
+import time
+
+
+DEFAULT_POOL_SIZE = 4
+HEALTH_CHECK_INTERVAL = 30.0     # この秒数より長く使っていなかった接続は, 使う前に生きているかを確かめる
+CONNECT_ATTEMPTS = 5
+INITIAL_BACKOFF = .2             # 接続し直すまでの最初の待ち時間(秒). 失敗するたびに倍にする
+MAX_BACKOFF = 5.0
+ACQUIRE_TIMEOUT = 30.0           # 空きの接続を待つ時間の上限(秒)
+
+T = TypeVar("T")
+
+
+class PoolTimeoutError(Exception):
+    """空きの接続を待つ時間が上限を超えたときに生じる例外"""
+
+    def __str__(self):
+        return "timed out waiting for a free database connection"
+
+
+class ConnectionPool:
+    """データベース接続のプール
+
+    Attributes:
+        size(int): 同時に使用できる接続の数の上限
+        health_check_interval(float): この秒数より長く使っていなかった接続は, 使う前に生きているかを確かめる"""
+
+    def __init__(
+            self,
+            connect: Callable[[], Any],
+            is_disconnect: Callable[[Exception], bool],
+            size: int = DEFAULT_POOL_SIZE,
+            health_check_interval: float = HEALTH_CHECK_INTERVAL,
+            connect_attempts: int = CONNECT_ATTEMPTS,
+            initial_backoff: float = INITIAL_BACKOFF,
+    ):
+        """
+        Args:
+            connect(Callable[[], Any]): 接続を作成する関数. 接続は `ping`, `rollback`, `close` メソッドを持つ
+            is_disconnect(Callable[[Exception], bool]): 例外が接続の切断によるものかを判定する関数
+            size(int, optional): 同時に使用できる接続の数の上限. default to DEFAULT_POOL_SIZE.
+            health_check_interval(float, optional): 生きているかを確かめる間隔(秒). default to HEALTH_CHECK_INTERVAL.
+            connect_attempts(int, optional): 1回の接続で試みる回数. default to CONNECT_ATTEMPTS.
+            initial_backoff(float, optional): 接続し直すまでの最初の待ち時間(秒). default to INITIAL_BACKOFF."""
+        self.size: int = size
+        self.health_check_interval: float = health_check_interval
+        self.__connect = connect
+        self.__is_disconnect = is_disconnect
+        self.__connect_attempts = connect_attempts
+        self.__initial_backoff = initial_backoff
+        self.__idle: queue.LifoQueue[tuple[Any, float]] = queue.LifoQueue()
+        self.__slots = threading.BoundedSemaphore(size)
+        self.__lock = threading.Lock()
+        self.__connections: set = set()
+        self.__is_closed = False
+
+    def __create(self) -> Any:
+        """接続を作成するメソッド. 失敗したときは待ち時間を倍にしながら試み直す"""
+        delay = self.__initial_backoff
+        for attempt in range(self.__connect_attempts):
+            try:
+                connection = self.__connect()
+            except Exception as error:
+                if attempt == self.__connect_attempts - 1 or not self.__is_disconnect(error):
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+            else:
+                with self.__lock:
+                    self.__connections.add(connection)
+                return connection
+
+    def __discard(self, connection: Any):
+        """壊れた接続を閉じて, プールから取り除くメソッド"""
+        with self.__lock:
+            self.__connections.discard(connection)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def __is_alive(self, connection: Any) -> bool:
+        try:
+            connection.ping()
+        except Exception as error:
+            if self.__is_disconnect(error):
+                return False
+            raise
+        return True
+
+    def __acquire(self) -> Any:
+        """空きの接続を取り出すメソッド. 空きがなければ作成する"""
+        if self.__is_closed:
+            raise RuntimeError("connection pool is closed")
+        if not self.__slots.acquire(timeout=ACQUIRE_TIMEOUT):
+            raise PoolTimeoutError()
+        try:
+            while True:
+                try:
+                    connection, released_at = self.__idle.get_nowait()
+                except queue.Empty:
+                    return self.__create()
+                if time.monotonic() - released_at <= self.health_check_interval:
+                    return connection
+                try:
+                    is_alive = self.__is_alive(connection)
+                except BaseException:
+                    # 切断以外の理由で確かめられなかった接続も, プールに戻さずに閉じる
+                    self.__discard(connection)
+                    raise
+                if is_alive:
+                    return connection
+                self.__discard(connection)
+        except BaseException:
+            self.__slots.release()
+            raise
+
+    def __release(self, connection: Any, is_broken: bool):
+        """接続をプールに戻すメソッド. 壊れた接続は閉じる"""
+        try:
+            if is_broken or self.__is_closed:
+                self.__discard(connection)
+            else:
+                self.__idle.put((connection, time.monotonic()))
+        finally:
+            self.__slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """接続を1つ借りるコンテキストマネージャ
+
+        ブロックを例外で抜けたときは, 確定していない変更をロールバックする. 切断による例外のときは接続を閉じる."""
+        connection = self.__acquire()
+        is_broken = False
+        try:
+            yield connection
+        except Exception as error:
+            is_broken = self.__is_disconnect(error)
+            if not is_broken:
+                try:
+                    connection.rollback()
+                except Exception:
+                    is_broken = True
+            raise
+        finally:
+            self.__release(connection, is_broken)
+
+    def run(self, operation: Callable[[Any], T]) -> T:
+        """借りた接続で操作を実行するメソッド
+
+        操作の途中で接続が切れたときは, 新しい接続で1度だけやり直す.
+        操作は1つのトランザクションで確定するか, 何も変更しないものでなければならない.
+
+        Args:
+            operation(Callable[[Any], T]): 接続を受け取る操作
+
+        Returns:
+            T: 操作の戻り値"""
+        try:
+            with self.connection() as connection:
+                return operation(connection)
+        except Exception as error:
+            if not self.__is_disconnect(error):
+                raise
+        with self.connection() as connection:
+            return operation(connection)
+
+    def close(self):
+        """全ての接続を閉じるメソッド. 使用中の接続は返されたときに閉じる"""
+        self.__is_closed = True
+        while True:
+            try:
+                connection, _ = self.__idle.get_nowait()
+            except queue.Empty:
+                break
+            self.__discard(connection)
@@ -13,6 +13,7 @@ class Display(StrEnum):
     GAME = "game"
     HISTORY = "history"
     SPECTATOR = "spectator"
+    SPECTATOR_WALL = "spectator_wall"
 
     @classmethod
     def get_display(cls, display: Display) -> Frame:
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from bitboard import legal_moves, flips, play, iter_squares, FULL_MASK, PASS
+from engine import SearchResult, SearchTimeout, TERMINAL_SCORE_SCALE, TIME_CHECK_INTERVAL
+
+
+DEFAULT_ENDGAME_EMPTIES = 12     # config.yaml の ENDGAME_SOLVER_EMPTIES と同じ値. 対戦ツールでもゲームと同じ条件で読み切る
+FASTEST_FIRST_EMPTIES = 7     # 空きマスがこれより多いときは相手の着手可能数が少ない順に並べる
+MAX_DISC_DIFFERENCE = 64
+
+# 盤面を4分割した領域. 偶数理論による手の並べ替えに使う
+QUADRANTS = (
+    0x0000_0000_0F0F_0F0F,
+    0x0000_0000_F0F0_F0F0,
+    0x0F0F_0F0F_0000_0000,
+    0xF0F0_F0F0_0000_0000,
+)
+
+
+def odd_quadrant_squares(empty: int) -> int:
+    """空きマスが奇数個ある領域の空きマスを返す関数"""
+    odd = 0
+    for quadrant in QUADRANTS:
+        region = empty & quadrant
+        if region.bit_count() & 1:
+            odd |= region
+    return odd
+
+
+class EndgameSolver:
+    """終盤の局面を終局まで読み切り, 正確な石差を求めるソルバー
+
+    空きマスが `max_empties` 以下の局面で使用する.
+    空きマスが多いうちは相手の着手可能数が少ない手から, 少なくなってからは
+    空きマスが奇数個の領域の手から探索する.
+    残り3マス以下の局面は着手生成を行わない専用の処理で読み切る.
+
+    Attributes:
+        max_empties(int): 読み切りを行う空きマスの数の上限
+        nodes(int): 直近の読み切りで探索したノード数"""
+
+    def __init__(self, max_empties: int = DEFAULT_ENDGAME_EMPTIES):
+        self.max_empties: int = max_empties
+        self.nodes: int = 0
+        self.__deadline: float | None = None
+        self.__stop_event: threading.Event | None = None
+
+    def can_solve(self, player: int, opponent: int) -> bool:
+        """局面が読み切りの対象かどうかを返すメソッド"""
+        return 64 - (player | opponent).bit_count() <= self.max_empties
+
+    def solve(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int | None = None,
+            time_budget: float | None = None,
+            stop_event: threading.Event | None = None,
+    ) -> SearchResult:
+        """局面を読み切り, 最善手と終局時の石差を返すメソッド
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            root_moves(int | None, optional): 探索する手を絞り込むときに指定する. default to None.
+            time_budget(float | None, optional): 持ち時間(秒). `None` のときは読み切るまで探索する. default to None.
+            stop_event(threading.Event | None, optional): 探索を中断させるためのイベント. default to None.
+
+        Returns:
+            SearchResult: 読み切りの結果. `score` は石差に `TERMINAL_SCORE_SCALE` を掛けた値
+
+        Raises:
+            SearchTimeout: 持ち時間内に読み切れなかったときや, 中断されたときに生じる"""
+        start = time.perf_counter()
+        self.__deadline = None if time_budget is None else start + time_budget
+        self.__stop_event = stop_event
+        self.nodes = 0
+
+        empties = 64 - (player | opponent).bit_count()
+        moves = legal_moves(player, opponent)
+        if root_moves is not None:
+            moves &= root_moves
+        if moves == 0:
+            score = -self._solve(opponent, player, -MAX_DISC_DIFFERENCE, MAX_DISC_DIFFERENCE, True)
+            return self.__create_result(PASS, score, empties, start)
+
+        alpha = -MAX_DISC_DIFFERENCE - 1
+        best_move = PASS
+        for move, child in self._order_moves(player, opponent, moves):
+            score = -self._solve(*child, -MAX_DISC_DIFFERENCE, -alpha)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return self.__create_result(best_move, alpha, empties, start)
+
+    def solve_moves(
+            self,
+            player: int,
+            opponent: int,
+            moves: int | None = None,
+            time_budget: float | None = None,
+            stop_event: threading.Event | None = None,
+    ) -> dict[int, int]:
+        """最善手だけでなく, 全ての手について終局時の石差を求めるメソッド
+
+        手ごとに窓を狭めずに読み切るので, `solve` より時間がかかる.
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            moves(int | None, optional): 読み切る手. `None` のときは置ける全ての手. default to None.
+            time_budget(float | None, optional): 持ち時間(秒). `None` のときは読み切るまで探索する. default to None.
+            stop_event(threading.Event | None, optional): 探索を中断させるためのイベント. default to None.
+
+        Returns:
+            dict[int, int]: 手ごとの, 手番側から見た終局時の石差
+
+        Raises:
+            SearchTimeout: 持ち時間内に読み切れなかったときや, 中断されたときに生じる"""
+        self.__deadline = None if time_budget is None else time.perf_counter() + time_budget
+        self.__stop_event = stop_event
+        self.nodes = 0
+        if moves is None:
+            moves = legal_moves(player, opponent)
+        return {
+            move: -self._solve(*child, -MAX_DISC_DIFFERENCE, MAX_DISC_DIFFERENCE)
+            for move, child in self._order_moves(player, opponent, moves)
+        }
+
+    def __create_result(self, move: int, disc_difference: int, empties: int, start: float) -> SearchResult:
+        return SearchResult(
+            move,
+            disc_difference * TERMINAL_SCORE_SCALE,
+            empties,
+            self.nodes,
+            time.perf_counter() - start,
+            [] if move == PASS else [move],
+            is_exact=True,
+        )
+
+    def __check_time(self):
+        if self.__stop_event is not None and self.__stop_event.is_set():
+            raise SearchTimeout()
+        if self.__deadline is not None and time.perf_counter() > self.__deadline:
+            raise SearchTimeout()
+
+    def _solve(self, player: int, opponent: int, alpha: int, beta: int, passed: bool = False) -> int:
+        """局面を読み切り, 手番側から見た終局時の石差を返すメソッド"""
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0:
+            self.__check_time()
+
+        empty = ~(player | opponent) & FULL_MASK
+        empty_count = empty.bit_count()
+        if empty_count <= 3:
+            squares = list(iter_squares(odd_quadrant_squares(empty))) + list(iter_squares(empty & ~odd_quadrant_squares(empty)))
+            match squares:
+                case []:
+                    return player.bit_count() - opponent.bit_count()
+                case [square]:
+                    return self._solve_last1(player, opponent, square)
+                case [first, second]:
+                    return self._solve_last2(player, opponent, alpha, beta, first, second)
+                case [first, second, third]:
+                    return self._solve_last3(player, opponent, alpha, beta, first, second, third)
+
+        moves = legal_moves(player, opponent)
+        if moves == 0:
+            if passed:
+                return player.bit_count() - opponent.bit_count()
+            return -self._solve(opponent, player, -beta, -alpha, True)
+
+        best_score = -MAX_DISC_DIFFERENCE - 1
+        for _, child in self._order_moves(player, opponent, moves, empty):
+            score = -self._solve(*child, -beta, -alpha)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def _solve_last1(self, player: int, opponent: int, square: int) -> int:
+        """残り1マスの局面の石差を, 着手後の局面を作らずに求めるメソッド"""
+        self.nodes += 1
+        difference = player.bit_count() - opponent.bit_count()
+        flipped = flips(player, opponent, square).bit_count()
+        if flipped:
+            return difference + 2 * flipped + 1
+        flipped = flips(opponent, player, square).bit_count()
+        if flipped:
+            return difference - 2 * flipped - 1
+        return difference
+
+    def _solve_last2(
+            self,
+            player: int,
+            opponent: int,
+            alpha: int,
+            beta: int,
+            first: int,
+            second: int,
+            passed: bool = False,
+    ) -> int:
+        """残り2マスの局面を, 着手生成を行わずに読み切るメソッド"""
+        self.nodes += 1
+        best_score = -MAX_DISC_DIFFERENCE - 1
+        for square, rest in ((first, second), (second, first)):
+            flipped = flips(player, opponent, square)
+            if flipped == 0:
+                continue
+            score = -self._solve_last1(opponent & ~flipped, player | flipped | (1 << square), rest)
+            if score > best_score:
+                best_score = score
+                if score >= beta:
+                    return score
+                alpha = max(alpha, score)
+        if best_score > -MAX_DISC_DIFFERENCE - 1:
+            return best_score
+        if passed:
+            return player.bit_count() - opponent.bit_count()
+        return -self._solve_last2(opponent, player, -beta, -alpha, first, second, True)
+
+    def _solve_last3(
+            self,
+            player: int,
+            opponent: int,
+            alpha: int,
+            beta: int,
+            first: int,
+            second: int,
+            third: int,
+            passed: bool = False,
+    ) -> int:
+        """残り3マスの局面を, 着手生成を行わずに読み切るメソッド
+
+        マスは偶数理論に従って並べた順で渡す."""
+        self.nodes += 1
+        best_score = -MAX_DISC_DIFFERENCE - 1
+        for square, rest in (
+            (first, (second, third)),
+            (second, (first, third)),
+            (third, (first, second)),
+        ):
+            flipped = flips(player, opponent, square)
+            if flipped == 0:
+                continue
+            score = -self._solve_last2(
+                opponent & ~flipped,
+                player | flipped | (1 << square),
+                -beta,
+                -alpha,
+                *rest,
+            )
+            if score > best_score:
+                best_score = score
+                if score >= beta:
+                    return score
+                alpha = max(alpha, score)
+        if best_score > -MAX_DISC_DIFFERENCE - 1:
+            return best_score
+        if passed:
+            return player.bit_count() - opponent.bit_count()
+        return -self._solve_last3(opponent, player, -beta, -alpha, first, second, third, True)
+
+    @staticmethod
+    def _order_moves(
+            player: int,
+            opponent: int,
+            moves: int,
+            empty: int | None = None,
+    ) -> list[tuple[int, tuple[int, int]]]:
+        """探索する順に手と着手後の局面を並べて返すメソッド
+
+        空きマスが多いときは相手の着手可能数が少ない順(fastest-first)に,
+        少ないときは空きマスが奇数個の領域の手から順に並べる."""
+        if empty is None:
+            empty = ~(player | opponent) & FULL_MASK
+        odd = odd_quadrant_squares(empty)
+        use_mobility = empty.bit_count() > FASTEST_FIRST_EMPTIES
+        ordered = []
+        for move in iter_squares(moves):
+            child = play(player, opponent, move)
+            parity = 0 if odd >> move & 1 else 1
+            if use_mobility:
+                priority = (legal_moves(*child).bit_count(), parity)
+            else:
+                priority = (parity, 0)
+            ordered.append((priority, move, child))
+        ordered.sort(key=lambda item: item[0])
+        return [(move, child) for _, move, child in ordered]
@@ -0,0 +1,434 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable, Protocol, TYPE_CHECKING
+import threading
+import time
+
+import bitboard
+from bitboard import legal_moves, play, iter_squares, PASS
+
+if TYPE_CHECKING:
+    from endgame import EndgameSolver
+
+
+INFINITY = 1 << 30
+TERMINAL_SCORE_SCALE = 10000     # 終局時のスコアは石差にこの値を掛けて評価値より必ず大きくする
+DEFAULT_TIME_BUDGET = 1.0
+MAX_SEARCH_DEPTH = 60
+TIME_CHECK_INTERVAL = 64     # 時刻を確認するノードの間隔. 短い持ち時間でも超過が数ミリ秒に収まるようにする
+MAX_TRANSPOSITION_TABLE_ENTRIES = 1_000_000
+ENDGAME_TIME_RATIO = .7     # 持ち時間のうち読み切りに使う割合. 読み切れなければ残りで通常の探索を行う
+PONDER_PREDICTION_RATIO = .2     # 先読みの持ち時間のうち, 相手の手の予想に使う割合
+
+# 置換表の値の種類
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# 位置ごとの重み. 角を高く, 角の隣を低く評価する
+POSITION_WEIGHTS = (
+    100, -20, 10,  5,  5, 10, -20, 100,
+    -20, -50, -2, -2, -2, -2, -50, -20,
+     10,  -2,  1,  1,  1,  1,  -2,  10,
+      5,  -2,  1,  0,  0,  1,  -2,   5,
+      5,  -2,  1,  0,  0,  1,  -2,   5,
+     10,  -2,  1,  1,  1,  1,  -2,  10,
+    -20, -50, -2, -2, -2, -2, -50, -20,
+    100, -20, 10,  5,  5, 10, -20, 100,
+)
+MOBILITY_WEIGHT = 5
+
+
+type Evaluator = Callable[[int, int], int]
+
+
+class SearchTimeout(Exception):
+    """探索の持ち時間を使い切ったときに探索を打ち切るための例外"""
+
+
+def evaluate(player: int, opponent: int) -> int:
+    """局面を手番側から見て評価する関数
+
+    位置ごとの重みの合計と, 着手可能数の差から評価値を求める.
+
+    Args:
+        player(int): 手番側の石
+        opponent(int): 相手側の石
+
+    Returns:
+        int: 評価値. 手番側が有利なほど大きい"""
+    score = 0
+    for square in iter_squares(player):
+        score += POSITION_WEIGHTS[square]
+    for square in iter_squares(opponent):
+        score -= POSITION_WEIGHTS[square]
+    mobility = legal_moves(player, opponent).bit_count() - legal_moves(opponent, player).bit_count()
+    return score + mobility * MOBILITY_WEIGHT
+
+
+def terminal_score(player: int, opponent: int) -> int:
+    """終局した局面のスコアを手番側から見て返す関数"""
+    return (player.bit_count() - opponent.bit_count()) * TERMINAL_SCORE_SCALE
+
+
+@dataclass
+class SearchResult:
+    """探索結果を保持するデータクラス
+
+    Attributes:
+        move(int): 最善手のマス. 置けるところがないときは `PASS`
+        score(int): 手番側から見た評価値
+        depth(int): 探索を完了した深さ
+        nodes(int): 探索したノード数
+        elapsed(float): 探索にかかった秒数
+        pv(list[int]): 読み筋
+        is_exact(bool): 評価値が終局までの正確な石差に基づくかどうか
+        is_book(bool): 探索せずに定石から選んだ手かどうか"""
+    move: int
+    score: int
+    depth: int
+    nodes: int
+    elapsed: float
+    pv: list[int] = field(default_factory=list)
+    is_exact: bool = False
+    is_book: bool = False
+
+    @property
+    def nps(self) -> int:
+        """1秒あたりの探索ノード数"""
+        if self.elapsed <= 0:
+            return 0
+        return int(self.nodes / self.elapsed)
+
+    @property
+    def disc_difference(self) -> int | None:
+        """終局時の手番側から見た石差. 評価値が正確でないときは `None`"""
+        if not self.is_exact:
+            return None
+        return int(self.score / TERMINAL_SCORE_SCALE)
+
+    @property
+    def coordinate(self) -> tuple[int, int] | None:
+        """最善手の盤面上の座標. パスのときは `None`"""
+        if self.move == PASS:
+            return None
+        return bitboard.to_coordinate(self.move)
+
+
+class AlphaBetaEngine:
+    """反復深化つきのネガマックス・アルファベータ探索を行うエンジン
+
+    置換表に記録された最善手を最初に, 残りの手は相手の着手可能数が少ない順に探索する.
+    持ち時間を超えた時点で探索を打ち切り, 最後に完了した深さの結果を返す.
+
+    Attributes:
+        time_budget(float): 1手あたりの持ち時間(秒)
+        max_depth(int): 探索する最大の深さ
+        evaluator(Evaluator): 末端の局面の評価関数
+        endgame_solver(EndgameSolver | None): 終盤に読み切りを行うソルバー
+        transposition_table(dict): 局面ごとの探索結果
+        nodes(int): 直近の探索で探索したノード数"""
+
+    def __init__(
+            self,
+            time_budget: float = DEFAULT_TIME_BUDGET,
+            max_depth: int = MAX_SEARCH_DEPTH,
+            evaluator: Evaluator = evaluate,
+            endgame_solver: EndgameSolver | None = None,
+    ):
+        self.time_budget: float = time_budget
+        self.max_depth: int = max_depth
+        self.evaluator: Evaluator = evaluator
+        self.endgame_solver: EndgameSolver | None = endgame_solver
+        self.transposition_table: dict[tuple[int, int], tuple[int, int, int, int]] = {}
+        self.nodes: int = 0
+        self.__deadline: float = 0.
+        self.__stop_event: threading.Event | None = None
+
+    def search(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int | None = None,
+            stop_event: threading.Event | None = None,
+            time_budget: float | None = None,
+    ) -> SearchResult:
+        """最善手を探索するメソッド
+
+        `stop_event` がセットされると, 持ち時間が残っていても探索を打ち切る.
+        空きマスが `endgame_solver` の対象になる局面では, まず読み切りを試みる.
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            root_moves(int | None, optional): 探索する手を絞り込むときに指定する. default to None.
+            stop_event(threading.Event | None, optional): 探索を中断させるためのイベント. default to None.
+            time_budget(float | None, optional): 持ち時間(秒). `None` のときは `self.time_budget`. default to None.
+
+        Returns:
+            SearchResult: 探索結果"""
+        if time_budget is None:
+            time_budget = self.time_budget
+        start = time.perf_counter()
+        self.__deadline = start + time_budget
+        self.__stop_event = stop_event
+        self.nodes = 0
+        if len(self.transposition_table) > MAX_TRANSPOSITION_TABLE_ENTRIES:
+            self.transposition_table.clear()
+
+        moves = legal_moves(player, opponent)
+        if root_moves is not None:
+            moves &= root_moves
+        if moves == 0:
+            return SearchResult(PASS, 0, 0, 0, time.perf_counter() - start)
+
+        if self.endgame_solver is not None and self.endgame_solver.can_solve(player, opponent):
+            try:
+                return self.endgame_solver.solve(
+                    player,
+                    opponent,
+                    moves,
+                    time_budget * ENDGAME_TIME_RATIO,
+                    stop_event,
+                )
+            except SearchTimeout:
+                pass
+
+        empties = 64 - (player | opponent).bit_count()
+        result = SearchResult(next(iter_squares(moves)), 0, 0, 0, 0.)
+        for depth in range(1, min(self.max_depth, empties) + 1):
+            try:
+                move, score = self._search_root(player, opponent, moves, depth)
+            except SearchTimeout:
+                break
+            result = SearchResult(
+                move,
+                score,
+                depth,
+                self.nodes,
+                time.perf_counter() - start,
+                self.principal_variation(player, opponent, depth),
+                # 深さを制限した探索の終局のスコアは一部の読み筋だけのものなので, 最後まで読んだときだけ正確とする
+                is_exact=(depth == empties),
+            )
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def shutdown(self):
+        """エンジンが使っている資源を解放するメソッド. このエンジンでは何もしない"""
+
+    def search_window(
+            self,
+            player: int,
+            opponent: int,
+            depth: int,
+            alpha: int = -INFINITY,
+            beta: int = INFINITY,
+            time_budget: float | None = None,
+            stop_event: threading.Event | None = None,
+    ) -> int:
+        """指定の深さと窓で局面を一度だけ探索して評価値を返すメソッド
+
+        並列探索のワーカーがルートの手を1つずつ探索するために使う.
+        `nodes` はリセットせずに加算する.
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            depth(int): 探索する深さ
+            alpha(int, optional): 窓の下限. default to -INFINITY.
+            beta(int, optional): 窓の上限. default to INFINITY.
+            time_budget(float | None, optional): 持ち時間(秒). `None` のときは `self.time_budget`. default to None.
+            stop_event(threading.Event | None, optional): 探索を中断させるためのイベント. default to None.
+
+        Returns:
+            int: 手番側から見た評価値
+
+        Raises:
+            SearchTimeout: 持ち時間内に探索が終わらなかったときに生じる"""
+        if time_budget is None:
+            time_budget = self.time_budget
+        self.__deadline = time.perf_counter() + time_budget
+        self.__stop_event = stop_event
+        if len(self.transposition_table) > MAX_TRANSPOSITION_TABLE_ENTRIES:
+            self.transposition_table.clear()
+        return self._negamax(player, opponent, depth, alpha, beta)
+
+    def is_time_up(self) -> bool:
+        """持ち時間を使い切ったか、中断を求められたかを返すメソッド"""
+        if self.__stop_event is not None and self.__stop_event.is_set():
+            return True
+        return time.perf_counter() > self.__deadline
+
+    def principal_variation(self, player: int, opponent: int, depth: int) -> list[int]:
+        """置換表をたどって読み筋を取り出すメソッド"""
+        pv = []
+        for _ in range(depth):
+            entry = self.transposition_table.get((player, opponent))
+            if entry is None or entry[3] == PASS:
+                break
+            pv.append(entry[3])
+            player, opponent = play(player, opponent, entry[3])
+        return pv
+
+    def _search_root(self, player: int, opponent: int, moves: int, depth: int) -> tuple[int, int]:
+        """ルート局面を探索して最善手と評価値を返すメソッド"""
+        alpha, beta = -INFINITY, INFINITY
+        best_move = PASS
+        entry = self.transposition_table.get((player, opponent))
+        tt_move = PASS if entry is None else entry[3]
+        for move, child in self._order_moves(player, opponent, moves, tt_move):
+            score = -self._negamax(*child, depth - 1, -beta, -alpha)
+            if score > alpha or best_move == PASS:
+                alpha = max(alpha, score)
+                best_move = move
+        self.transposition_table[(player, opponent)] = (depth, alpha, EXACT, best_move)
+        return best_move, alpha
+
+    def _negamax(self, player: int, opponent: int, depth: int, alpha: int, beta: int) -> int:
+        """ネガマックス法によるアルファベータ探索を行うメソッド"""
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and self.is_time_up():
+            raise SearchTimeout()
+
+        moves = legal_moves(player, opponent)
+        if moves == 0:
+            if legal_moves(opponent, player) == 0:
+                return terminal_score(player, opponent)
+            return -self._negamax(opponent, player, depth, -beta, -alpha)
+        if depth <= 0:
+            return self.evaluator(player, opponent)
+
+        key = (player, opponent)
+        entry = self.transposition_table.get(key)
+        tt_move = PASS
+        if entry is not None:
+            entry_depth, entry_score, entry_flag, tt_move = entry
+            if entry_depth >= depth:
+                if entry_flag == EXACT:
+                    return entry_score
+                if entry_flag == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                elif entry_flag == UPPER_BOUND:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = PASS
+        for move, child in self._order_moves(player, opponent, moves, tt_move):
+            score = -self._negamax(*child, depth - 1, -beta, -alpha)
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transposition_table[key] = (depth, best_score, flag, best_move)
+        return best_score
+
+    @staticmethod
+    def _order_moves(
+            player: int,
+            opponent: int,
+            moves: int,
+            tt_move: int = PASS,
+    ) -> list[tuple[int, tuple[int, int]]]:
+        """探索する順に手と着手後の局面を並べて返すメソッド
+
+        置換表の最善手を先頭に, 残りは着手後の相手の着手可能数が少ない順に並べる."""
+        ordered = []
+        for move in iter_squares(moves):
+            child = play(player, opponent, move)
+            if move == tt_move:
+                priority = -1
+            else:
+                priority = legal_moves(*child).bit_count()
+            ordered.append((priority, move, child))
+        ordered.sort(key=lambda item: item[0])
+        return [(move, child) for _, move, child in ordered]
+
+
+class SearchEngine(Protocol):
+    """`search` で最善手を探索できるエンジンの型"""
+
+    def search(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int | None = None,
+            stop_event: threading.Event | None = None,
+            time_budget: float | None = None,
+    ) -> SearchResult:
+        ...
+
+
+@dataclass
+class PonderResult:
+    """相手の手番の間に行った先読みの結果を保持するデータクラス
+
+    Attributes:
+        predicted_move(int): 予想した相手の手
+        player(int): 予想した手のあとの局面の手番側(先読みしたエンジン)の石
+        opponent(int): 予想した手のあとの局面の相手側の石
+        result(SearchResult): 予想した手のあとの局面の探索結果"""
+    predicted_move: int
+    player: int
+    opponent: int
+    result: SearchResult
+
+
+def ponder(
+        engine: SearchEngine,
+        player: int,
+        opponent: int,
+        predicted_move: int | None,
+        time_budget: float,
+        stop_event: threading.Event | None = None,
+) -> PonderResult | None:
+    """相手の手番の間に, 相手の手を予想してそのあとの局面を探索する関数
+
+    予想する手が与えられないときや置けない手のときは, 持ち時間の一部を使って相手の立場で探索して予想する.
+    `AlphaBetaEngine` では, 予想が外れても置換表に残った結果が次の探索で再利用される.
+
+    Args:
+        engine(SearchEngine): 先読みするエンジン
+        player(int): 相手(手番側)の石
+        opponent(int): 先読みするエンジン側の石
+        predicted_move(int | None): 予想する相手の手
+        time_budget(float): 先読みの持ち時間(秒)
+        stop_event(threading.Event | None, optional): 先読みを中断させるためのイベント. default to None.
+
+    Returns:
+        PonderResult | None: 先読みの結果. 相手が置けないときや中断されたときは `None`"""
+    deadline = time.perf_counter() + time_budget
+    moves = legal_moves(player, opponent)
+    if moves == 0:
+        return None
+    if predicted_move is None or predicted_move == PASS or not moves >> predicted_move & 1:
+        prediction = engine.search(
+            player,
+            opponent,
+            stop_event=stop_event,
+            time_budget=time_budget * PONDER_PREDICTION_RATIO,
+        )
+        predicted_move = prediction.move
+    if stop_event is not None and stop_event.is_set():
+        return None
+
+    child = play(player, opponent, predicted_move)
+    result = engine.search(*child, stop_event=stop_event, time_budget=max(deadline - time.perf_counter(), 0.))
+    if stop_event is not None and stop_event.is_set():
+        return None
+    return PonderResult(predicted_move, *child, result)
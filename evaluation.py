@@ -0,0 +1,473 @@
+# パターンによる評価関数
+# 辺, 隅, 直線, 斜めの石の並び(パターン)ごとに, 並び方を3進数で表した番号から重みを引いて合計する.
+# 重みは対局の進行度(石の数)ごとの表を持ち, バイナリファイルから読み込む.
+# 1局面ずつの評価は探索から, NumPy による一括評価は履歴の解析から使用する.
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from functools import cache
+from typing import Iterable, Sequence
+import argparse
+import struct
+import sys
+import time
+
+from bitboard import (
+    legal_moves,
+    transform_square,
+    from_names,
+    transpose,
+    to_square,
+    FULL_MASK,
+    numpy,
+    popcount_array,
+    transpose_array,
+    legal_moves_array,
+)
+from engine import POSITION_WEIGHTS, MOBILITY_WEIGHT
+
+
+PHASE_COUNT = 4
+WEIGHT_RESOLUTION = 16     # 重みは評価値をこの値倍した整数で保存する
+BATCH_SIZE = 65536
+
+MAGIC = b"OTEV"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")     # マジックナンバー, バージョン, パターンの数, 進行度の数
+
+DIAGONAL_GATHER = 0x0101_0101_0101_0101     # 1列に1マスしかない石の並びを最上位の1バイトに集める乗数
+
+# 初期値の重みを作るときの, 進行度ごとの位置の重みと石の数の重みの割合
+DEFAULT_POSITION_FACTORS = (1., 1., .6, .2)
+DEFAULT_DISC_FACTORS = (0., 0., 2., 6.)
+STABLE_NEIGHBOR_WEIGHT = 5     # 隅が埋まっているときの, 隅の隣のマスの重み
+
+# マスの状態を表す3進数の1桁と, その石の評価の符号
+EMPTY_DIGIT = 0
+PLAYER_DIGIT = 1
+OPPONENT_DIGIT = 2
+DIGIT_SIGNS = (0, 1, -1)
+
+
+@dataclass(frozen=True)
+class Pattern:
+    """パターンの形を保持するデータクラス
+
+    Attributes:
+        name(str): パターンの名前
+        coordinates(tuple[tuple[int, int], ...]): 左上の隅を基準にしたマスの座標. 隅を含むときは先頭に置く
+        corner_neighbors(tuple[tuple[int, int], ...]): 先頭の隅が埋まると評価が変わるマスの座標
+        is_transpose_symmetric(bool): 対角線で反転しても同じマスの集まりになるかどうか"""
+    name: str
+    coordinates: tuple[tuple[int, int], ...]
+    corner_neighbors: tuple[tuple[int, int], ...] = ()
+    is_transpose_symmetric: bool = False
+
+    @property
+    def size(self) -> int:
+        """パターンの並び方の数"""
+        return 3 ** len(self.coordinates)
+
+
+PATTERNS = (
+    Pattern(
+        "edge_2x",
+        tuple((x, 0) for x in range(8)) + ((1, 1), (6, 1)),
+        ((1, 0), (1, 1)),
+    ),
+    Pattern(
+        "corner_3x3",
+        tuple((x, y) for y in range(3) for x in range(3)),
+        ((1, 0), (0, 1), (1, 1)),
+        is_transpose_symmetric=True,
+    ),
+    Pattern(
+        "corner_2x5",
+        tuple((x, y) for y in range(2) for x in range(5)),
+        ((1, 0), (0, 1), (1, 1)),
+    ),
+    Pattern("line_2", tuple((x, 1) for x in range(8))),
+    Pattern("line_3", tuple((x, 2) for x in range(8))),
+    Pattern("line_4", tuple((x, 3) for x in range(8))),
+    Pattern("diagonal_8", tuple((i, i) for i in range(8)), ((1, 1),), is_transpose_symmetric=True),
+    Pattern("diagonal_7", tuple((i, i + 1) for i in range(7)), is_transpose_symmetric=True),
+    Pattern("diagonal_6", tuple((i, i + 2) for i in range(6)), is_transpose_symmetric=True),
+    Pattern("diagonal_5", tuple((i, i + 3) for i in range(5)), is_transpose_symmetric=True),
+    Pattern("diagonal_4", tuple((i, i + 4) for i in range(4)), is_transpose_symmetric=True),
+)
+
+
+def get_phase(player: int, opponent: int) -> int:
+    """盤面の石の数から対局の進行度を求める関数"""
+    return min(((player | opponent).bit_count() - 4) * PHASE_COUNT // 60, PHASE_COUNT - 1)
+
+
+@dataclass
+class PatternReader:
+    """盤面からパターンの1つの向きの番号を読み取るためのデータクラス
+
+    マスが全て異なる列にあるときは, 乗算で1バイトに集めて `gather_table` を引く.
+    そうでないときは, 行ごとの1バイトで `row_tables` を引いて合計する.
+
+    Attributes:
+        pattern_index(int): `PATTERNS` でのパターンの位置
+        squares(tuple[int, ...]): 読み取るマス. 3進数の下の桁から順に並ぶ
+        is_transposed(bool): 対角線で反転した盤面から読み取るかどうか. `squares` は反転後の盤面のマス
+        gather_mask(int): 乗算で集めるマスのマスク. 行ごとに引くときは `0`
+        gather_table(list[int]): 集めた1バイトから番号への表
+        row_tables(tuple[tuple[int, list[int]], ...]): 行の番号と, その行の1バイトから番号への表の組"""
+    pattern_index: int
+    squares: tuple[int, ...]
+    is_transposed: bool
+    gather_mask: int = 0
+    gather_table: list[int] | None = None
+    row_tables: tuple[tuple[int, list[int]], ...] = ()
+
+    @classmethod
+    def create(cls, pattern_index: int, squares: Sequence[int], is_transposed: bool) -> PatternReader:
+        columns = [square % 8 for square in squares]
+        rows = sorted({square // 8 for square in squares})
+        if not is_transposed and len(set(columns)) == len(columns) and len(rows) > 1:
+            gather_table = [
+                sum(3 ** digit for digit, column in enumerate(columns) if byte >> column & 1)
+                for byte in range(256)
+            ]
+            gather_mask = sum(1 << square for square in squares)
+            return cls(pattern_index, tuple(squares), is_transposed, gather_mask, gather_table)
+        row_tables = []
+        for row in rows:
+            digits = [(digit, square % 8) for digit, square in enumerate(squares) if square // 8 == row]
+            row_tables.append((
+                row,
+                [sum(3 ** digit for digit, column in digits if byte >> column & 1) for byte in range(256)],
+            ))
+        return cls(pattern_index, tuple(squares), is_transposed, row_tables=tuple(row_tables))
+
+
+def create_readers() -> list[PatternReader]:
+    """全てのパターンを全ての向きで読み取るための `PatternReader` を作成する関数
+
+    上下左右の反転で得られる4つの向きは元の盤面から読み取る.
+    対角線で反転して得られる向きは, 反転した盤面から同じマスを読み取ることで求める."""
+    readers = []
+    for pattern_index, pattern in enumerate(PATTERNS):
+        base_squares = [to_square(coordinate) for coordinate in pattern.coordinates]
+        transposed_options = (False,) if pattern.is_transpose_symmetric else (False, True)
+        for is_transposed in transposed_options:
+            for symmetry in range(4):
+                squares = [transform_square(square, symmetry) for square in base_squares]
+                readers.append(PatternReader.create(pattern_index, squares, is_transposed))
+    return readers
+
+
+READERS = create_readers()
+
+
+def get_coverage() -> list[int]:
+    """マスごとに, いくつのパターンの向きから読み取られるかを数える関数"""
+    coverage = [0] * 64
+    for reader in READERS:
+        for square in reader.squares:
+            if reader.is_transposed:
+                square = transpose(1 << square).bit_length() - 1
+            coverage[square] += 1
+    return coverage
+
+
+def _create_linear_table(values: Sequence[float]) -> list[float]:
+    """マスごとの重みを石の符号付きで合計した表を作成する関数
+
+    新しい桁を上の桁として加えていくので, 表の大きさの3倍の計算で作成できる."""
+    table = [0.]
+    for value in values:
+        table = [weight + value * sign for sign in DIGIT_SIGNS for weight in table]
+    return table
+
+
+def _create_default_tables(pattern: Pattern, coverage: Sequence[int]) -> list[array]:
+    """パターンの初期値の重みの表を進行度ごとに作成する関数
+
+    位置の重み(`POSITION_WEIGHTS`)と石の数を, 各マスを読み取るパターンの数で割って配分し,
+    進行度ごとの割合で混ぜ合わせる.
+    先頭の隅が埋まっているときは, 隅の隣のマスを確定石に近いものとして評価する."""
+    squares = [to_square(coordinate) for coordinate in pattern.coordinates]
+
+    def position_values(is_corner_occupied: bool) -> list[float]:
+        result = []
+        for coordinate, square in zip(pattern.coordinates, squares):
+            weight = POSITION_WEIGHTS[square]
+            if is_corner_occupied and coordinate in pattern.corner_neighbors:
+                weight = STABLE_NEIGHBOR_WEIGHT
+            result.append(weight / coverage[square])
+        return result
+
+    if not pattern.corner_neighbors:
+        position_table = _create_linear_table(position_values(False))
+    else:
+        empty_values = position_values(False)
+        corner_value = empty_values[0]
+        empty_table = _create_linear_table(empty_values[1:])
+        occupied_table = _create_linear_table(position_values(True)[1:])
+        position_table = [
+            (empty_table if digit == EMPTY_DIGIT else occupied_table)[rest] + corner_value * DIGIT_SIGNS[digit]
+            for rest in range(len(empty_table))
+            for digit in range(3)
+        ]
+    disc_table = _create_linear_table([1 / coverage[square] for square in squares])
+
+    tables = []
+    for position_factor, disc_factor in zip(DEFAULT_POSITION_FACTORS, DEFAULT_DISC_FACTORS):
+        position_factor *= WEIGHT_RESOLUTION
+        disc_factor *= WEIGHT_RESOLUTION
+        tables.append(array("h", [
+            max(-32768, min(32767, round(position_factor * position + disc_factor * disc)))
+            for position, disc in zip(position_table, disc_table)
+        ]))
+    return tables
+
+
+@cache
+def _default_weights() -> list[list[array]]:
+    """初期値の重みの表を作成する関数. 表は書き換えずに共有する"""
+    coverage = get_coverage()
+    return [_create_default_tables(pattern, coverage) for pattern in PATTERNS]
+
+
+class PatternEvaluator:
+    """パターンの重みの表を使って局面を評価するクラス
+
+    インスタンスは `Evaluator` として `AlphaBetaEngine` に渡せる.
+    プロセス間で受け渡すときは, 重みの表ではなく読み込んだファイルのパスだけを送る.
+
+    Attributes:
+        path(str | None): 重みを読み込んだファイルのパス. 初期値の重みのときは `None`
+        weights(list[list[array]]): パターンごと, 進行度ごとの重みの表"""
+
+    def __init__(self, weights: list[list[array]], path: str | None = None):
+        self.weights: list[list[array]] = weights
+        self.path: str | None = path
+        self.__numpy_tables = None
+
+    @classmethod
+    def default(cls) -> PatternEvaluator:
+        """位置の重みと石の数から作成した初期値の重みを持つインスタンスを返すメソッド
+
+        重みの表は作成に時間がかかるので, プロセスごとに一度だけ作成し, 全てのインスタンスで共有する."""
+        return cls(_default_weights())
+
+    @classmethod
+    def load(cls, path: str) -> PatternEvaluator:
+        """重みのファイルを読み込むメソッド
+
+        Args:
+            path(str): 重みのファイルのパス
+
+        Returns:
+            PatternEvaluator: 読み込んだ重みを持つインスタンス
+
+        Raises:
+            ValueError: ファイルの形式が正しくないときに生じる"""
+        with open(path, "rb") as file:
+            magic, version, pattern_count, phase_count = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or pattern_count != len(PATTERNS) or phase_count != PHASE_COUNT:
+                raise ValueError(f"{path} is not a pattern weights file")
+            weights = []
+            for pattern in PATTERNS:
+                tables = []
+                for _ in range(PHASE_COUNT):
+                    table = array("h")
+                    try:
+                        table.fromfile(file, pattern.size)
+                    except EOFError:
+                        raise ValueError(f"{path} is not a pattern weights file")
+                    if sys.byteorder == "big":
+                        table.byteswap()
+                    tables.append(table)
+                weights.append(tables)
+        return cls(weights, path)
+
+    def save(self, path: str):
+        """重みをファイルに書き込むメソッド
+
+        Args:
+            path(str): 書き込むファイルのパス"""
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(PATTERNS), PHASE_COUNT))
+            for tables in self.weights:
+                for table in tables:
+                    if sys.byteorder == "big":
+                        table = array("h", table)
+                        table.byteswap()
+                    table.tofile(file)
+        self.path = path
+
+    def __reduce__(self):
+        if self.path is None:
+            return PatternEvaluator.default, ()
+        return PatternEvaluator.load, (self.path,)
+
+    def __call__(self, player: int, opponent: int) -> int:
+        """局面を手番側から見て評価するメソッド
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+
+        Returns:
+            int: 評価値. 手番側が有利なほど大きい"""
+        phase = get_phase(player, opponent)
+        player_rows = player.to_bytes(8, "little")
+        opponent_rows = opponent.to_bytes(8, "little")
+        transposed_player_rows = transpose(player).to_bytes(8, "little")
+        transposed_opponent_rows = transpose(opponent).to_bytes(8, "little")
+
+        score = 0
+        for reader in READERS:
+            if reader.gather_mask:
+                table = reader.gather_table
+                index = (
+                    table[((player & reader.gather_mask) * DIAGONAL_GATHER & FULL_MASK) >> 56]
+                    + 2 * table[((opponent & reader.gather_mask) * DIAGONAL_GATHER & FULL_MASK) >> 56]
+                )
+            else:
+                if reader.is_transposed:
+                    rows, other_rows = transposed_player_rows, transposed_opponent_rows
+                else:
+                    rows, other_rows = player_rows, opponent_rows
+                index = 0
+                for row, table in reader.row_tables:
+                    index += table[rows[row]] + 2 * table[other_rows[row]]
+            score += self.weights[reader.pattern_index][phase][index]
+
+        mobility = legal_moves(player, opponent).bit_count() - legal_moves(opponent, player).bit_count()
+        return score // WEIGHT_RESOLUTION + mobility * MOBILITY_WEIGHT
+
+    def evaluate_batch(self, players: Sequence[int], opponents: Sequence[int]) -> list[int]:
+        """複数の局面をまとめて評価するメソッド
+
+        NumPy があるときは, 全ての局面のパターンの番号を配列の演算でまとめて求める.
+        ないときは1局面ずつ評価する.
+
+        Args:
+            players(Sequence[int]): 各局面の手番側の石
+            opponents(Sequence[int]): 各局面の相手側の石
+
+        Returns:
+            list[int]: 各局面の評価値"""
+        if numpy is None:
+            return [self(player, opponent) for player, opponent in zip(players, opponents)]
+        return self.__evaluate_batch_numpy(
+            numpy.array(players, dtype=numpy.uint64),
+            numpy.array(opponents, dtype=numpy.uint64),
+        ).tolist()
+
+    def __get_numpy_tables(self):
+        if self.__numpy_tables is None:
+            weights = [
+                numpy.array([numpy.frombuffer(table, dtype=numpy.int16) for table in tables], dtype=numpy.int64)
+                for tables in self.weights
+            ]
+            readers = []
+            for reader in READERS:
+                if reader.gather_mask:
+                    readers.append((reader, numpy.array(reader.gather_table, dtype=numpy.int64), ()))
+                else:
+                    row_tables = tuple(
+                        (row, numpy.array(table, dtype=numpy.int64)) for row, table in reader.row_tables
+                    )
+                    readers.append((reader, None, row_tables))
+            self.__numpy_tables = weights, readers
+        return self.__numpy_tables
+
+    def __evaluate_batch_numpy(self, players, opponents):
+        weights, readers = self.__get_numpy_tables()
+        discs = popcount_array(players | opponents)
+        phases = numpy.minimum((discs - 4) * PHASE_COUNT // 60, PHASE_COUNT - 1)
+
+        boards = {
+            False: (_to_rows_numpy(players), _to_rows_numpy(opponents)),
+            True: (_to_rows_numpy(transpose_array(players)), _to_rows_numpy(transpose_array(opponents))),
+        }
+        scores = numpy.zeros(len(players), dtype=numpy.int64)
+        for reader, gather_table, row_tables in readers:
+            if gather_table is not None:
+                mask = numpy.uint64(reader.gather_mask)
+                gather = numpy.uint64(DIAGONAL_GATHER)
+                shift = numpy.uint64(56)
+                index = (
+                    gather_table[((players & mask) * gather) >> shift]
+                    + 2 * gather_table[((opponents & mask) * gather) >> shift]
+                )
+            else:
+                rows, other_rows = boards[reader.is_transposed]
+                index = numpy.zeros(len(players), dtype=numpy.int64)
+                for row, table in row_tables:
+                    index += table[rows[:, row]] + 2 * table[other_rows[:, row]]
+            scores += weights[reader.pattern_index][phases, index]
+
+        mobility = (
+            popcount_array(legal_moves_array(players, opponents))
+            - popcount_array(legal_moves_array(opponents, players))
+        )
+        return scores // WEIGHT_RESOLUTION + mobility * MOBILITY_WEIGHT
+
+
+def _to_rows_numpy(bits):
+    """盤面の配列を, 行ごとの1バイトを並べた2次元配列に変換する関数"""
+    return bits.astype("<u8").view(numpy.uint8).reshape(-1, 8)
+
+
+def iter_history_positions(scenes: Iterable[tuple[Sequence[Sequence[str | None]], str]]) -> Iterable[tuple[int, int]]:
+    """履歴のシーンから, ターンプレイヤーから見た局面を順に返すジェネレータ
+
+    Args:
+        scenes(Iterable[tuple[Sequence[Sequence[str | None]], str]]): `DBController.get_scene_records` の戻り値
+
+    Returns:
+        Iterable[tuple[int, int]]: 手番側の石と相手側の石"""
+    for board, turn_player in scenes:
+        black, white = from_names(board)
+        yield (black, white) if turn_player == "BLACK" else (white, black)
+
+
+def main():
+    """重みのファイルの作成と, 保存された対局の一括評価を行うコマンド"""
+    from storage import open_storage
+
+    parser = argparse.ArgumentParser(description="パターン評価関数の重みの作成と一括評価")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="初期値の重みのファイルを作成する")
+    generate_parser.add_argument("path", help="作成する重みのファイルのパス")
+    analyze_parser = subparsers.add_parser("analyze", help="保存された全ての局面を評価する")
+    analyze_parser.add_argument("--weights", default=None, help="重みのファイルのパス")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        PatternEvaluator.default().save(args.path)
+        print(f"weights written to {args.path}")
+        return
+
+    evaluator = PatternEvaluator.default() if args.weights is None else PatternEvaluator.load(args.weights)
+    players, opponents = [], []
+    for _, scenes in open_storage().query():
+        for player, opponent in iter_history_positions(scenes):
+            players.append(player)
+            opponents.append(opponent)
+
+    start = time.perf_counter()
+    total = 0
+    for offset in range(0, len(players), BATCH_SIZE):
+        total += sum(evaluator.evaluate_batch(
+            players[offset:offset + BATCH_SIZE],
+            opponents[offset:offset + BATCH_SIZE],
+        ))
+    elapsed = time.perf_counter() - start
+    rate = len(players) / elapsed if elapsed > 0 else 0
+    print(f"{len(players)} positions evaluated in {elapsed:.3f}s ({rate:.0f} positions/s)")
+    if players:
+        print(f"mean score: {total / len(players):.2f}")
+
+
+if __name__ == "__main__":
+    main()
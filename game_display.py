@@ -5,7 +5,7 @@ from tkinter import Frame, Misc, Canvas
 import tkinter
 
 from boardgame import Coordinate
-from systems import Color, OthelloPlayer
+from systems import Color, create_player
 from objects import OthelloBoard
 from display_items import Display
 from game_manager import GameManager, ManagerDisplay
@@ -46,7 +46,7 @@ class GameDisplay(Frame):
 
         self.manager = GameManager(
             self.othello_board,
-            (OthelloPlayer(Color.BLACK, "先手"), OthelloPlayer(Color.WHITE, "後手")),
+            (create_player(Color.BLACK, "先手"), create_player(Color.WHITE, "後手")),
         )
 
         self.manager_display: ManagerDisplay = self.manager.create_manager_display(
@@ -4,18 +4,27 @@ from enum import Enum
 from copy import copy
 from typing import Callable
 import tkinter
-from tkinter import Frame, Misc, Canvas
-from tkinter.ttk import Button
+from tkinter import Frame, Misc, Canvas, Label
+from tkinter.ttk import Button, Scale, Combobox, Checkbutton
+import threading
 import time
 
 from boardgame import Coordinate, BoardGamePhotoImage
 
 from objects import OthelloBoard, Stone, PutableSpaceTile
-from history import History, Scene, DBController
-from systems import OthelloPlayer, Color, CONFIG
+from history import History, LazyHistory, Scene
+from history_writer import HistoryWriter
+from systems import OthelloPlayer, ComputerPlayer, Color, CONFIG, open_opening_book, create_evaluator
 from errors import TkinterOthelloException
 from text_object import AutoFontLabel
 from display_items import SceneTransitionButton, Display
+from replay import ReplayTimeline, ColorGrid, to_color_grid
+from engine import AlphaBetaEngine, SearchResult, PonderResult, ponder
+from mcts import MCTSEngine, MCTSStats
+from endgame import EndgameSolver
+from hint_overlay import HintCache, HintOverlay, PositionHints, analyze_moves
+from tasks import TaskExecutor, TkDispatcher, Task
+import bitboard
 
 
 REDO_BUTTON_TEXT = "待った！！"
@@ -23,6 +32,13 @@ SAVE_BUTTON_TEXT = "途中保存"
 SM_UNDO_BUTTON_TEXT = "一手戻す"
 SM_REDO_BUTTON_TEXT = "一手進める"
 SM_HOME_BUTTON_TEXT = "ホームへ戻る"
+SM_TIMELINE_LABEL_FORMAT = "{turn} / {total}手目"
+SM_PLAY_BUTTON_TEXT = "再生"
+SM_PAUSE_BUTTON_TEXT = "一時停止"
+SM_PLAYBACK_SPEEDS = (0.5, 1, 2, 5, 10, 20)
+SM_DEFAULT_PLAYBACK_SPEED = 1
+SECONDS_PER_MOVE_AT_NORMAL_SPEED = 1.0
+MIN_AUTOPLAY_DELAY_MS = 5
 
 TIME_CUT_IN = 2
 PASS_CUT_IN_IMAGE_RATIO_TO_DISPLAY: float = .6
@@ -30,6 +46,16 @@ PASS_CUT_IN_IMAGE_PATH = CONFIG["PASS_CUT_IN_PATH"]
 CUT_IN_BG_IMAGE_PATH = CONFIG["PASS_CUT_IN_BG"]
 TIME_RAITIO_STOPPING_CUT_IN_ON_CENTER = .5
 FPS = 30
+COMPUTER_MOVE_DELAY_MS = 300
+MANAGER_EXECUTOR_WORKERS = 4     # コンピュータの探索, 先読み, 完全読み, ヒントに使うスレッドの数. 先読み, 完全読み, ヒントは1つずつ実行する
+SM_EXECUTOR_WORKERS = 1          # 観戦中に履歴の残りのシーンを読み込むスレッドの数
+ENGINE_INFO_FORMAT = "深さ{depth} {nodes}ノード {nps}NPS"
+BOOK_MOVE_TEXT = "定石"
+MCTS_INFO_FORMAT = "{playouts}プレイアウト {pps}回/秒 木{memory}KB"
+PERFECT_PLAY_FORMAT = "完全読み: {winner}の{difference}石勝ち"
+PERFECT_PLAY_DRAW_TEXT = "完全読み: 引き分け"
+PERFECT_PLAY_CALCULATING_TEXT = "完全読み: 計算中…"
+HINT_CHECK_TEXT = "ヒントを表示"
 
 class InvalidStonePlacementError(TkinterOthelloException):
     """石を置けない場所に置こうとしたときに投げられる例外
@@ -67,7 +93,19 @@ class GameManager:
         players(tuple[OthelloPlayer]): オセロの参加者
         manager_display(ManagerDisplay): GameDisplayのサブディスプレイ(外部から変更不可)
         turn_player(OthelloPlayer): ターンプレイヤー
-        history(History): 履歴"""
+        history(History): 履歴
+        putable_coordinates(tuple[tuple[int, int]]): 直近の `set_putable_tiles` でタイルを置いた座標
+        endgame_solver(EndgameSolver): 完全読みの表示に使うソルバー
+        opening_book(OpeningBook | None): コンピュータが探索の前に引く定石
+        ponder_time_budget(float | None): 人間のターンの間にコンピュータが先読みする時間(秒). `None` のときは先読みしない
+        is_hint_visible(bool): 人間のターンに置けるマスの評価を表示するかどうか
+        hint_time_budget(float): 1つの局面のヒントを求める時間(秒)
+        hint_engine(AlphaBetaEngine): ヒントの評価に使うエンジン
+        hint_solver(EndgameSolver): ヒントの読み切りに使うソルバー
+        hint_cache(HintCache): 局面ごとのヒント
+        hint_overlay(HintOverlay): ボードにヒントを表示するオーバーレイ
+        is_autosave_enabled(bool): 1手ごとに履歴の差分をデータベースへ保存するかどうか
+        history_writer(HistoryWriter): 履歴をバックグラウンドでデータベースへ書き込むライター"""
     
     def __init__(
             self, 
@@ -76,7 +114,31 @@ class GameManager:
         ):
         self.othello_board = othello_board
         self.players = participants
+        self.putable_coordinates: tuple[tuple[int, int]] = ()
         self.__manager_display = None
+        self.__computer_after_id: str | None = None
+        self.__computer_task: Task | None = None
+        self.__analysis_task: Task | None = None
+        self.__ponder_task: Task | None = None
+        self.__ponder_result: PonderResult | None = None
+        self.__engine_task: Task | None = None
+        # 先読み, 完全読み, ヒントの探索はGILを取り合って画面の応答を遅らせるので, 同時には1つだけ実行する
+        self.__background_lock = threading.Lock()
+        self.__last_computer_result: SearchResult | None = None
+        self.executor: TaskExecutor | None = None
+        self.endgame_solver = EndgameSolver(CONFIG["ENDGAME_SOLVER_EMPTIES"])
+        self.opening_book = open_opening_book()
+        self.ponder_time_budget: float | None = CONFIG.get("PONDER_TIME_BUDGET")
+        self.is_hint_visible: bool = CONFIG.get("HINT_VISIBLE", False)
+        self.hint_time_budget: float = CONFIG["HINT_TIME_BUDGET"]
+        self.hint_engine = AlphaBetaEngine(self.hint_time_budget, evaluator=create_evaluator())
+        self.hint_solver = EndgameSolver(CONFIG["ENDGAME_SOLVER_EMPTIES"])
+        self.hint_cache = HintCache()
+        self.hint_overlay = HintOverlay(othello_board)
+        self.__hint_task: Task | None = None
+        self.__hint_position: tuple[int, int] | None = None
+        self.is_autosave_enabled: bool = CONFIG.get("AUTOSAVE", False)
+        self.history_writer = HistoryWriter.shared()
     
     @property
     def manager_display(self) -> ManagerDisplay:
@@ -97,10 +159,25 @@ class GameManager:
             self
         )
         self.__manager_display = manager_display
+        self.executor = TaskExecutor(TkDispatcher(manager_display), MANAGER_EXECUTOR_WORKERS)
         return self.__manager_display
     
+    def get_player(self, color: Color) -> OthelloPlayer:
+        """指定の色の参加者を返すメソッド
+
+        Args:
+            color(Color): 取得したい参加者の色"""
+        for player in self.players:
+            if player.color == color:
+                return player
+
     def start_new_game(self):
         """盤面を初期化して、新しいゲームを始めるためのメソッド"""
+        self.cancel_computer_turn()
+        self.cancel_ponder()
+        self.cancel_endgame_analysis()
+        self.cancel_hints()
+        self.__last_computer_result = None
         for player in self.players:
             if player.color == Color.BLACK:
                 self.turn_player: OthelloPlayer = player
@@ -113,13 +190,16 @@ class GameManager:
         self.othello_board.reset_tiles()
         self.set_putable_tiles(self.turn_player.color)
         
+        # 履歴には石を置く前の盤面を記録するので, 初期配置は最初の手を置くときに記録される
         self.history: History = History()
-        self.history.append(self.othello_board.board, self.turn_player)
         self.manager_display.update_display(
             self.turn_player.name,
             self.count_stone_amount(Color.BLACK),
             self.count_stone_amount(Color.WHITE)
         )
+        self.request_computer_turn()
+        self.request_ponder()
+        self.request_hints()
     
     def flip(self, stone: Stone):
         """石をひっくり返すメソッド
@@ -218,8 +298,8 @@ class GameManager:
         if (self.othello_board.get(coordinate) is not None) or (len(flip_directions) == 0):
             raise InvalidStonePlacementError(put_stone)
         
-        # 置く前に履歴の保存
-        self.history.append(self.othello_board.board, self.turn_player)
+        # 置く前に履歴の保存. 途中保存や再開のあとは, 置く前の盤面がすでに末尾に記録されている
+        self.history.append_if_changed(self.othello_board.board, self.turn_player)
         
         self.othello_board.put(put_stone, coordinate)
         for direction in flip_directions:
@@ -231,6 +311,10 @@ class GameManager:
                 self.flip(target_stone)
                 cursor += direction.value
 
+        # 自動保存では, 前回の保存から増えたシーンだけを書き込む
+        if self.is_autosave_enabled:
+            self.history_writer.submit(self.history)
+
         # 次のプレイヤーへ
         self.change_turn()
     
@@ -266,7 +350,242 @@ class GameManager:
             self.change_turn()
         else:
             self.turn_player.can_put = True
+            self.request_endgame_analysis()
+            self.request_computer_turn()
+            self.request_ponder()
+            self.request_hints()
+
+    def get_turn_position(self) -> tuple[int, int]:
+        """現在の盤面をビットボードに変換し、ターンプレイヤーの石と相手の石の順で返すメソッド"""
+        black, white = bitboard.from_board(self.othello_board.board)
+        if self.turn_player.color == Color.BLACK:
+            return black, white
+        return white, black
+
+    def request_endgame_analysis(self):
+        """空きマスが少ないとき、バックグラウンドで完全読みを行い、結果をサブディスプレイに表示するメソッド"""
+        self.cancel_endgame_analysis()
+        position = self.get_turn_position()
+        if not self.endgame_solver.can_solve(*position):
+            self.manager_display.update_perfect_play("")
+            return
+        self.manager_display.update_perfect_play(PERFECT_PLAY_CALCULATING_TEXT)
+        turn_player = self.turn_player
+        self.__analysis_task = self.executor.submit(
+            self.endgame_solver.solve,
+            *position,
+            on_done=lambda result: self.show_endgame_analysis(result, turn_player),
+            pass_stop_event=True,
+            lock=self.__background_lock,
+        )
+
+    def cancel_endgame_analysis(self):
+        """実行中の完全読みを取り消すメソッド"""
+        if self.__analysis_task is not None:
+            self.__analysis_task.cancel()
+            self.__analysis_task = None
+
+    def show_endgame_analysis(self, result: SearchResult, turn_player: OthelloPlayer):
+        """完全読みの結果をサブディスプレイに表示するメソッド
+
+        Args:
+            result(SearchResult): 完全読みの結果
+            turn_player(OthelloPlayer): 読み切った局面のターンプレイヤー"""
+        self.__analysis_task = None
+        difference = result.disc_difference
+        if difference == 0:
+            text = PERFECT_PLAY_DRAW_TEXT
+        else:
+            winner = turn_player
+            if difference < 0:
+                winner = [player for player in self.players if player.color != turn_player.color][0]
+            text = PERFECT_PLAY_FORMAT.format(winner=winner.name, difference=abs(difference))
+        self.manager_display.update_perfect_play(text)
+
+    def request_computer_turn(self):
+        """ターンプレイヤーがコンピュータのとき、少し待ってから着手させるメソッド"""
+        if not isinstance(self.turn_player, ComputerPlayer):
+            return
+        self.cancel_computer_turn()
+        self.__computer_after_id = self.manager_display.after(
+            COMPUTER_MOVE_DELAY_MS,
+            self.play_computer_turn,
+        )
+
+    def cancel_computer_turn(self):
+        """予約または探索中のコンピュータの着手を取り消すメソッド"""
+        if self.__computer_after_id is not None:
+            self.manager_display.after_cancel(self.__computer_after_id)
+            self.__computer_after_id = None
+        if self.__computer_task is not None:
+            self.__computer_task.cancel()
+            self.__computer_task = None
+
+    def play_computer_turn(self):
+        """コンピュータのターンプレイヤーにバックグラウンドで探索させるメソッド
+
+        探索は `OthelloBoard` ではなく、盤面から作成したビットボード上で行う.
+        探索中もウィンドウは操作でき、結果は `apply_computer_result` で受け取る."""
+        self.__computer_after_id = None
+        player: ComputerPlayer = self.turn_player
+        position = self.get_turn_position()
+
+        # 探索するルートの手は、置けることを示すタイルを置いた座標に限る
+        root_moves = 0
+        for coordinate in self.putable_coordinates:
+            root_moves |= 1 << bitboard.to_square(coordinate)
+
+        # 定石に登録されている局面では探索せずに定石の手を打つ
+        if self.opening_book is not None:
+            move = self.opening_book.choose(*position)
+            if move is not None and root_moves >> move & 1:
+                self.cancel_ponder()
+                self.apply_computer_result(SearchResult(move, 0, 0, 0, 0., [move], is_book=True))
+                return
+
+        # 先読みで予想した手が打たれていれば、先読みの結果をそのまま使う
+        ponder_result = self.__ponder_result
+        self.cancel_ponder()
+        if (
+            ponder_result is not None
+            and (ponder_result.player, ponder_result.opponent) == position
+            and root_moves >> ponder_result.result.move & 1
+        ):
+            self.apply_computer_result(ponder_result.result)
+            return
+
+        # 先読みが終わっていなければ中断させ、終わるのを待ってから探索する.
+        # 予想が当たっていれば、置換表に残った先読みの結果が探索で再利用される
+        self.__computer_task = self.executor.submit(
+            player.engine.search,
+            *position,
+            root_moves,
+            on_done=self.apply_computer_result,
+            pass_stop_event=True,
+            wait_for=self.__engine_task,
+        )
+        self.__engine_task = self.__computer_task
+
+    def apply_computer_result(self, result: SearchResult):
+        """コンピュータの探索結果を受け取り、その手に石を置くメソッド
+
+        Args:
+            result(SearchResult): 探索結果"""
+        self.__computer_task = None
+        self.__last_computer_result = result
+        engine = self.turn_player.engine
+        if isinstance(engine, MCTSEngine) and not result.is_book and not result.is_exact:
+            self.manager_display.update_mcts_info(engine.stats)
+        else:
+            self.manager_display.update_engine_info(result)
+        if result.coordinate is not None:
+            self.put_stone(Stone(self.turn_player.color), result.coordinate)
     
+    def request_ponder(self):
+        """人間のターンの間、相手のコンピュータに人間の手を予想させ、そのあとの局面を先読みさせるメソッド
+
+        予想する手は、直前のコンピュータの探索の読み筋から取り出す.
+        先読みは `ponder_time_budget` 秒で打ち切られ、人間が石を置いたときに中断される."""
+        if self.ponder_time_budget is None or isinstance(self.turn_player, ComputerPlayer):
+            return
+        computer = [player for player in self.players if player != self.turn_player][0]
+        if not isinstance(computer, ComputerPlayer):
+            return
+        self.cancel_ponder()
+        predicted_move = None
+        if self.__last_computer_result is not None and len(self.__last_computer_result.pv) > 1:
+            predicted_move = self.__last_computer_result.pv[1]
+        self.__ponder_task = self.executor.submit(
+            ponder,
+            computer.engine,
+            *self.get_turn_position(),
+            predicted_move,
+            self.ponder_time_budget,
+            on_done=self.store_ponder_result,
+            pass_stop_event=True,
+            wait_for=self.__engine_task,
+            lock=self.__background_lock,
+        )
+        self.__engine_task = self.__ponder_task
+
+    def cancel_ponder(self):
+        """実行中の先読みを中断し、先読みの結果を破棄するメソッド"""
+        if self.__ponder_task is not None:
+            self.__ponder_task.cancel()
+            self.__ponder_task = None
+        self.__ponder_result = None
+
+    def store_ponder_result(self, result: PonderResult | None):
+        """先読みの結果を、コンピュータのターンまで保持するメソッド
+
+        Args:
+            result(PonderResult | None): 先読みの結果"""
+        self.__ponder_task = None
+        self.__ponder_result = result
+
+    def request_hints(self):
+        """人間のターンの間、置けるマスごとの評価をバックグラウンドで求め、ボードに表示するメソッド
+
+        キャッシュにある局面はすぐに表示し、評価が確定していなければ続きの深さから評価し直す.
+        評価は深さが終わるたびに `update_hints` で表示を更新する."""
+        self.cancel_hints()
+        if not self.is_hint_visible or isinstance(self.turn_player, ComputerPlayer):
+            return
+        position = self.get_turn_position()
+        self.__hint_position = position
+        cached = self.hint_cache.get(*position)
+        start_depth = 1
+        if cached is not None:
+            self.hint_overlay.show(cached)
+            if cached.is_final:
+                return
+            start_depth = cached.depth + 1
+
+        # 途中結果はワーカーのスレッドから届くので、メインスレッドに渡して表示する
+        dispatcher = self.executor.dispatcher
+        self.__hint_task = self.executor.submit(
+            analyze_moves,
+            self.hint_engine,
+            self.hint_solver,
+            *position,
+            self.hint_time_budget,
+            lambda hints: dispatcher.post(self.update_hints, position, hints),
+            start_depth,
+            pass_stop_event=True,
+            wait_for=self.__hint_task,
+            lock=self.__background_lock,
+        )
+
+    def cancel_hints(self):
+        """実行中のヒントの評価を中断し、表示しているヒントを消すメソッド
+
+        中断までに求めた評価はキャッシュに残る."""
+        if self.__hint_task is not None:
+            self.__hint_task.cancel()
+        self.__hint_position = None
+        self.hint_overlay.clear()
+
+    def update_hints(self, position: tuple[int, int], hints: PositionHints):
+        """ヒントの評価を受け取り、キャッシュに登録して、表示中の局面のものであれば表示するメソッド
+
+        Args:
+            position(tuple[int, int]): 評価した局面
+            hints(PositionHints): 評価"""
+        self.hint_cache.put(*position, hints)
+        if position == self.__hint_position:
+            self.hint_overlay.show(self.hint_cache.get(*position))
+
+    def set_hint_visible(self, is_visible: bool):
+        """ヒントを表示するかどうかを切り替えるメソッド
+
+        Args:
+            is_visible(bool): 表示するかどうか"""
+        self.is_hint_visible = is_visible
+        if is_visible:
+            self.request_hints()
+        else:
+            self.cancel_hints()
+
     def pass_with_cut_in(self):
         """パスのカットイン演出を実行するメソッド"""
         display_size = self.othello_board.board_display_size + self.manager_display.display_size
@@ -327,6 +646,7 @@ class GameManager:
         returns:
             tuple[PutableSpaceTile]: 全ての置いたタイルを保持するタプル"""
         put_tiles = []
+        putable_coordinates = []
         for x in range(self.othello_board.board_size.x):
             for y in range(self.othello_board.board_size.y):
                 if self.can_put_stone(color, (x, y)):
@@ -336,6 +656,8 @@ class GameManager:
                         (x, y)
                     )
                     put_tiles.append(tile)
+                    putable_coordinates.append((x, y))
+        self.putable_coordinates = tuple(putable_coordinates)
         return tuple(put_tiles)
     
     def count_stone_amount(self, color: Color | None = None) -> int:
@@ -363,30 +685,56 @@ class GameManager:
         else:
             winner_color = Color.WHITE
         winner = self.players[0] if self.players[0].color == winner_color else self.players[1]
+        self.cancel_ponder()
+        self.cancel_endgame_analysis()
+        self.cancel_hints()
+        self.manager_display.update_perfect_play("")
         self.manager_display.indicate_victory_scene(winner)
         self.history.is_finished = True
         self.save_progress()
     
     def redo(self):
-        """一手戻る処理を行うメソッド."""
-        if len(self.history) <= 1:
+        """一手戻る処理を行うメソッド.
+
+        コンピュータと対戦しているときは、人間のターンまで戻る."""
+        # 途中保存や再開のあとは末尾に今の盤面が記録されているので, その前のシーンへ戻る
+        if self.history.is_last_scene(self.othello_board.board, self.turn_player):
+            if len(self.history) <= 1:
+                return
+            self.history.pop()
+        if len(self.history) == 0:
             return
-        history: History = self.history.pop()
+        self.cancel_computer_turn()
+        self.cancel_ponder()
+        self.cancel_endgame_analysis()
+        self.cancel_hints()
+        self.__last_computer_result = None
+        history: Scene = self.history.pop()
+        while isinstance(self.get_player(history.turn_player.color), ComputerPlayer) and len(self.history) > 0:
+            history = self.history.pop()
         board = history.board
         self.othello_board.take_all_pieces()
         for x in range(self.othello_board.board_size.x):
             for y in range(self.othello_board.board_size.y):
                 self.othello_board.put(board[y][x], (x, y))
+
+        # 戻した場面のターンプレイヤーへ交代させる
+        for player in self.players:
+            player.can_put = True
+            if player.color != history.turn_player.color:
+                self.turn_player = player
         self.change_turn()
 
     def save_progress(self):
         """ゲームの途中経過を保存するメソッド
+
+        書き込みは `HistoryWriter` がバックグラウンドで行うので, すぐに戻る.
         """
-        # saveする前に最新の盤面状態をHistoryに追加
-        self.history.append(self.othello_board.board, self.turn_player)
+        # saveする前に最新の盤面状態をHistoryに追加. 前回の保存から進んでいなければ追加しない
+        self.history.append_if_changed(self.othello_board.board, self.turn_player)
 
-        # Historyをデータベースへ保存
-        DBController.save(self.history)
+        # 前回の保存からの差分をデータベースへ保存
+        self.history_writer.submit(self.history)
 
 
 class CounterDisplay(Frame):
@@ -487,6 +835,15 @@ class ManagerDisplay(Frame):
         self.redo_button = Button(self, text=REDO_BUTTON_TEXT, command=redo_command)
         self.save_button = SceneTransitionButton(self, SAVE_BUTTON_TEXT, Display.HOME, lambda: (game_manager.save_progress(), self.reset_game()))
         self.home_button = SceneTransitionButton(self, "ホーム画面へ", Display.HOME, self.reset_game)
+        self.engine_info_label = Label(self)
+        self.perfect_play_label = Label(self)
+        self.hint_visible = tkinter.BooleanVar(self, game_manager.is_hint_visible)
+        self.hint_check_button = Checkbutton(
+            self,
+            text=HINT_CHECK_TEXT,
+            variable=self.hint_visible,
+            command=lambda: game_manager.set_hint_visible(self.hint_visible.get()),
+        )
 
         self.game_reset_func: Callable = game_reset_func
 
@@ -497,6 +854,9 @@ class ManagerDisplay(Frame):
         self.redo_button.grid(row=2, column=0, columnspan=2, sticky=tkinter.W+tkinter.E)
         self.save_button.grid(row=3, column=0, columnspan=2, sticky=tkinter.W+tkinter.E)
         self.home_button.grid(row=4, column=0, columnspan=2, sticky=tkinter.W+tkinter.E)
+        self.engine_info_label.grid(row=6, column=0, columnspan=2, sticky=tkinter.W+tkinter.E)
+        self.perfect_play_label.grid(row=7, column=0, columnspan=2, sticky=tkinter.W+tkinter.E)
+        self.hint_check_button.grid(row=8, column=0, columnspan=2, sticky=tkinter.W)
         
 
     def update_display(
@@ -517,6 +877,38 @@ class ManagerDisplay(Frame):
         self.turn_player_display.update_player_name(player_name)
         self.black_stone_counter.update_counter(black_stone_count)
         self.white_stone_counter.update_counter(white_stone_count)
+
+    def update_engine_info(self, result: SearchResult):
+        """コンピュータの探索結果(探索の深さ、ノード数、NPS)を表示するメソッド
+
+        Args:
+            result(SearchResult): 探索結果"""
+        if result.is_book:
+            self.engine_info_label["text"] = BOOK_MOVE_TEXT
+            return
+        self.engine_info_label["text"] = ENGINE_INFO_FORMAT.format(
+            depth=result.depth,
+            nodes=result.nodes,
+            nps=result.nps,
+        )
+
+    def update_mcts_info(self, stats: MCTSStats):
+        """モンテカルロ木探索の統計(プレイアウトの回数と速度、木のメモリ量)を表示するメソッド
+
+        Args:
+            stats(MCTSStats): 探索の統計"""
+        self.engine_info_label["text"] = MCTS_INFO_FORMAT.format(
+            playouts=stats.playouts,
+            pps=stats.playouts_per_second,
+            memory=stats.tree_bytes // 1024,
+        )
+
+    def update_perfect_play(self, text: str):
+        """完全読みの結果の表示を更新するメソッド
+
+        Args:
+            text(str): 表示する文字列"""
+        self.perfect_play_label["text"] = text
     
     def indicate_victory_scene(self, winner: OthelloPlayer | None):
         """勝利者とホームボタン及びニューゲームボタンを表示させるメソッド
@@ -555,8 +947,10 @@ class SpectatingManager:
     Attributes:
         othello_board(OthelloBoard): 管理するオセロボード
         history(History | None): 管理するゲームの履歴
+        timeline(ReplayTimeline | None): 履歴から作成したシーク用のタイムライン. 全てのシーンを読み込むまでは `None`
         turn_index(int): 現在描画しているターンの番号
-        turn_player(OthelloPlayer | None): 現在のターンプレイヤー"""
+        turn_player(OthelloPlayer | None): 現在のターンプレイヤー
+        executor(TaskExecutor | None): 履歴の残りのシーンを読み込むエグゼキュータ"""
 
     def __init__(
             self,
@@ -565,8 +959,11 @@ class SpectatingManager:
         self.othello_board = othello_board
         self.__manager_display: SpectatingManagerDisplay | None = None
         self.history: History | None = None
+        self.timeline: ReplayTimeline | None = None
         self.turn_index: int = 0
         self.turn_player: OthelloPlayer | None = None
+        self.executor: TaskExecutor | None = None
+        self.__displayed_colors: ColorGrid = ()
     
     @property
     def manager_display(self) -> SpectatingManager:
@@ -597,60 +994,99 @@ class SpectatingManager:
             display_size,
             self.undo,
             self.redo,
+            self.seek,
             self.reset,
         )
+        self.executor = TaskExecutor(TkDispatcher(self.__manager_display), SM_EXECUTOR_WORKERS)
         return self.__manager_display
 
     def create_game(self, history: History) -> None:
         """観戦ゲームを作成するメソッド
+
+        履歴からキーフレームと差分を事前に計算し、任意のターンへシークできるようにする.
+        読み込んでいないシーンがある `LazyHistory` のときは先に盤面を表示し,
+        残りのシーンをバックグラウンドで読み込み終えてからタイムラインを作成する.
         
         Args:
             history(History): 観戦したいゲームの履歴"""
         self.history = history
+        self.othello_board.take_all_pieces()
+        self.__displayed_colors = (None,) * (self.othello_board.board_size.x * self.othello_board.board_size.y)
+        if isinstance(history, LazyHistory) and not history.is_loaded:
+            self.timeline = None
+            history.stream(self.executor, on_loaded=lambda: self.__on_history_loaded(history))
+        else:
+            self.timeline = ReplayTimeline(history)
         self.restore_scene(self.turn_index)
+
+    def __on_history_loaded(self, history: History) -> None:
+        """履歴の全てのシーンを読み込んだときに, タイムラインを作成するメソッド"""
+        if history is self.history:
+            self.timeline = ReplayTimeline(history)
     
     def restore_scene(self, turn_index: int) -> None:
         """指定ターンの `Scene` を復元して、盤面とサブディスプレイを更新するメソッド
         
         Args:
             turn_index(int): 反映するターンの番号"""
-        self.othello_board.take_all_pieces()
-        scene: Scene = self.history[turn_index]
-        black_stone_count = 0
-        white_stone_count = 0
-        for y in range(len(scene.board)):
-            for x in range(len(scene.board[0])):
-                stone: Stone | None = scene.board[y][x]
-                if stone is not None:
-                    self.othello_board.put(stone, (x, y))
-                    match stone.color:
-                        case Color.BLACK: black_stone_count += 1
-                        case Color.WHITE: white_stone_count += 1
-        self.turn_player = scene.turn_player
+        self.seek(turn_index)
+
+    def seek(self, turn_index: int) -> None:
+        """指定ターンへ移動するメソッド
+
+        最も近いキーフレームから目的の盤面を復元し、現在の描画と異なるマスのみを書き換える.
+        タイムラインを作成する前は履歴からシーンを取り出す. 読み込んでいないシーンはその場で読み込む.
+        範囲外のターンが指定されたとき、最初または最後のターンへ移動する.
+
+        Args:
+            turn_index(int): 移動先のターンの番号"""
+        if not self.history:
+            return
+        turn_index = max(0, min(turn_index, len(self.history) - 1))
+        if self.timeline is not None:
+            colors = self.timeline.colors_at(turn_index)
+            black_stone_count, white_stone_count = self.timeline.stone_counts[turn_index]
+            self.turn_player = self.timeline.turn_players[turn_index]
+            width = self.timeline.board_width
+        else:
+            scene = self.history[turn_index]
+            colors = to_color_grid(scene.board)
+            black_stone_count, white_stone_count = colors.count(Color.BLACK), colors.count(Color.WHITE)
+            self.turn_player = scene.turn_player
+            width = len(scene.board[0])
+        for index, color in ReplayTimeline.diff(self.__displayed_colors, colors):
+            stone = None if color is None else Stone.create(color)
+            self.othello_board.put(stone, (index % width, index // width))
+        self.__displayed_colors = colors
+        self.turn_index = turn_index
+
         self.__manager_display.update_display(
             self.turn_player.name,
             black_stone_count,
             white_stone_count,
         )
+        self.__manager_display.update_timeline(turn_index, len(self.history))
         
     def undo(self):
         """一手戻すメソッド"""
         if self.turn_index > 0:
-            self.turn_index -= 1
-            self.restore_scene(self.turn_index)
+            self.seek(self.turn_index - 1)
 
     def redo(self):
         """一手進めるメソッド"""
         if self.turn_index < len(self.history) - 1:
-            self.turn_index += 1
-            self.restore_scene(self.turn_index)
+            self.seek(self.turn_index + 1)
 
     def reset(self):
         """観戦状態をリセットするメソッド"""
-        self.othello_board.take_all_pieces
+        if isinstance(self.history, LazyHistory):
+            self.history.stop_streaming()
+        self.othello_board.take_all_pieces()
         self.turn_index = 0
-        self.turn_player = 0
+        self.turn_player = None
         self.history = None
+        self.timeline = None
+        self.__displayed_colors = ()
 
 
 class SpectatingManagerDisplay(Frame):
@@ -661,6 +1097,7 @@ class SpectatingManagerDisplay(Frame):
             display_size: tuple[int, int],
             undo_command: Callable[[], None],
             redo_command: Callable[[], None],
+            seek_command: Callable[[int], None],
             reset_func: Callable[[], None],
     ):
         super().__init__(
@@ -668,6 +1105,18 @@ class SpectatingManagerDisplay(Frame):
             width=display_size[0],
             height=display_size[1]
         )
+        self.seek_command: Callable[[int], None] = seek_command
+        self.__is_updating_timeline: bool = False
+        self.__turn_index: int = 0
+        self.__turn_count: int = 0
+
+        # 自動再生の状態
+        self.__is_playing: bool = False
+        self.__is_autoplay_seeking: bool = False
+        self.__autoplay_after_id: str | None = None
+        self.__playback_speed: float = SM_DEFAULT_PLAYBACK_SPEED
+        self.__anchor_time: float = 0.
+        self.__anchor_turn_index: int = 0
         self.display_size = Coordinate(display_size)
         self.turn_player_display = TurnPlayerDisplay(self, display_size[0])
         self.black_stone_counter = CounterDisplay(
@@ -690,11 +1139,32 @@ class SpectatingManagerDisplay(Frame):
             text=SM_REDO_BUTTON_TEXT,
             command=redo_command,
         )
+        self.timeline_scale = Scale(
+            self,
+            from_=0,
+            to=0,
+            orient=tkinter.HORIZONTAL,
+            command=self.__on_timeline_moved,
+        )
+        self.timeline_label = Label(self)
+        self.play_button = Button(
+            self,
+            text=SM_PLAY_BUTTON_TEXT,
+            command=self.toggle_playback,
+        )
+        self.speed_box = Combobox(
+            self,
+            values=[f"x{speed}" for speed in SM_PLAYBACK_SPEEDS],
+            state="readonly",
+            width=5,
+        )
+        self.speed_box.current(SM_PLAYBACK_SPEEDS.index(SM_DEFAULT_PLAYBACK_SPEED))
+        self.speed_box.bind("<<ComboboxSelected>>", self.__on_speed_selected)
         self.home_button = SceneTransitionButton(
             self,
             SM_HOME_BUTTON_TEXT,
             Display.HOME,
-            reset_func,
+            lambda: (self.pause(), reset_func()),
         )
 
         # 配置
@@ -703,8 +1173,12 @@ class SpectatingManagerDisplay(Frame):
         self.white_stone_counter.grid(row=1, column=1, sticky=tkinter.W+tkinter.E)
         self.redo_button.grid(row=2, column=0, sticky="we")
         self.undo_button.grid(row=2, column=1, sticky="we")
+        self.timeline_scale.grid(row=3, column=0, columnspan=2, sticky="we")
+        self.timeline_label.grid(row=4, column=0, columnspan=2, sticky="we")
+        self.play_button.grid(row=5, column=0, sticky="we")
+        self.speed_box.grid(row=5, column=1, sticky="we")
         self.home_button.grid(
-            row=3,
+            row=6,
             column=0,
             columnspan=2,
             sticky="we"
@@ -718,4 +1192,112 @@ class SpectatingManagerDisplay(Frame):
     ):
         self.turn_player_display.update_player_name(player_name)
         self.black_stone_counter.update_counter(black_stone_count)
-        self.white_stone_counter.update_counter(white_stone_count)
\ No newline at end of file
+        self.white_stone_counter.update_counter(white_stone_count)
+
+    def update_timeline(self, turn_index: int, turn_count: int):
+        """タイムラインのスクラバーと手数の表示を更新するメソッド
+
+        Args:
+            turn_index(int): 現在のターンの番号
+            turn_count(int): 履歴に含まれるターンの数"""
+        self.__turn_index = turn_index
+        self.__turn_count = turn_count
+        self.__is_updating_timeline = True
+        self.timeline_scale.configure(to=max(turn_count - 1, 0))
+        self.timeline_scale.set(turn_index)
+        self.__is_updating_timeline = False
+        self.timeline_label["text"] = SM_TIMELINE_LABEL_FORMAT.format(turn=turn_index, total=turn_count - 1)
+
+        # 再生中に手動でシークされた場合、そのターンから再生し直す
+        if self.__is_playing and not self.__is_autoplay_seeking:
+            self.__set_anchor()
+
+    def __on_timeline_moved(self, value: str):
+        """スクラバーが動かされたときに指定ターンへシークするメソッド"""
+        if self.__is_updating_timeline:
+            return
+        self.seek_command(round(float(value)))
+
+    def toggle_playback(self):
+        """再生と一時停止を切り替えるメソッド"""
+        if self.__is_playing:
+            self.pause()
+        else:
+            self.play()
+
+    def play(self):
+        """自動再生を開始するメソッド
+
+        最後のターンを表示しているときは、最初のターンから再生する."""
+        if self.__is_playing or self.__turn_count <= 1:
+            return
+        if self.__turn_index >= self.__turn_count - 1:
+            self.seek_command(0)
+        self.__is_playing = True
+        self.play_button["text"] = SM_PAUSE_BUTTON_TEXT
+        self.__set_anchor()
+        self.__schedule_next_tick()
+
+    def pause(self):
+        """自動再生を一時停止するメソッド"""
+        self.__is_playing = False
+        self.play_button["text"] = SM_PLAY_BUTTON_TEXT
+        if self.__autoplay_after_id is not None:
+            self.after_cancel(self.__autoplay_after_id)
+            self.__autoplay_after_id = None
+
+    def set_playback_speed(self, speed: float):
+        """再生速度を変更するメソッド
+
+        Args:
+            speed(float): 通常速度に対する倍率"""
+        self.__playback_speed = speed
+        if self.__is_playing:
+            self.__set_anchor()
+            self.after_cancel(self.__autoplay_after_id)
+            self.__schedule_next_tick()
+
+    @property
+    def __seconds_per_move(self) -> float:
+        return SECONDS_PER_MOVE_AT_NORMAL_SPEED / self.__playback_speed
+
+    def __set_anchor(self):
+        """再生の基準となる時刻とターンを現在のものに設定するメソッド"""
+        self.__anchor_time = time.monotonic()
+        self.__anchor_turn_index = self.__turn_index
+
+    def __schedule_next_tick(self):
+        """次のターンを表示すべき時刻に `__tick` を予約するメソッド
+
+        基準時刻からの経過時間をもとに次の時刻を求めるので、
+        コールバックの遅れが積み重なってずれていくことはない."""
+        steps = self.__turn_index - self.__anchor_turn_index + 1
+        next_time = self.__anchor_time + steps * self.__seconds_per_move
+        delay_ms = int((next_time - time.monotonic()) * 1000)
+        self.__autoplay_after_id = self.after(max(delay_ms, MIN_AUTOPLAY_DELAY_MS), self.__tick)
+
+    def __tick(self):
+        """自動再生で表示すべきターンへ移動するメソッド
+
+        描画が再生速度に追いつかないときは、途中のターンの描画を飛ばして
+        現在時刻に表示すべきターンへ直接移動する."""
+        self.__autoplay_after_id = None
+        if not self.__is_playing:
+            return
+        elapsed = time.monotonic() - self.__anchor_time
+        target_index = min(
+            self.__anchor_turn_index + int(elapsed / self.__seconds_per_move),
+            self.__turn_count - 1,
+        )
+        if target_index != self.__turn_index:
+            self.__is_autoplay_seeking = True
+            self.seek_command(target_index)
+            self.__is_autoplay_seeking = False
+        if self.__turn_index >= self.__turn_count - 1:
+            self.pause()
+            return
+        self.__schedule_next_tick()
+
+    def __on_speed_selected(self, event: tkinter.Event):
+        """再生速度が選択されたときの処理"""
+        self.set_playback_speed(SM_PLAYBACK_SPEEDS[self.speed_box.current()])
@@ -0,0 +1,259 @@
+# 着手ヒントの表示
+# 人間のターンの間, 置けるマスごとの評価値をバックグラウンドで求め, `PutableSpaceTile` の上に重ねて表示する.
+# 浅い探索の結果をまず表示し, 深い探索が終わるたびに書き換える. 空きマスが少ないときは読み切った石差を表示する.
+# 結果は局面ごとにキャッシュするので, 待ったで戻った局面ではすぐにヒントが表示される.
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, TYPE_CHECKING
+import threading
+import time
+
+from bitboard import legal_moves, play, iter_squares, to_coordinate, SQUARE_COUNT
+from engine import AlphaBetaEngine, SearchTimeout, TERMINAL_SCORE_SCALE
+from endgame import EndgameSolver
+
+if TYPE_CHECKING:
+    from objects import OthelloBoard
+
+
+HINT_TAG = "hint"
+HINT_CACHE_ENTRIES = 256
+HINT_FONT_RATIO = .3     # マスの大きさに対するヒントの文字の大きさ
+HINT_HEURISTIC_COLOR = "white"
+HINT_EXACT_COLOR = "gold"
+HINT_BEST_COLOR = "deep sky blue"
+
+
+@dataclass
+class MoveHint:
+    """1つの手の評価を保持するデータクラス
+
+    Attributes:
+        move(int): 手のマス
+        score(int): 手番側から見た評価値. `is_exact` のときは終局時の石差
+        depth(int): 評価に使った探索の深さ
+        is_exact(bool): 終局まで読み切った結果かどうか"""
+    move: int
+    score: int
+    depth: int
+    is_exact: bool = False
+
+    @property
+    def label(self) -> str:
+        """マスの上に表示する文字列"""
+        score = self.score
+        if not self.is_exact and abs(score) >= TERMINAL_SCORE_SCALE:
+            # 一部の読み筋だけが終局した評価値は, 石差の尺度に直して表示する
+            score = int(score / TERMINAL_SCORE_SCALE)
+        return f"{score:+d}" if score != 0 else "0"
+
+    @property
+    def value(self) -> int:
+        """評価値と石差を比べられるように, 探索と同じ尺度に直した値"""
+        return self.score * TERMINAL_SCORE_SCALE if self.is_exact else self.score
+
+
+@dataclass
+class PositionHints:
+    """1つの局面の全ての手の評価を保持するデータクラス
+
+    Attributes:
+        hints(dict[int, MoveHint]): 手ごとの評価
+        depth(int): 評価に使った探索の深さ
+        is_final(bool): これ以上評価が変わらないかどうか"""
+    hints: dict[int, MoveHint]
+    depth: int
+    is_final: bool = False
+
+    @property
+    def best_value(self) -> int | None:
+        """最もよい手の `MoveHint.value`. 手がないときは `None`"""
+        if not self.hints:
+            return None
+        return max(hint.value for hint in self.hints.values())
+
+
+class HintCache:
+    """局面ごとのヒントを保持するLRUキャッシュ
+
+    Attributes:
+        max_entries(int): 保持する局面の数の上限"""
+
+    def __init__(self, max_entries: int = HINT_CACHE_ENTRIES):
+        self.max_entries: int = max_entries
+        self.__entries: OrderedDict[tuple[int, int], PositionHints] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, player: int, opponent: int) -> PositionHints | None:
+        """局面のヒントを返すメソッド. 登録がないときは `None`"""
+        hints = self.__entries.get((player, opponent))
+        if hints is not None:
+            self.__entries.move_to_end((player, opponent))
+        return hints
+
+    def put(self, player: int, opponent: int, hints: PositionHints):
+        """局面のヒントを登録するメソッド. 登録済みのヒントより浅い結果は無視する"""
+        current = self.__entries.get((player, opponent))
+        if current is not None and (current.is_final or current.depth > hints.depth) and not hints.is_final:
+            return
+        self.__entries[(player, opponent)] = hints
+        self.__entries.move_to_end((player, opponent))
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def clear(self):
+        """全てのヒントを削除するメソッド"""
+        self.__entries.clear()
+
+
+def _heuristic_hint(move: int, score: int, depth: int, empties: int) -> MoveHint:
+    """探索の評価値から手の評価を作成する関数
+
+    終局まで読んだときだけ石差に直す. 深さを制限した探索の終局のスコアは一部の読み筋だけのものなので, 評価値のままにする."""
+    if depth == empties:
+        return MoveHint(move, score // TERMINAL_SCORE_SCALE, depth, True)
+    return MoveHint(move, score, depth)
+
+
+def analyze_moves(
+        engine: AlphaBetaEngine,
+        solver: EndgameSolver | None,
+        player: int,
+        opponent: int,
+        time_budget: float,
+        on_progress: Callable[[PositionHints], None] | None = None,
+        start_depth: int = 1,
+        stop_event: threading.Event | None = None,
+) -> PositionHints:
+    """局面の全ての手を評価する関数
+
+    深さを1つずつ増やしながら手ごとに窓を狭めずに探索し, 深さが終わるたびに `on_progress` を呼ぶ.
+    `solver` が読み切れる局面では, 最初の深さのあとに全ての手を読み切る.
+    `on_progress` はこの関数を実行しているスレッドから呼ばれる.
+
+    Args:
+        engine(AlphaBetaEngine): 評価に使うエンジン. 他の処理と同時に使ってはいけない
+        solver(EndgameSolver | None): 読み切りに使うソルバー
+        player(int): 手番側の石
+        opponent(int): 相手側の石
+        time_budget(float): 持ち時間(秒)
+        on_progress(Callable[[PositionHints], None] | None, optional): 途中結果を受け取る関数. default to None.
+        start_depth(int, optional): 最初に探索する深さ. default to 1.
+        stop_event(threading.Event | None, optional): 評価を中断させるためのイベント. default to None.
+
+    Returns:
+        PositionHints: 最後に完了した深さの評価. 中断されたときも途中までの評価を返す"""
+    deadline = time.perf_counter() + time_budget
+    moves = legal_moves(player, opponent)
+    empties = SQUARE_COUNT - (player | opponent).bit_count()
+    result = PositionHints({}, 0, moves == 0)
+    if moves == 0:
+        return result
+
+    depth = start_depth
+    while depth <= min(engine.max_depth, empties):
+        hints = {}
+        try:
+            for move in iter_squares(moves):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise SearchTimeout()
+                score = -engine.search_window(
+                    *play(player, opponent, move),
+                    depth - 1,
+                    time_budget=remaining,
+                    stop_event=stop_event,
+                )
+                hints[move] = _heuristic_hint(move, score, depth, empties)
+        except SearchTimeout:
+            return result
+        is_final = depth == empties
+        result = PositionHints(hints, depth, is_final)
+        if on_progress is not None:
+            on_progress(result)
+        if is_final:
+            return result
+
+        # 浅い結果を表示したあと, 読み切れる局面では全ての手を読み切る
+        if solver is not None and solver.can_solve(player, opponent):
+            try:
+                differences = solver.solve_moves(
+                    player,
+                    opponent,
+                    moves,
+                    deadline - time.perf_counter(),
+                    stop_event,
+                )
+            except SearchTimeout:
+                solver = None
+            else:
+                result = PositionHints(
+                    {move: MoveHint(move, difference, empties, True) for move, difference in differences.items()},
+                    empties,
+                    True,
+                )
+                if on_progress is not None:
+                    on_progress(result)
+                return result
+        depth += 1
+    return result
+
+
+class HintOverlay:
+    """ボードの置けるマスの上にヒントの文字を重ねて表示するクラス
+
+    文字はボードのキャンバスに描画する. クリックはキャンバスで受け取っているので, 文字がクリックを妨げることはない.
+
+    Attributes:
+        othello_board(OthelloBoard): 表示するボード"""
+
+    def __init__(self, othello_board: OthelloBoard):
+        self.othello_board: OthelloBoard = othello_board
+        self.__items: dict[int, int] = {}
+
+    def show(self, position_hints: PositionHints):
+        """ヒントを表示するメソッド
+
+        表示済みのマスは文字だけを書き換え, 評価のなくなったマスの文字は消す.
+
+        Args:
+            position_hints(PositionHints): 表示するヒント"""
+        canvas = self.othello_board.board_canvas
+        for move in list(self.__items):
+            if move not in position_hints.hints:
+                canvas.delete(self.__items.pop(move))
+
+        origin = self.othello_board.get_tkcoor_from_board_coor((0, 0))
+        square_size = self.othello_board.get_tkcoor_from_board_coor((1, 1)) - origin
+        # 負のフォントサイズはピクセル単位の大きさを表す
+        font = ("", -max(int(square_size.y * HINT_FONT_RATIO), 1), "bold")
+        best_value = position_hints.best_value
+        for move, hint in position_hints.hints.items():
+            if hint.value == best_value:
+                color = HINT_BEST_COLOR
+            elif hint.is_exact:
+                color = HINT_EXACT_COLOR
+            else:
+                color = HINT_HEURISTIC_COLOR
+            if move in self.__items:
+                canvas.itemconfigure(self.__items[move], text=hint.label, fill=color)
+                continue
+            top_left = self.othello_board.get_tkcoor_from_board_coor(to_coordinate(move))
+            self.__items[move] = canvas.create_text(
+                top_left.x + square_size.x // 2,
+                top_left.y + square_size.y // 2,
+                text=hint.label,
+                fill=color,
+                font=font,
+                tag=HINT_TAG,
+            )
+        canvas.tag_raise(HINT_TAG)
+
+    def clear(self):
+        """表示しているヒントを全て消すメソッド"""
+        self.othello_board.board_canvas.delete(HINT_TAG)
+        self.__items.clear()
@@ -1,16 +1,26 @@
+from __future__ import annotations
 
+from collections import OrderedDict
 from dataclasses import dataclass
-from uuid import uuid4, UUID
-from datetime import date
-import mysql.connector
+from functools import partial
+from typing import Callable
+from uuid import UUID, uuid4
+from datetime import date, datetime
 import json
+import sys
+import threading
 
 from objects import Stone
 from systems import *
+from tasks import Task, TaskExecutor
+from movelist import SceneRecord
+from storage import HistoryStorage, HistoryRecord, HistoryOutline, SaveStats, open_storage
 
 
-INDEX_LIST_TABLE_NAME = "index_list"
-SCENE_LIST_TABLE_NAME = "scene_list"
+LAZY_HISTORY_CHUNK_SCENES = 16     # `LazyHistory` が1回に読み込むシーンの数
+HISTORY_CACHE_ENTRIES = CONFIG.get("HISTORY_CACHE_ENTRIES", 16)
+HISTORY_CACHE_MAX_BYTES = CONFIG.get("HISTORY_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+STONE_ESTIMATED_BYTES = 1024       # Stoneオブジェクト1つの大きさの目安(バイト). 画像の画素は含めない
 
 
 @dataclass
@@ -27,8 +37,15 @@ class History(list):
     リストを継承したコレクションクラスであり, 保持する要素は全て `Scene` クラスの
     インスタンスである.
 
+    データベースへは差分だけを保存するので, 保存済みのシーンの数を記録する.
+    シーンを取り除くときは, 保存済みの内容と食い違ったことを記録するために `pop` を使う.
+
     Attribute:
         uuid(str): 
+        saved_scene_count(int): データベースに保存されているシーンの数
+        clean_scene_count(int): 先頭から何シーンがデータベースの内容と一致しているか
+        saved_is_finished(bool | None): データベースに保存されている `is_finished`. 未保存のときは `None`
+        storage_format(str | None): データベースでの保存形式. 未保存のときは `None`
     """
     def __init__(self):
         super().__init__()
@@ -36,6 +53,10 @@ class History(list):
         self.uuid = str(uuid4())
         self.title = date.today().strftime("%Y-%m/%d")
         self.is_finished = False
+        self.saved_scene_count = 0
+        self.clean_scene_count = 0
+        self.saved_is_finished: bool | None = None
+        self.storage_format: str | None = None
     
     def append(self, board: list[list[None | Stone]], turn_player: OthelloPlayer) -> None:
         """履歴にシーンを追加するメソッド
@@ -45,44 +66,335 @@ class History(list):
             turn_player(OthelloPlayer): ターンプレイヤー"""
         super().append(Scene(board, turn_player))
 
+    def append_if_changed(self, board: list[list[None | Stone]], turn_player: OthelloPlayer) -> bool:
+        """末尾のシーンと盤面とターンプレイヤーが異なるときだけ, 履歴にシーンを追加するメソッド
+
+        途中保存や再開のあとに, 同じ場面が続けて記録されないようにする.
+
+        Args:
+            board(list[list[None | Stone]]): ボード状況を保持する二次元リスト
+            turn_player(OthelloPlayer): ターンプレイヤー
+
+        Returns:
+            bool: 追加したかどうか"""
+        if self.is_last_scene(board, turn_player):
+            return False
+        self.append(board, turn_player)
+        return True
+
+    def is_last_scene(self, board: list[list[None | Stone]], turn_player: OthelloPlayer) -> bool:
+        """末尾のシーンと盤面とターンプレイヤーが同じかどうかを返すメソッド. 履歴が空のときは `False`
+
+        Args:
+            board(list[list[None | Stone]]): ボード状況を保持する二次元リスト
+            turn_player(OthelloPlayer): ターンプレイヤー"""
+        if len(self) == 0:
+            return False
+        last = self[-1]
+        return last.turn_player.color == turn_player.color and _to_colors(last.board) == _to_colors(board)
+
+    def pop(self, index: int = -1) -> Scene:
+        """シーンを取り除くメソッド. 保存済みのシーンを取り除いたときは, 次の保存でデータベースからも削除する"""
+        position = index if index >= 0 else len(self) + index
+        scene = super().pop(index)
+        self.clean_scene_count = min(self.clean_scene_count, position)
+        return scene
+
+    def mark_saved(self):
+        """全てのシーンがデータベースの内容と一致していることを記録するメソッド"""
+        self.saved_scene_count = self.clean_scene_count = len(self)
+        self.saved_is_finished = self.is_finished
+
+    @property
+    def is_saved(self) -> bool:
+        """全てのシーンがデータベースの内容と一致しているかどうか"""
+        return (
+            self.clean_scene_count == self.saved_scene_count == len(self)
+            and self.saved_is_finished == self.is_finished
+        )
+
+    def copy(self) -> History:
+        """シーンを共有する履歴の写しを返すメソッド. 写しにシーンを追加したり取り除いたりしても, 元の履歴は変わらない"""
+        history = History()
+        list.extend(history, self)
+        history.uuid = self.uuid
+        history.title = self.title
+        history.is_finished = self.is_finished
+        history.saved_scene_count = self.saved_scene_count
+        history.clean_scene_count = self.clean_scene_count
+        history.saved_is_finished = self.saved_is_finished
+        history.storage_format = self.storage_format
+        return history
+
+    def to_record(self) -> HistoryRecord:
+        """保存する内容を, tkinterのオブジェクトを含まない `HistoryRecord` に写し取るメソッド
+
+        写し取った内容は別スレッドから使用できる."""
+        return HistoryRecord(
+            self.uuid,
+            self.title,
+            self.is_finished,
+            [(DBController.convert_board_to_list(scene), DBController.get_turn_player(scene)) for scene in self],
+            self.storage_format,
+            self.saved_scene_count,
+            self.clean_scene_count,
+            self.saved_is_finished,
+        )
+
+
+class LazyHistory(History):
+    """シーンを必要になったときにデータベースから読み込む履歴
+
+    最初と最後のシーンだけを読み込んだ状態で作成するので, 長い対局でもすぐに盤面を表示できる.
+    残りのシーンは, 参照されたときにそのシーンを含む範囲を読み込むか, `stream` でバックグラウンドから少しずつ読み込む.
+    読み込んだシーンは色の名前のまま保持し, 参照されたときに `Scene` に変換する.
+    `Scene` はtkinterのオブジェクトを含むので, 変換はメインスレッドで行う.
+    """
+
+    def __init__(
+            self,
+            outline: HistoryOutline,
+            load_range: Callable[[int, int], list[SceneRecord]],
+            on_decoded: Callable[[History], None] | None = None,
+    ):
+        """
+        Args:
+            outline(HistoryOutline): 最初と最後のシーンだけを読み込んだ履歴
+            load_range(Callable[[int, int], list[SceneRecord]]): シーンの番号の範囲を受け取り, そのシーンを読み込む関数.
+                別スレッドから呼び出せるものを渡す
+            on_decoded(Callable[[History], None] | None, optional): 全てのシーンを `Scene` に変換したときに呼ぶ関数.
+                default to None."""
+        super().__init__()
+        self.uuid = outline.uuid
+        self.title = outline.title
+        self.is_finished = outline.is_finished
+        self.storage_format = outline.storage_format
+        self.__records: dict[int, SceneRecord] = dict(outline.scenes)
+        self.__load_range = load_range
+        self.__stream_task: Task | None = None
+        self.__on_decoded = on_decoded
+        self.__undecoded_count: int = outline.scene_count
+
+        # 読み込んでいないシーンは None にしておく
+        list.extend(self, [None] * outline.scene_count)
+        self.mark_saved()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        scene = super().__getitem__(index)
+        if scene is None:
+            position = index + len(self) if index < 0 else index
+            if position not in self.__records:
+                start = position - position % LAZY_HISTORY_CHUNK_SCENES
+                self.load_range(start, start + LAZY_HISTORY_CHUNK_SCENES)
+            board_list, turn_player_str = self.__records.pop(position)
+            scene = Scene(
+                DBController.convert_list_to_board(board_list),
+                DBController.convert_str_to_turnplayer(turn_player_str),
+            )
+            list.__setitem__(self, position, scene)
+            self.__undecoded_count -= 1
+            if self.__undecoded_count == 0 and self.__on_decoded is not None:
+                self.__on_decoded(self)
+        return scene
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def pop(self, index: int = -1) -> Scene:
+        # 読み込んでいないシーンを取り除くときも `Scene` を返す
+        self[index]
+        return super().pop(index)
+
+    @property
+    def is_loaded(self) -> bool:
+        """全てのシーンを読み込んだかどうか"""
+        return self.__missing_range(0, len(self)) is None
+
+    def __is_missing(self, position: int) -> bool:
+        return list.__getitem__(self, position) is None and position not in self.__records
+
+    def __missing_range(self, start: int, stop: int) -> tuple[int, int] | None:
+        """`start` 番目から `stop` 番目の前までで, 読み込んでいない最初のシーンから最後のシーンまでの範囲を返すメソッド"""
+        missing = [position for position in range(max(start, 0), min(stop, len(self))) if self.__is_missing(position)]
+        if not missing:
+            return None
+        return missing[0], missing[-1] + 1
+
+    def load_range(self, start: int, stop: int):
+        """`start` 番目から `stop` 番目の前までのシーンのうち, 読み込んでいないものをまとめて読み込むメソッド
+
+        Args:
+            start(int): 最初のシーンの番号
+            stop(int): 最後のシーンの次の番号"""
+        missing_range = self.__missing_range(start, stop)
+        if missing_range is not None:
+            self.__store(missing_range[0], self.__load_range(*missing_range))
+
+    def __store(self, start: int, records: list[SceneRecord]):
+        """読み込んだシーンを記録するメソッド. その間に読み込まれたシーンや取り除かれたシーンは上書きしない"""
+        for position, record in enumerate(records, start):
+            if position < len(self) and self.__is_missing(position):
+                self.__records[position] = record
+
+    def stream(self, executor: TaskExecutor, on_loaded: Callable[[], None] | None = None):
+        """読み込んでいないシーンを, 先頭から `LAZY_HISTORY_CHUNK_SCENES` 個ずつバックグラウンドで読み込むメソッド
+
+        読み込みに失敗したときは止める. 残りのシーンは参照されたときに読み込む.
+
+        Args:
+            executor(TaskExecutor): データベースへの問い合わせを実行するエグゼキュータ
+            on_loaded(Callable[[], None] | None, optional): 全てのシーンを読み込んだときにメインスレッドで呼ぶ関数. default to None."""
+        self.stop_streaming()
+        missing_range = self.__missing_range(0, len(self))
+        if missing_range is None:
+            if on_loaded is not None:
+                on_loaded()
+            return
+        start = missing_range[0]
+        stop = min(missing_range[1], start + LAZY_HISTORY_CHUNK_SCENES)
+
+        def on_done(records: list[SceneRecord]):
+            self.__stream_task = None
+            self.__store(start, records)
+            self.stream(executor, on_loaded)
+
+        def on_error(_: BaseException):
+            self.__stream_task = None
+
+        self.__stream_task = executor.submit(self.__load_range, start, stop, on_done=on_done, on_error=on_error)
+
+    def stop_streaming(self):
+        """`stream` による読み込みを止めるメソッド"""
+        if self.__stream_task is not None:
+            self.__stream_task.cancel()
+            self.__stream_task = None
+
+
+class HistoryCache:
+    """復元した履歴を保持するLRUキャッシュ
+
+    保持する履歴の数と, おおよそのバイト数の両方に上限を設ける.
+    履歴は呼び出し元が変更してもよいように, 登録するときと取り出すときに写しを作る.
+    保存や削除のスレッドから `invalidate` を呼べるよう, 操作はロックで守る.
+
+    Attributes:
+        max_entries(int): 保持する履歴の数の上限
+        max_bytes(int): 保持する履歴の大きさの合計の上限(バイト)
+        size_bytes(int): 保持している履歴の大きさの合計(バイト)"""
+
+    def __init__(self, max_entries: int = HISTORY_CACHE_ENTRIES, max_bytes: int = HISTORY_CACHE_MAX_BYTES):
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+        self.size_bytes: int = 0
+        self.__entries: OrderedDict[str, tuple[History, int]] = OrderedDict()
+        self.__generation: int = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def generation(self) -> int:
+        """`invalidate` や `clear` が呼ばれるたびに増える番号. 読み込み中に変更された履歴を登録しないために使う"""
+        return self.__generation
+
+    def get(self, uuid: str) -> History | None:
+        """履歴の写しを返すメソッド. 登録がないときは `None`"""
+        with self.__lock:
+            entry = self.__entries.get(uuid)
+            if entry is None:
+                return None
+            self.__entries.move_to_end(uuid)
+        return entry[0].copy()
+
+    def put(self, history: History, generation: int | None = None):
+        """履歴の写しを登録するメソッド
+
+        データベースの内容と一致しない履歴と, 1つで `max_bytes` を超える履歴は登録しない.
+
+        Args:
+            history(History): 登録する履歴
+            generation(int | None, optional): 履歴を読み込み始めたときの `generation`.
+                その後に `invalidate` が呼ばれていたら登録しない. default to None."""
+        if not history.is_saved:
+            return
+        history = history.copy()
+        size_bytes = _estimate_history_bytes(history)
+        if size_bytes > self.max_bytes:
+            return
+        with self.__lock:
+            if generation is not None and generation != self.__generation:
+                return
+            self.__discard(history.uuid)
+            self.__entries[history.uuid] = (history, size_bytes)
+            self.size_bytes += size_bytes
+            while len(self.__entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.__entries.popitem(last=False)
+                self.size_bytes -= evicted_bytes
+
+    def invalidate(self, uuid: str):
+        """履歴を削除するメソッド. 登録がないときも, 読み込み中の同じ履歴が登録されないようにする"""
+        with self.__lock:
+            self.__generation += 1
+            self.__discard(uuid)
+
+    def clear(self):
+        """全ての履歴を削除するメソッド"""
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+            self.size_bytes = 0
+
+    def __discard(self, uuid: str):
+        entry = self.__entries.pop(uuid, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+
+def _estimate_history_bytes(history: History) -> int:
+    """履歴のおおよその大きさ(バイト)を返す関数. 石はStoneオブジェクトの数から見積もる"""
+    size_bytes = sys.getsizeof(history)
+    for scene in history:
+        size_bytes += sys.getsizeof(scene) + sys.getsizeof(scene.board)
+        for row in scene.board:
+            size_bytes += sys.getsizeof(row) + STONE_ESTIMATED_BYTES * sum(stone is not None for stone in row)
+    return size_bytes
+
+
+def _to_colors(board: list[list[None | Stone]]) -> list[list[Color | None]]:
+    """盤面を石の色の二次元リストに変換する関数"""
+    return [[None if stone is None else stone.color for stone in row] for row in board]
+
+
 class DBController:
-    """データベースとやりとりするためのコントローラ"""
+    """データベースとやりとりするためのコントローラ
+
+    読み書きは database_info.yaml の `storage_backend` で選んだ保存先(`HistoryStorage`)に任せる.
+    保存先は複数のスレッドから同時に使用できる.
+    復元した履歴は `cache` に保持し, 同じ履歴を続けて復元するときはデータベースを読み直さない.
+    保存や削除をした履歴は `cache` から取り除く."""
 
-    conn = None
-    cursor = None
+    storage: HistoryStorage | None = None
+    last_save_stats: SaveStats | None = None
+    cache: HistoryCache = HistoryCache()
+    __initialize_lock = threading.Lock()
 
     @classmethod
-    def initialize(cls):
-        
-        if cls.conn is None:
-            config = load_database_info()
-            cls.conn = mysql.connector.connect(
-                host = config["sql_host"],
-                user = config["sql_user"],
-                password = config["sql_password"],
-                database = config["sql_database"]
-            )
-            cls.cursor = cls.conn.cursor()
-
-            # 履歴の一覧を保存するテーブル
-            cls.cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS {INDEX_LIST_TABLE_NAME}(
-                        uuid BINARY(16) PRIMARY KEY,
-                        title CHAR(10),
-                        is_finished BOOLEAN
-                )
-            """)
-
-            # ターンごとの盤面状態を保存するテーブル(history_listテーブルと関連付け)
-            cls.cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS {SCENE_LIST_TABLE_NAME}(
-                        id INT PRIMARY KEY AUTO_INCREMENT,
-                        history_id BINARY(16),
-                        board_status JSON,
-                        turn_player CHAR(5),
-                        FOREIGN KEY (history_id) REFERENCES {INDEX_LIST_TABLE_NAME}(uuid)
-                )
-            """)
+    def initialize(cls) -> HistoryStorage:
+        """保存先を開き, テーブルがなければ作成するメソッド. 2回目以降の呼び出しでは開いた保存先を返す
+
+        Returns:
+            HistoryStorage: 開いた保存先
+
+        Raises:
+            StorageUnavailableError: 保存先に接続できないときに生じる"""
+        with cls.__initialize_lock:
+            if cls.storage is None:
+                cls.storage = open_storage()
+            return cls.storage
 
     @staticmethod
     def convert_board_to_list(scene: Scene) -> list :
@@ -219,54 +531,63 @@ class DBController:
             return OthelloPlayer(Color.WHITE, "後手")
     
     @classmethod
-    def save(cls, history: History) -> None:
+    def save(cls, history: History) -> SaveStats:
         """履歴をデータベースへ保存するメソッド
+
+        前回の保存からの差分だけを書き込む. index_listテーブルの行は `is_finished` が変わったときだけ追加または更新する.
+        同じ履歴を何度保存してもよく, 1手ごとに保存しても1手分の書き込みで済む.
+
+        初めて保存する履歴は `STORAGE_FORMAT` の形式で, 保存済みの履歴はその形式で保存する.
+        `MOVES_FORMAT` では move_listテーブルの1行に手の並びを書き込む. 初期配置から合法手でつながっていない履歴は,
+        `SCENES_FORMAT` で保存する.
+        `SCENES_FORMAT` では scene_listテーブルの保存済みの内容と食い違うシーンを削除してから, 新しいシーンだけを
+        `SAVE_CHUNK_ROWS` 行ずつ複数行の INSERT 文にまとめて追加する.
+
+        全体を1つのトランザクションで確定し, 途中で失敗したときはロールバックするので, 一部だけが保存されることはない.
+        シーンは (履歴のid, シーンの番号) を主キーとして保存し, 食い違うシーンは番号の範囲で削除するので,
+        接続が切れてやり直しても同じ結果になる.
+
+        保存は呼び出したスレッドで行う. 画面を止めずに保存するときは `HistoryWriter` を使う.
         
         Args:
             history(History): データベースへ保存する履歴
 
-        """
-        # データベースへの接続確認
-        cls.initialize()
-
-        # Historyオブジェクトからuuid,title,is_finishedを取得
-        uuid_str = history.uuid
-        title = history.title
-        is_finished = history.is_finished
-
-        # 取得したuuidをbytes型に変換
-        uuid_bytes = UUID(uuid_str).bytes
+        Returns:
+            SaveStats: 保存にかかった時間. `last_save_stats` にも記録する
 
-        # history_listテーブルにデータを追加
-        cls.cursor.execute(f"""
-            INSERT INTO {INDEX_LIST_TABLE_NAME} (uuid, title, is_finished) VALUES (%s, %s, %s)
-        """, (uuid_bytes, title, is_finished))
+        """
+        record = history.to_record()
+        stats = cls.save_record(record)
+        history.storage_format = record.storage_format
+        history.mark_saved()
+        return stats
 
-         # HistoryオブジェクトからSceneオブジェクトを1つずつ取り出す
-        for scene in history:
+    @classmethod
+    def save_record(cls, record: HistoryRecord) -> SaveStats:
+        """`HistoryRecord` に写し取った履歴をデータベースへ保存するメソッド
 
-            # Sceneオブジェクトからturn_playerを文字列として取得
-            turn_player = cls.get_turn_player(scene)
-            
-            # Sceneオブジェクトから盤面状態をリストとして取得
-            board_list = cls.convert_board_to_list(scene)
+        保存の方法は `save` と同じ. 保存できたときは `record` の保存済みの内容を表す属性を更新する.
+        tkinterのオブジェクトを使わないので, 別スレッドから呼び出せる.
 
-            # 盤面状態のリストをjson形式に変換
-            board_json = cls.convert_to_json(board_list)
+        Args:
+            record(HistoryRecord): データベースへ保存する履歴
 
-            # scene_listテーブルにデータを追加
-            cls.cursor.execute(f"""
-                INSERT INTO {SCENE_LIST_TABLE_NAME} (history_id, board_status, turn_player) VALUES (%s, %s, %s)
-            """, (uuid_bytes, board_json, turn_player))
+        Returns:
+            SaveStats: 保存にかかった時間. `last_save_stats` にも記録する
 
-        # データベースの変更を確定
-        cls.conn.commit()
+        """
+        try:
+            cls.last_save_stats = cls.initialize().save(record)
+        finally:
+            # 保存に失敗しても途中まで書き込まれているかもしれないので, 保持している履歴は使わない
+            cls.cache.invalidate(record.uuid)
+        return cls.last_save_stats
 
     @classmethod
     def restore(cls, uuid: bytes) -> History:
         """データベースから履歴を復元するメソッド
         
-        引数に復元したい履歴のUUIDを受け取り、それに対応したboardとturn_playerをscene_listテーブルから取得する。
+        引数に復元したい履歴のUUIDを受け取り、それに対応したboardとturn_playerを保存先から取得する。
         取得したboardとturn_playerを基にSceneオブジェクトを作成し、それをHistoryオブジェクトに追加、戻り値として返す。
         
         Args:
@@ -275,25 +596,20 @@ class DBController:
         Returns:
             History: 復元する履歴
         """
-        # データベースへの接続確認
-        cls.initialize()
+        history = cls.cache.get(str(UUID(bytes=bytes(uuid))))
+        if history is not None:
+            return history
+        generation = cls.cache.generation
+        record = cls.initialize().load(uuid)
 
-        # Historyオブジェクトの作成
+        # Historyオブジェクトの作成. 保存し直したときに同じ行を更新するよう, uuidは復元したい履歴のものを使う
         history = History()
+        history.uuid = record.uuid
+        history.title = record.title
+        history.is_finished = record.is_finished
+        history.storage_format = record.storage_format
 
-        # TODO: ここから下のコードが正しく動作しているか確認
-
-        # scene_listテーブルから、uuidカラムの値がuuidと一致するデータを取得
-        cls.cursor.execute(f"""
-            SELECT board_status, turn_player FROM {SCENE_LIST_TABLE_NAME} WHERE history_id = %s
-        """, (uuid,))
-
-        rows: list[tuple] = cls.cursor.fetchall()
-
-        for board_json, turn_player_str in rows:
-
-            # json形式で取得したboardのデータをlist形式に変換
-            board_list = cls.convert_json_to_list(board_json)
+        for board_list, turn_player_str in record.scenes:
 
             # list形式に変換されたboardのデータをboardの形式に修正
             board = cls.convert_list_to_board(board_list)
@@ -304,17 +620,82 @@ class DBController:
             # 変換,修正したboardとturn_playerを用いてSceneオブジェクトを作成し、Historyオブジェクトへ追加
             history.append(board, turn_player)
 
-        # index_listテーブルからuuidカラムの値がuuidと一致するデータのis_finishedを取得
-        cls.cursor.execute(f"""
-            SELECT is_finished FROM {INDEX_LIST_TABLE_NAME} WHERE uuid = %s
-        """, (uuid,))
+        # 復元した内容はデータベースと一致している
+        history.mark_saved()
+        cls.cache.put(history, generation)
+
+        return history
 
-        is_finished = cls.cursor.fetchall()[0]
+    @classmethod
+    def restore_lazy(cls, uuid: bytes) -> History:
+        """データベースから履歴を, 最初と最後のシーンだけを読み込んだ `LazyHistory` として復元するメソッド
 
-        # 取得したis_finishedでHistory.is_finishedを更新
-        history.is_finished = is_finished[0]
+        全てのシーンを読み込んで変換する `restore` と違い, シーンの数によらずすぐに戻る.
+        `cache` に保持している履歴は, 全てのシーンを変換済みの `History` として返す.
+        `LazyHistory` は全てのシーンを変換したときに `cache` に登録する.
 
-        return history
+        Args:
+            uuid(bytes): 復元したい履歴に割り当てられているid
+
+        Returns:
+            History: 復元する履歴
+        """
+        history = cls.cache.get(str(UUID(bytes=bytes(uuid))))
+        if history is not None:
+            return history
+        generation = cls.cache.generation
+        return LazyHistory(
+            cls.initialize().load_outline(uuid),
+            partial(cls.get_scene_range, uuid),
+            partial(cls.cache.put, generation=generation),
+        )
+
+    @classmethod
+    def get_scene_range(cls, uuid: bytes, start: int, stop: int) -> list[SceneRecord]:
+        """データベースから履歴の `start` 番目から `stop` 番目の前までのシーンを, Stoneオブジェクトに変換せずに取得するメソッド
+
+        別スレッドから呼び出せる.
+
+        Args:
+            uuid(bytes): 取得したい履歴に割り当てられているid
+            start(int): 最初のシーンの番号
+            stop(int): 最後のシーンの次の番号
+
+        Returns:
+            list[SceneRecord]: 盤面とターンプレイヤーの色の名前の組のリスト
+        """
+        return cls.initialize().load_scene_range(uuid, start, stop)
+
+    @classmethod
+    def get_scene_records(cls, uuid: bytes) -> list[tuple[list, str]]:
+        """データベースから履歴のシーンを、Stoneオブジェクトに変換せずに取得するメソッド
+
+        tkinterを使わないツール(定石の作成など)からも使用できる. どちらの保存形式の履歴も同じ形で返す.
+
+        Args:
+            uuid(bytes): 取得したい履歴に割り当てられているid
+
+        Returns:
+            list[tuple[list, str]]: 石の色を文字列で表した盤面と、ターンプレイヤーの色の文字列の組のリスト
+
+        Raises:
+            ValueError: 手の並びで保存された履歴を打ち直せないときや, 最後の盤面が一致しないときに生じる
+        """
+        return cls.initialize().load(uuid).scenes
+
+    @classmethod
+    def query_scene_records(cls, is_finished: bool | None = None):
+        """条件に合う全ての履歴のシーンを, まとめて取得しながら返すジェネレータ
+
+        履歴ごとに `get_scene_records` を呼び出すより, データベースとのやりとりが少ない.
+
+        Args:
+            is_finished(bool | None, optional): 終局しているかどうかで絞り込む. `None` のときは絞り込まない. default to None.
+
+        Returns:
+            Iterator[tuple[bytes, list[tuple[list, str]]]]: 履歴のidと `get_scene_records` と同じシーンのリストの組
+        """
+        return cls.initialize().query(is_finished)
 
     @classmethod
     def delete(cls, uuid: bytes) -> None:
@@ -326,21 +707,10 @@ class DBController:
             uuid(str): 削除したい履歴に割り当てられているid
 
         """
-        # データベースへの接続確認
-        cls.initialize()
-
-        # scene_listテーブルから、uuidカラムの値がuuid_bytesと一致するデータを削除
-        cls.cursor.execute(f"""
-            DELETE FROM {SCENE_LIST_TABLE_NAME} WHERE history_id = %s
-        """, (uuid,))
-
-        # history_listテーブルから、uuidカラムの値がuuid_bytesと一致するデータを削除
-        cls.cursor.execute(f"""
-            DELETE FROM {INDEX_LIST_TABLE_NAME} WHERE uuid = %s
-        """, (uuid,))
-
-        # データベースの変更を確定
-        cls.conn.commit()
+        try:
+            cls.initialize().delete(uuid)
+        finally:
+            cls.cache.invalidate(str(UUID(bytes=bytes(uuid))))
 
     @classmethod
     def get_all_indexes(cls) -> list[tuple[bytes, str, bool]]:
@@ -350,16 +720,25 @@ class DBController:
             list[taple]: history_viewで表示する全データのindex(uuid, title, is_finished)
 
         """
-        # データベースへの接続確認
-        cls.initialize()
+        return cls.initialize().list_indexes()
 
-        # history_listテーブルから、全データのindexを取得
-        cls.cursor.execute(f"""
-            SELECT uuid, title, is_finished FROM {INDEX_LIST_TABLE_NAME}
-        """)
+    @classmethod
+    def get_index_page(
+            cls,
+            limit: int,
+            before: tuple[str, bytes] | None = None,
+            is_finished: bool | None = None,
+            created_since: datetime | None = None,
+            created_until: datetime | None = None,
+            after: tuple[str, bytes] | None = None,
+    ) -> list[tuple[bytes, str, bool, str]]:
+        """データベースから履歴のインデックスを, 新しいものから1ページ分取得するメソッド
+
+        全件を読み込む `get_all_indexes` と違い, 履歴がいくつあっても1ページ分の時間で取得できる.
+        引数の意味は `HistoryStorage.list_index_page` と同じ.
 
-        # SELECT文の結果を取得
-        row:list[tuple] = cls.cursor.fetchall()
+        Returns:
+            list[tuple[bytes, str, bool, str]]: 履歴の uuid, title, is_finished, 作成日時の組のリスト
 
-        # 取得したデータを戻り値として返す
-        return row
\ No newline at end of file
+        """
+        return cls.initialize().list_index_page(limit, before, is_finished, created_since, created_until, after)
@@ -1,18 +1,33 @@
-from tkinter import Frame, Label, Listbox, Button
+from tkinter import Frame, Label, Listbox, Button, Entry, Radiobutton, StringVar
+from datetime import datetime, timedelta
 import tkinter as tk
 
 from display_items import SceneTransitionButton, Display
-from history import DBController, History, Scene
+from history import DBController, History, LazyHistory, Scene
+from history_writer import HistoryWriter
 from objects import OthelloBoard, Stone
 from game_display import GameDisplay
-from game_manager import GameManager, ManagerDisplay
+from game_manager import GameManager
 from systems import OthelloPlayer
 from game_manager import SpectatingManager
 from spectator_display import SpectatorDisplay
+from spectator_wall import SpectatorWallDisplay
+from tasks import TaskExecutor, TkDispatcher, Task
 
 HOME_DISPLAY_BUTTON_TEXT = "ホームへ"
 RESTORE_HISTORY_BUTTON_TEXT = "復元"
 DELETE_HISTORY_BUTTON_TEXT = "削除"
+WALL_HISTORY_BUTTON_TEXT = "まとめて観戦"
+HISTORY_WRITER_FLUSH_TIMEOUT = 1.0
+HISTORY_PAGE_SIZE = 100        # 1回の問い合わせで読み込む履歴の数
+HISTORY_PREFETCH_ROWS = 20     # 表示している範囲の上下に読み込み済みの行がこの数より少なくなったら, 続きのページを読み込む
+HISTORY_MAX_ROWS = 300         # listboxに残す行の数の上限. 超えたら表示している範囲から遠い側の行を取り除く
+FILTER_DATE_FORMAT = "%Y-%m-%d"
+FILTER_BUTTON_TEXT = "絞り込み"
+FILTER_SINCE_LABEL_TEXT = "開始日"
+FILTER_UNTIL_LABEL_TEXT = "終了日"
+FILTER_DATE_ERROR_TEXT = "日付は YYYY-MM-DD で入力してください"
+FINISHED_FILTER_CHOICES = (("すべて", "all"), ("済", "finished"), ("未", "unfinished"))
 
 
 class HistoryDisplay(Frame):
@@ -31,68 +46,266 @@ class HistoryDisplay(Frame):
         # リストボックスの作成
         self.history_list = HistoryList(self)
 
+        # 絞り込みの条件を入力するFrameの作成
+        self.history_filter_frame = HistoryFilterFrame(self, self.history_list)
+
         # restoreボタンとdeleteボタンの作成
         self.history_controll_frame = HistoryControllFrame(self, self.history_list)
 
         # ウィジェットの配置
         self.home_display_button.pack()
+        self.history_filter_frame.pack()
         self.history_list.pack()
         self.history_controll_frame.pack()
 
 
 class HistoryList(Listbox):
-    """履歴を表示するリストボックス"""
+    """履歴を表示するリストボックス
+
+    履歴は新しいものから `HISTORY_PAGE_SIZE` 件ずつ, スクロールに合わせてバックグラウンドで読み込む.
+    ページは前のページの最後の履歴の続きから問い合わせるので, 履歴がいくつあっても画面を開く時間は変わらない.
+    行は `HISTORY_MAX_ROWS` 行までしか残さず, スクロールで取り除いた側に戻ったときは読み込み直す.
+
+    Attributes:
+        uuid_list(list[bytes]): 表示している行の履歴のid
+        is_finished(bool | None): 終局しているかどうかの絞り込み. `None` のときは絞り込まない
+        created_since(datetime | None): この日時以降に作成された履歴に絞り込む
+        created_until(datetime | None): この日時より前に作成された履歴に絞り込む"""
 
-    selected = None
-    uuid_list = []
-    
     def __init__(self, master):
-        super().__init__(master, width=50, height=30, justify=tk.CENTER)
+        super().__init__(master, width=50, height=30, justify=tk.CENTER, selectmode=tk.EXTENDED)
+        self.uuid_list: list[bytes] = []
+        self.is_finished: bool | None = None
+        self.created_since: datetime | None = None
+        self.created_until: datetime | None = None
+        self.executor = TaskExecutor(TkDispatcher(self), max_workers=1)
+        self.__page_task: Task | None = None
+        self.__keys: list[tuple[str, bytes]] = []     # 行ごとの履歴の作成日時とid. 続きのページを問い合わせるのに使う
+        self.__last_key: tuple[str, bytes] | None = None
+        self.__is_exhausted = False
+        self.__has_newer = False     # 先頭より新しい行を取り除いたかどうか
+        self["yscrollcommand"] = self.__on_scroll
+
+        # 保存先に接続できないときは, ここで StorageUnavailableError が生じる
+        DBController.initialize()
 
         # listbox内にindexを表示
         self.show_indexes()
 
     def show_indexes(self):
-        """データベースからindexを取得し、listboxに表示するメソッド
+        """表示をやり直し, データベースから最初のページのindexを読み込むメソッド
         """
-        HistoryList.uuid_list = []
+        if self.__page_task is not None:
+            self.__page_task.cancel()
+            self.__page_task = None
+        self.uuid_list = []
+        self.__keys = []
+        self.__last_key = None
+        self.__is_exhausted = False
+        self.__has_newer = False
+        self.delete(0, tk.END)
+        self.load_next_page()
 
-        # indexデータの取得
-        all_index = DBController.get_all_indexes()
+    def load_next_page(self):
+        """次のページのindexをバックグラウンドで読み込むメソッド. 読み込み中や, 全て読み込んだときは何もしない
+        """
+        if self.__page_task is not None or self.__is_exhausted:
+            return
+        self.__page_task = self.executor.submit(
+            DBController.get_index_page,
+            HISTORY_PAGE_SIZE,
+            self.__last_key,
+            self.is_finished,
+            self.created_since,
+            self.created_until,
+            on_done=self.__append_page,
+            on_error=self.__on_page_error,
+        )
 
-        # indexデータからtitleとis_finishedを抜き出す
-        for uuid, title, is_finished in all_index:
+    def load_previous_page(self):
+        """取り除いた行のうち, 先頭の行の直前のページをバックグラウンドで読み込むメソッド. 読み込み中は何もしない
+        """
+        if self.__page_task is not None or not self.__has_newer:
+            return
+        if not self.__keys:
+            # 全ての行を削除したときは, 最初のページから表示し直す
+            self.show_indexes()
+            return
+        self.__page_task = self.executor.submit(
+            DBController.get_index_page,
+            HISTORY_PAGE_SIZE,
+            None,
+            self.is_finished,
+            self.created_since,
+            self.created_until,
+            self.__keys[0],
+            on_done=self.__prepend_page,
+            on_error=self.__on_page_error,
+        )
 
-            # uuidはuuid_listに保存
-            self.uuid_list.append(uuid)
+    def set_filter(self, is_finished: bool | None, created_since: datetime | None, created_until: datetime | None):
+        """絞り込みの条件を変えて, 表示をやり直すメソッド
+
+        Args:
+            is_finished(bool | None): 終局しているかどうか. `None` のときは絞り込まない
+            created_since(datetime | None): この日時以降に作成された履歴に絞り込む
+            created_until(datetime | None): この日時より前に作成された履歴に絞り込む"""
+        self.is_finished = is_finished
+        self.created_since = created_since
+        self.created_until = created_until
+        self.show_indexes()
 
-            # is_finishedが1のとき、"済"と表示する
-            if is_finished:
-                is_finished_str = "済"
-            # is_finishedが0のとき、"未"と表示する
-            else:
-                is_finished_str = "未"
+    def __append_page(self, page: list[tuple[bytes, str, bool, str]]):
+        """読み込んだページのindexを, listboxの末尾に追加するメソッド"""
+        self.__page_task = None
+        self.__is_exhausted = len(page) < HISTORY_PAGE_SIZE
+        if page:
+            uuid, _, _, created_at = page[-1]
+            self.__last_key = (created_at, uuid)
 
-            # listboxに表示する文字列を作成
-            index_str = f"{title} {is_finished_str}"
+        for uuid, title, is_finished, created_at in page:
+
+            # uuidはuuid_listに保存
+            self.uuid_list.append(uuid)
+            self.__keys.append((created_at, uuid))
 
             # 文字列の追加
-            self.insert(tk.END, index_str)     
+            self.insert(tk.END, self.__format_row(title, is_finished))
+
+        # 行が多すぎるときは, 先頭から取り除く
+        excess = self.size() - HISTORY_MAX_ROWS
+        if excess > 0:
+            top_index = self.nearest(0)
+            self.__remove_rows(0, excess)
+            self.yview(max(top_index - excess, 0))
+            self.__has_newer = True
+
+        # 表示している範囲がまだ末尾に近ければ, 続けて読み込む
+        self.__on_scroll()
+
+    def __prepend_page(self, page: list[tuple[bytes, str, bool, str]]):
+        """読み込んだページのindexを, listboxの先頭に追加するメソッド"""
+        self.__page_task = None
+        self.__has_newer = len(page) == HISTORY_PAGE_SIZE
+        top_index = self.nearest(0)
+        for uuid, title, is_finished, created_at in reversed(page):
+            self.uuid_list.insert(0, uuid)
+            self.__keys.insert(0, (created_at, uuid))
+            self.insert(0, self.__format_row(title, is_finished))
+        self.yview(top_index + len(page))
+
+        # 行が多すぎるときは, 末尾から取り除く
+        excess = self.size() - HISTORY_MAX_ROWS
+        if excess > 0:
+            self.__remove_rows(self.size() - excess, self.size())
+            self.__last_key = self.__keys[-1]
+            self.__is_exhausted = False
+
+        self.__on_scroll()
+
+    @staticmethod
+    def __format_row(title: str, is_finished: bool) -> str:
+        """listboxに表示する文字列を作成するメソッド. is_finishedが1のとき"済", 0のとき"未"と表示する"""
+        return f"{title} {'済' if is_finished else '未'}"
+
+    def __remove_rows(self, first: int, last: int):
+        """`first` 行目から `last` 行目の前までを取り除くメソッド"""
+        del self.uuid_list[first:last]
+        del self.__keys[first:last]
+        self.delete(first, last - 1)
+
+    def __on_page_error(self, error: BaseException):
+        """ページを読み込めなかったときのメソッド. 次にスクロールしたときに読み込み直す"""
+        self.__page_task = None
+
+    def __on_scroll(self, *_):
+        """表示している範囲が変わったときに呼ばれるメソッド. 末尾に近づいたら次のページを, 先頭に近づいたら前のページを読み込む
+
+        表示している最後の行は, 画面に配置されたあとの高さから求める. 配置される前は先頭の行になるので,
+        画面を開く前に全てのページを読み込んでしまうことはない."""
+        last_visible_index = self.nearest(self.winfo_height())
+        if self.size() - 1 - last_visible_index <= HISTORY_PREFETCH_ROWS:
+            self.load_next_page()
+        elif self.nearest(0) <= HISTORY_PREFETCH_ROWS:
+            self.load_previous_page()
+
+    def remove_row(self, index: int):
+        """listboxから1行を取り除くメソッド. 読み込み済みの他の行は読み込み直さない"""
+        self.__remove_rows(index, index + 1)
 
     def get_listbox_index(self) -> int:
         """listboxで選択中のデータのindexを取得するメソッド
         """
         return self.curselection()[0]
 
+    def get_listbox_indexes(self) -> tuple[int, ...]:
+        """listboxで選択中の全データのindexを取得するメソッド
+        """
+        return self.curselection()
+
     def update(self):
         """listboxの表示を更新するメソッド
         """
-        # listboxに表示されている全項目の削除
-        self.delete(0, tk.END)
+        # 保存したばかりの履歴も表示されるよう, 書き込みを少しだけ待つ
+        HistoryWriter.shared().flush(HISTORY_WRITER_FLUSH_TIMEOUT)
 
-        # listboxにindexを再表示
+        # listboxに最初のページのindexを再表示
         self.show_indexes()
 
+
+class HistoryFilterFrame(Frame):
+    """履歴の一覧を作成日と終局しているかどうかで絞り込むFrame
+
+    絞り込みはデータベースへの問い合わせで行う."""
+
+    def __init__(self, master, history_list: HistoryList):
+        self.history_list = history_list
+        super().__init__(master)
+
+        self.since_entry = Entry(self, width=12)
+        self.until_entry = Entry(self, width=12)
+        self.finished_choice = StringVar(self, FINISHED_FILTER_CHOICES[0][1])
+        filter_button = Button(self, text=FILTER_BUTTON_TEXT, command=self.apply_filter)
+        self.error_label = Label(self)
+
+        Label(self, text=FILTER_SINCE_LABEL_TEXT).grid(row=0, column=0)
+        self.since_entry.grid(row=0, column=1)
+        Label(self, text=FILTER_UNTIL_LABEL_TEXT).grid(row=0, column=2)
+        self.until_entry.grid(row=0, column=3)
+        for column, (text, value) in enumerate(FINISHED_FILTER_CHOICES, 4):
+            Radiobutton(self, text=text, value=value, variable=self.finished_choice).grid(row=0, column=column)
+        filter_button.grid(row=0, column=column + 1)
+        self.error_label.grid(row=1, column=0, columnspan=column + 2)
+
+    def apply_filter(self):
+        """入力された条件で履歴の一覧を絞り込むメソッド
+
+        終了日はその日を含む. 日付を入力していない欄は絞り込みに使わない."""
+        try:
+            created_since = self.parse_date(self.since_entry.get())
+            created_until = self.parse_date(self.until_entry.get())
+        except ValueError:
+            self.error_label["text"] = FILTER_DATE_ERROR_TEXT
+            return
+        self.error_label["text"] = ""
+        if created_until is not None:
+            created_until += timedelta(days=1)
+
+        is_finished = {"finished": True, "unfinished": False}.get(self.finished_choice.get())
+        self.history_list.set_filter(is_finished, created_since, created_until)
+
+    @staticmethod
+    def parse_date(text: str) -> datetime | None:
+        """入力された日付を datetime に変換するメソッド. 空欄のときは `None` を返す
+
+        Raises:
+            ValueError: 日付の書式が正しくないときに生じる"""
+        text = text.strip()
+        if not text:
+            return None
+        return datetime.strptime(text, FILTER_DATE_FORMAT)
+
+
 class HistoryControllFrame(Frame):
     """restoreボタンとdeleteボタンをもつFrame"""
 
@@ -102,8 +315,10 @@ class HistoryControllFrame(Frame):
 
         restore_button = RestoreButton(self, self.history_list)
         delete_button = DeleteButton(self, self.history_list)
+        wall_button = WallButton(self, self.history_list)
 
         restore_button.pack(side=tk.LEFT)
+        wall_button.pack(side=tk.LEFT)
         delete_button.pack(side=tk.RIGHT)
 
 
@@ -118,20 +333,21 @@ class RestoreButton(SceneTransitionButton):
     def restore_selected_history(self) -> History:
         """履歴の復元を行うメソッド
         
-        DBcontroller.restore()でデータベースから履歴を取得し、復元を行う
+        DBcontroller.restore_lazy()でデータベースから最初と最後のシーンだけを取得し、復元を行う
+        最近復元した履歴は、データベースを読み直さずに復元する
         """
         # indexを元に削除するデータのuuidを取得
         uuid = self.history_list.uuid_list[self.history_list.get_listbox_index()]
 
         # データベース上から対象となる履歴を取得
-        return DBController.restore(uuid)
+        return DBController.restore_lazy(uuid)
     
-    def restore_board_status(self):
+    def restore_board_status(self, history: History):
         """Historyをもとにboardを復元するメソッド
-        """
-        # restore_selected_history()を使用してHistoryオブジェクトを取得
-        history: History = self.restore_selected_history()
 
+        Args:
+            history(History): 続きから対局する履歴
+        """
         # GameDisplayオブジェクトを取得
         game_display: GameDisplay = Display.get_display(Display.GAME)
 
@@ -141,20 +357,17 @@ class RestoreButton(SceneTransitionButton):
         # GameDisplayオブジェクトからboardを取得
         othello_board: OthelloBoard = game_display.othello_board
 
-        # GameDisplayオブジェクトからManagerDisplayオブジェクトを取得
-        manager_display: ManagerDisplay = game_display.manager_display
-
-        # historyから末尾のSceneオブジェクトを取得
+        # historyから末尾のSceneオブジェクトを取得. 途中保存した履歴の末尾は保存したときの盤面
         last_scene: Scene = history[-1]
 
-        # last_sceneの1つ前のsceneからturn_playerを取得
-        turn_player = history[-2].turn_player
-
         # GameManagerが持っているHistoryオブジェクトを,historyに変更
         game_manager.history = history
 
-        # GameManagerがもっているturn_player属性をturn_playerに変更
-        game_manager.turn_player = turn_player
+        # change_turn()でlast_sceneのturn_playerへ交代するよう, その相手の参加者にしておく.
+        # 1手も置かずに保存した履歴はシーンが1つなので, 1つ前のシーンは使わない
+        for player in game_manager.players:
+            if player.color != last_scene.turn_player.color:
+                game_manager.turn_player = player
 
         # 盤面へ石を再配置
         self.restore_put_stone(othello_board, last_scene)
@@ -188,10 +401,31 @@ class RestoreButton(SceneTransitionButton):
             spectating_manager.create_game(history)
         else:
             self.trans_to = Display.GAME
-            self.restore_board_status()
+            # 対局を続けると待ったや保存で全てのシーンを使うので, 残りのシーンをまとめて読み込んでおく
+            if isinstance(history, LazyHistory):
+                history.load_range(0, len(history))
+            self.restore_board_status(history)
         super().trans_display()
 
 
+class WallButton(SceneTransitionButton):
+    """選択中の履歴をまとめて観戦するボタン"""
+
+    def __init__(self, master, history_list: HistoryList):
+        self.history_list = history_list
+        super().__init__(master, WALL_HISTORY_BUTTON_TEXT, Display.SPECTATOR_WALL, self.show_selected_histories)
+
+    def show_selected_histories(self):
+        """選択中の全ての履歴を復元し、複数観戦画面に表示するメソッド
+        """
+        histories = [
+            DBController.restore(self.history_list.uuid_list[index])
+            for index in self.history_list.get_listbox_indexes()
+        ]
+        spectator_wall_display: SpectatorWallDisplay = Display.get_display(Display.SPECTATOR_WALL)
+        spectator_wall_display.set_games(histories)
+
+
 class DeleteButton(Button):
     """deleteボタン"""
 
@@ -210,11 +444,8 @@ class DeleteButton(Button):
         # indexを元に削除するデータのuuidを取得
         uuid = self.history_list.uuid_list[list_index]
 
-        # 削除するデータのuuidをuuid_listから削除
-        del self.history_list.uuid_list[list_index]
-
         # データベース上から対象となる履歴を削除
         DBController.delete(uuid)
 
-        # listboxの更新
-        self.history_list.update()
\ No newline at end of file
+        # listboxとuuid_listから削除した履歴の行を取り除く. 読み込み済みの他の行は読み込み直さない
+        self.history_list.remove_row(list_index)
\ No newline at end of file
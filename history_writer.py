@@ -0,0 +1,260 @@
+# 履歴の書き込みを遅らせて行うライター
+# 保存を頼まれた履歴を写し取って別スレッドに渡し, 呼び出し元はすぐに戻る.
+# 別スレッドは履歴をまずローカルのジャーナルファイルに書き込んで fsync し, そのあとでデータベースへまとめて書き込む.
+# ジャーナルには履歴ごとに最新の内容だけを残すので, 書き込めないあいだに1手ごとに保存しても大きくならない.
+# データベースに書き込めないあいだは間隔を広げながら試み直し, 全て書き込めたらジャーナルを空にする.
+# アプリが途中で終了しても, 次の起動時にジャーナルに残った履歴を書き込み直すので, 対局は失われない.
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Callable
+import json
+import os
+import queue
+import threading
+import time
+
+from history import DBController, History
+from storage import HistoryRecord, SaveStats, StorageUnavailableError, DATABASE_ERRORS
+from connection_pool import PoolTimeoutError
+from systems import CONFIG
+
+
+JOURNAL_PATH = CONFIG.get("HISTORY_JOURNAL_PATH", "history_journal.jsonl")
+INITIAL_RETRY_DELAY = 1.0     # 書き込みに失敗してから試み直すまでの最初の待ち時間(秒). 失敗するたびに倍にする
+MAX_RETRY_DELAY = 60.0
+SHUTDOWN_TIMEOUT = 5.0        # 終了時に書き込みを待つ時間の上限(秒). 書き込めなかった履歴は次の起動時に書き込む
+JOURNAL_FIELDS = ("uuid", "title", "is_finished", "scenes", "storage_format")
+
+
+def read_journal(path: str) -> dict[str, HistoryRecord]:
+    """ジャーナルから履歴を読み込む関数
+
+    同じ履歴が複数回記録されているときは, 最後のものを使う. 書き込みの途中で終了して壊れた行は無視する.
+    保存済みの内容が分からないので, 読み込んだ履歴は全体を書き込み直す.
+
+    Args:
+        path(str): ジャーナルのパス
+
+    Returns:
+        dict[str, HistoryRecord]: uuidごとの履歴. ジャーナルがないときは空の辞書"""
+    records: dict[str, HistoryRecord] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    record = HistoryRecord(**{field: entry[field] for field in JOURNAL_FIELDS})
+                    record.scenes = [(board_list, turn_player) for board_list, turn_player in record.scenes]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                records.pop(record.uuid, None)
+                records[record.uuid] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def write_journal(path: str, records: list[HistoryRecord]):
+    """ジャーナルを `records` だけを含む内容に書き換え, ディスクに書き込まれるまで待つ関数
+
+    一時ファイルに書き込んでから置き換えるので, 書き込みの途中で終了しても前の内容が残る.
+
+    Args:
+        path(str): ジャーナルのパス
+        records(list[HistoryRecord]): 書き込む履歴. 同じ履歴は1つだけ含める"""
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        for record in records:
+            entry = {field: value for field, value in asdict(record).items() if field in JOURNAL_FIELDS}
+            file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def clear_journal(path: str):
+    """ジャーナルを空にする関数"""
+    try:
+        with open(path, "r+b") as file:
+            if file.seek(0, os.SEEK_END) == 0:
+                return
+            file.truncate(0)
+            file.flush()
+            os.fsync(file.fileno())
+    except FileNotFoundError:
+        pass
+
+
+def _common_prefix_length(a: list, b: list) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class HistoryWriter:
+    """履歴をバックグラウンドでデータベースへ書き込むクラス
+
+    アプリ全体で1つのインスタンスを `shared` で共有する.
+    同じ履歴の保存が書き込みの前に複数回頼まれたときは, 最後の内容だけを書き込む.
+
+    Attributes:
+        journal_path(str): ジャーナルのパス
+        last_error(Exception | None): 直近の書き込みの失敗の原因. 書き込めたときは `None`
+        last_save_stats(SaveStats | None): 直近の書き込みにかかった時間"""
+
+    __shared: HistoryWriter | None = None
+
+    def __init__(
+            self,
+            journal_path: str = JOURNAL_PATH,
+            save: Callable[[HistoryRecord], SaveStats] = DBController.save_record,
+    ):
+        """
+        Args:
+            journal_path(str, optional): ジャーナルのパス. default to JOURNAL_PATH.
+            save(Callable[[HistoryRecord], SaveStats], optional): 履歴をデータベースへ書き込む関数.
+                default to DBController.save_record."""
+        self.journal_path: str = journal_path
+        self.last_error: Exception | None = None
+        self.last_save_stats: SaveStats | None = None
+        self.__save = save
+        self.__queue: queue.Queue[HistoryRecord | None] = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__idle = threading.Event()
+        self.__idle.set()
+        self.__thread: threading.Thread | None = None
+        self.__deadline: float | None = None
+        self.__pending: dict[str, HistoryRecord] = {}     # 書き込みを待っている履歴. 書き込みのスレッドだけが使う
+        self.__saved: dict[str, HistoryRecord] = {}       # 書き込んだ履歴. 次の書き込みの差分を求めるのに使う
+
+    @classmethod
+    def shared(cls) -> HistoryWriter:
+        """アプリ全体で共有するインスタンスを返すメソッド"""
+        if cls.__shared is None:
+            cls.__shared = HistoryWriter()
+        return cls.__shared
+
+    def start(self):
+        """書き込みのスレッドを開始するメソッド
+
+        ジャーナルに残っている前回の起動の履歴を, 最初に書き込む. 2回目以降の呼び出しでは何もしない."""
+        with self.__lock:
+            if self.__thread is not None:
+                return
+            self.__pending.update(read_journal(self.journal_path))
+            if self.__pending:
+                self.__idle.clear()
+            self.__thread = threading.Thread(target=self.__run, name="history-writer", daemon=True)
+            self.__thread.start()
+
+    def submit(self, history: History):
+        """履歴の保存を頼むメソッド. 履歴を写し取ってすぐに戻る
+
+        Args:
+            history(History): 保存する履歴. 写し取ったあとは変更してよい"""
+        record = history.to_record()
+        self.start()
+        with self.__lock:
+            self.__idle.clear()
+            self.__queue.put(record)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """頼まれた全ての履歴を書き込み終えるまで待つメソッド
+
+        Args:
+            timeout(float | None, optional): 待つ時間の上限(秒). default to None.
+
+        Returns:
+            bool: 全て書き込めたかどうか"""
+        return self.__idle.wait(timeout)
+
+    def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT):
+        """書き込みのスレッドを終了するメソッド
+
+        `timeout` 秒まで書き込みを試みる. 書き込めなかった履歴はジャーナルに残り, 次の `start` で書き込む.
+
+        Args:
+            timeout(float, optional): 書き込みを待つ時間の上限(秒). default to SHUTDOWN_TIMEOUT."""
+        if self.__thread is None:
+            return
+        self.__deadline = time.monotonic() + timeout
+        self.__queue.put(None)
+        # 書き込みが止まっていても終了できるよう, 待つ時間を区切る. 頼まれた履歴はジャーナルに残っている
+        self.__thread.join(timeout)
+
+    def __run(self):
+        retry_delay = INITIAL_RETRY_DELAY
+        is_stopping = False
+        while True:
+            # 新しい保存を待つ. 書き込めなかった履歴があるときは, 待ち時間が過ぎたら試み直す
+            timeout = retry_delay if self.__pending else None
+            if self.__deadline is not None:
+                timeout = max(min(timeout or 0, self.__deadline - time.monotonic()), 0)
+            batch = []
+            try:
+                batch.append(self.__queue.get(timeout=timeout))
+                while True:
+                    batch.append(self.__queue.get_nowait())
+            except queue.Empty:
+                pass
+            is_stopping = is_stopping or None in batch
+            records = [record for record in batch if record is not None]
+
+            # データベースへ書き込む前にジャーナルに残す. 同じ履歴は最新の内容だけを残し, 古い内容は書き直す
+            if records:
+                for record in records:
+                    self.__pending.pop(record.uuid, None)
+                    self.__pending[record.uuid] = record
+                try:
+                    write_journal(self.journal_path, list(self.__pending.values()))
+                except OSError as error:
+                    self.last_error = error
+
+            if self.__drain():
+                retry_delay = INITIAL_RETRY_DELAY
+            else:
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+
+            # 全て書き込めたらジャーナルを空にする. ジャーナルに書き込むのはこのスレッドだけなので, ロックはいらない
+            if not self.__pending:
+                try:
+                    clear_journal(self.journal_path)
+                except OSError as error:
+                    self.last_error = error
+                with self.__lock:
+                    if self.__queue.empty():
+                        self.__idle.set()
+            if is_stopping and self.__queue.empty() and (
+                    not self.__pending or time.monotonic() >= self.__deadline):
+                return
+
+    def __drain(self) -> bool:
+        """書き込みを待っている履歴をデータベースへ書き込むメソッド
+
+        Returns:
+            bool: 全て書き込めたかどうか. データベースに接続できないときは, 残りを次の機会に回す"""
+        for uuid, record in list(self.__pending.items()):
+            # 前回書き込んだ内容との差分だけを書き込む
+            saved = self.__saved.get(uuid)
+            if saved is not None:
+                record.storage_format = saved.storage_format
+                record.saved_scene_count = len(saved.scenes)
+                record.clean_scene_count = _common_prefix_length(saved.scenes, record.scenes)
+                record.saved_is_finished = saved.is_finished
+            try:
+                self.last_save_stats = self.__save(record)
+            except DATABASE_ERRORS + (StorageUnavailableError, PoolTimeoutError, OSError) as error:
+                self.last_error = error
+                return False
+            except Exception as error:
+                # 書き込み直しても失敗する履歴は諦める
+                self.last_error = error
+            else:
+                self.last_error = None
+                self.__saved[uuid] = record
+            del self.__pending[uuid]
+        return True
@@ -0,0 +1,559 @@
+from __future__ import annotations
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from bitboard import (
+    legal_moves,
+    play,
+    iter_squares,
+    PASS,
+    numpy,
+    popcount_array,
+    legal_moves_array,
+    flips_array,
+)
+from engine import SearchResult, SearchTimeout, DEFAULT_TIME_BUDGET, ENDGAME_TIME_RATIO
+
+if TYPE_CHECKING:
+    from endgame import EndgameSolver
+
+
+DEFAULT_EXPLORATION = 1.4
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_NUMPY_BATCH_SIZE = 256
+DEFAULT_MAX_NODES = 2_000_000
+EXPANSION_VISITS = 2     # 葉がこの回数選ばれたら子ノードを展開する
+WIN_RATE_SCALE = 1000    # 勝率を評価値に変換するときの倍率. `TERMINAL_SCORE_SCALE` より小さくする
+STOP_POLL_INTERVAL = 0.05
+
+UNEXPANDED = -1
+
+# 手番側から見たプレイアウトの結果
+WIN = 1.
+DRAW = .5
+LOSS = 0.
+
+
+@dataclass
+class MCTSStats:
+    """直近の探索の統計を保持するデータクラス
+
+    Attributes:
+        playouts(int): 行ったプレイアウトの回数
+        elapsed(float): 探索にかかった秒数
+        node_count(int): 木のノード数
+        tree_bytes(int): 木のノードを保持する配列のバイト数
+        max_depth(int): 木の最も深いノードの深さ"""
+    playouts: int = 0
+    elapsed: float = 0.
+    node_count: int = 0
+    tree_bytes: int = 0
+    max_depth: int = 0
+
+    @property
+    def playouts_per_second(self) -> int:
+        """1秒あたりのプレイアウトの回数"""
+        if self.elapsed <= 0:
+            return 0
+        return int(self.playouts / self.elapsed)
+
+    def merge(self, other: MCTSStats):
+        """別のプロセスの探索の統計を合算するメソッド"""
+        self.playouts += other.playouts
+        self.node_count += other.node_count
+        self.tree_bytes += other.tree_bytes
+        self.max_depth = max(self.max_depth, other.max_depth)
+
+
+class MCTSTree:
+    """探索木のノードを, ノードごとのオブジェクトではなく属性ごとの配列で保持するクラス
+
+    ノードは配列の添字で表し, 子ノードは連続した添字に並べる.
+    ノードの勝ち数は, そのノードへ着手したプレイヤーから見た値である.
+
+    Attributes:
+        players(array): ノードの局面の手番側の石
+        opponents(array): ノードの局面の相手側の石
+        moves(array): 親ノードからの着手
+        first_children(array): 最初の子ノードの添字
+        child_counts(array): 子ノードの数. 展開していないときは `UNEXPANDED`, 終局のときは `0`
+        visits(array): 訪問回数
+        wins(array): 勝ち数. 引き分けは0.5勝として数える
+        max_nodes(int): ノード数の上限. 上限に達したあとは展開せずにプレイアウトだけを続ける"""
+
+    def __init__(self, player: int, opponent: int, max_nodes: int = DEFAULT_MAX_NODES):
+        self.players = array("Q")
+        self.opponents = array("Q")
+        self.moves = array("b")
+        self.first_children = array("i")
+        self.child_counts = array("b")
+        self.visits = array("I")
+        self.wins = array("d")
+        self.max_nodes: int = max_nodes
+        self.add_node(player, opponent, PASS)
+
+    def __len__(self) -> int:
+        return len(self.visits)
+
+    @property
+    def nbytes(self) -> int:
+        """ノードを保持する配列の合計のバイト数"""
+        return sum(
+            len(values) * values.itemsize
+            for values in (
+                self.players,
+                self.opponents,
+                self.moves,
+                self.first_children,
+                self.child_counts,
+                self.visits,
+                self.wins,
+            )
+        )
+
+    def add_node(self, player: int, opponent: int, move: int) -> int:
+        """ノードを追加し, その添字を返すメソッド"""
+        self.players.append(player)
+        self.opponents.append(opponent)
+        self.moves.append(move)
+        self.first_children.append(0)
+        self.child_counts.append(UNEXPANDED)
+        self.visits.append(0)
+        self.wins.append(0.)
+        return len(self.visits) - 1
+
+    def expand(self, node: int, root_moves: int | None = None) -> bool:
+        """ノードの子ノードを作成するメソッド
+
+        置けるところがないときはパスを1つの子ノードとし, 双方とも置けないときは終局とする.
+
+        Args:
+            node(int): 展開するノード
+            root_moves(int | None, optional): 作成する子ノードの手を絞り込むときに指定する. default to None.
+
+        Returns:
+            bool: 展開したかどうか. ノード数が上限に達しているときは `False`"""
+        player, opponent = self.players[node], self.opponents[node]
+        moves = legal_moves(player, opponent)
+        if root_moves is not None:
+            moves &= root_moves
+        if moves == 0:
+            squares = [] if legal_moves(opponent, player) == 0 else [PASS]
+        else:
+            squares = list(iter_squares(moves))
+        if len(self) + len(squares) > self.max_nodes:
+            return False
+        self.first_children[node] = len(self)
+        self.child_counts[node] = len(squares)
+        for square in squares:
+            self.add_node(*play(player, opponent, square), square)
+        return True
+
+    def children(self, node: int) -> range:
+        """子ノードの添字の範囲を返すメソッド"""
+        first = self.first_children[node]
+        return range(first, first + max(self.child_counts[node], 0))
+
+    def best_child(self, node: int) -> int:
+        """訪問回数が最も多い子ノードを返すメソッド"""
+        return max(self.children(node), key=lambda child: self.visits[child])
+
+    def principal_variation(self) -> list[int]:
+        """ルートから訪問回数が最も多い子ノードを辿った手順を返すメソッド"""
+        pv = []
+        node = 0
+        while self.child_counts[node] > 0 and self.visits[node] > 1:
+            node = self.best_child(node)
+            pv.append(self.moves[node])
+        return pv
+
+
+def random_playout(player: int, opponent: int, rng: random.Random) -> float:
+    """終局まで無作為に着手し, 手番側から見た結果を返す関数"""
+    sign = 1
+    passed = False
+    while True:
+        moves = legal_moves(player, opponent)
+        if moves == 0:
+            if passed:
+                break
+            player, opponent = opponent, player
+            sign = -sign
+            passed = True
+            continue
+        passed = False
+        for _ in range(rng.randrange(moves.bit_count())):
+            moves &= moves - 1
+        square = (moves & -moves).bit_length() - 1
+        player, opponent = play(player, opponent, square)
+        sign = -sign
+    difference = (player.bit_count() - opponent.bit_count()) * sign
+    return WIN if difference > 0 else DRAW if difference == 0 else LOSS
+
+
+def random_playouts_array(players, opponents, rng) -> list[float]:
+    """`random_playout` を NumPy の配列で多数の局面について同時に行う関数
+
+    Args:
+        players: 各局面の手番側の石の uint64 の配列
+        opponents: 各局面の相手側の石の uint64 の配列
+        rng(numpy.random.Generator): 乱数生成器
+
+    Returns:
+        list[float]: 各局面の手番側から見た結果"""
+    zero = numpy.uint64(0)
+    one = numpy.uint64(1)
+    signs = numpy.ones(len(players), dtype=numpy.int64)
+    passed = numpy.zeros(len(players), dtype=bool)
+    finished = numpy.zeros(len(players), dtype=bool)
+    while not finished.all():
+        moves = legal_moves_array(players, opponents)
+        moves[finished] = zero
+        counts = popcount_array(moves)
+
+        # 置けるところがない局面は手番を交代する. 2回続けば終局
+        no_moves = (counts == 0) & ~finished
+        finished |= no_moves & passed
+        passing = no_moves & ~finished
+        players[passing], opponents[passing] = opponents[passing], players[passing]
+        signs[passing] = -signs[passing]
+        passed = passing
+
+        # 置けるマスの中から無作為に1つ選ぶ. k番目のビットは下位のビットをk個消して求める
+        playing = counts > 0
+        if not playing.any():
+            continue
+        picks = (rng.random(len(players)) * counts).astype(numpy.int64)
+        for step in range(int(picks.max())):
+            clearing = picks > step
+            moves[clearing] &= moves[clearing] - one
+        chosen = moves & (~moves + one)
+        flipped = flips_array(players, opponents, chosen)
+        next_players = numpy.where(playing, opponents & ~flipped, players)
+        next_opponents = numpy.where(playing, players | flipped | chosen, opponents)
+        players, opponents = next_players, next_opponents
+        signs[playing] = -signs[playing]
+
+    differences = (popcount_array(players) - popcount_array(opponents)) * signs
+    return numpy.where(differences > 0, WIN, numpy.where(differences == 0, DRAW, LOSS)).tolist()
+
+
+# ワーカープロセスごとの状態. initializer で設定される
+_worker_engine: MCTSEngine | None = None
+_worker_stop = None
+
+
+class _SharedStopFlag:
+    """共有変数を `threading.Event` と同じように参照するためのクラス"""
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    def is_set(self) -> bool:
+        return bool(self.shared.value)
+
+
+def _init_worker(stop, exploration: float, batch_size: int, max_nodes: int, use_numpy: bool):
+    """ワーカープロセスの初期化を行う関数"""
+    global _worker_engine, _worker_stop
+    _worker_engine = MCTSEngine(
+        exploration=exploration,
+        batch_size=batch_size,
+        max_nodes=max_nodes,
+        max_workers=1,
+        use_numpy=use_numpy,
+    )
+    _worker_stop = stop
+
+
+def _search_tree(
+        player: int,
+        opponent: int,
+        root_moves: int,
+        time_budget: float,
+        seed: int,
+) -> tuple[dict[int, tuple[int, float]], MCTSStats]:
+    """ワーカープロセスで1本の木を育て, ルートの子ノードの訪問回数と勝ち数を返す関数"""
+    engine = _worker_engine
+    engine.seed(seed)
+    tree = engine.grow_tree(player, opponent, root_moves, time.perf_counter() + time_budget, _SharedStopFlag(_worker_stop))
+    root_stats = {tree.moves[child]: (tree.visits[child], tree.wins[child]) for child in tree.children(0)}
+    return root_stats, engine.stats
+
+
+class MCTSEngine:
+    """UCT によるモンテカルロ木探索のエンジン
+
+    葉をまとめて `batch_size` 個選び, プレイアウトをまとめて行ってから結果を反映する.
+    選んだ葉までの経路には先に訪問回数だけを加えて(仮想損失), 同じ葉ばかりが選ばれないようにする.
+    `max_workers` が2以上のときは, プロセスごとに独立した木を育て, ルートの子ノードの統計を合算する.
+    `AlphaBetaEngine` と同じ `search` を持つので, `ComputerPlayer` にそのまま渡せる.
+
+    Attributes:
+        time_budget(float): 1手あたりの持ち時間(秒)
+        exploration(float): UCB1 の探索の強さを決める定数
+        batch_size(int): まとめて行うプレイアウトの数
+        max_nodes(int): 木のノード数の上限
+        max_workers(int): 木を育てるプロセスの数
+        use_numpy(bool): プレイアウトを NumPy で並列に行うかどうか
+        endgame_solver(EndgameSolver | None): 終盤に読み切りを行うソルバー
+        stats(MCTSStats): 直近の探索の統計"""
+
+    def __init__(
+            self,
+            time_budget: float = DEFAULT_TIME_BUDGET,
+            exploration: float = DEFAULT_EXPLORATION,
+            batch_size: int | None = None,
+            max_nodes: int = DEFAULT_MAX_NODES,
+            max_workers: int | None = 1,
+            use_numpy: bool | None = None,
+            endgame_solver: EndgameSolver | None = None,
+    ):
+        """コンストラクタ
+
+        Args:
+            time_budget(float, optional): 1手あたりの持ち時間(秒). default to DEFAULT_TIME_BUDGET.
+            exploration(float, optional): UCB1 の探索の強さを決める定数. default to DEFAULT_EXPLORATION.
+            batch_size(int | None, optional): まとめて行うプレイアウトの数. `None` のときは NumPy の有無で決める. default to None.
+            max_nodes(int, optional): 木のノード数の上限. default to DEFAULT_MAX_NODES.
+            max_workers(int | None, optional): 木を育てるプロセスの数. `None` のときはCPUのコア数. default to 1.
+            use_numpy(bool | None, optional): プレイアウトを NumPy で行うかどうか. `None` のときは NumPy があれば使う. default to None.
+            endgame_solver(EndgameSolver | None, optional): 終盤に読み切りを行うソルバー. default to None."""
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if batch_size is None:
+            batch_size = DEFAULT_NUMPY_BATCH_SIZE if use_numpy else DEFAULT_BATCH_SIZE
+        self.time_budget: float = time_budget
+        self.exploration: float = exploration
+        self.batch_size: int = batch_size
+        self.max_nodes: int = max_nodes
+        self.max_workers: int = max_workers or os.cpu_count() or 1
+        self.use_numpy: bool = use_numpy
+        self.endgame_solver: EndgameSolver | None = endgame_solver
+        self.stats: MCTSStats = MCTSStats()
+        self.__random = random.Random()
+        self.__numpy_random = numpy.random.default_rng() if use_numpy else None
+        self.__stop = None
+        self.__pool: ProcessPoolExecutor | None = None
+
+    def seed(self, seed: int):
+        """乱数の種を設定するメソッド"""
+        self.__random.seed(seed)
+        if self.use_numpy:
+            self.__numpy_random = numpy.random.default_rng(seed)
+
+    def shutdown(self):
+        """ワーカープロセスを終了するメソッド"""
+        if self.__pool is not None:
+            self.__stop.value = 1
+            self.__pool.shutdown(wait=False, cancel_futures=True)
+            self.__pool = None
+
+    def search(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int | None = None,
+            stop_event: threading.Event | None = None,
+            time_budget: float | None = None,
+    ) -> SearchResult:
+        """最善手を探索するメソッド
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            root_moves(int | None, optional): 探索する手を絞り込むときに指定する. default to None.
+            stop_event(threading.Event | None, optional): 探索を中断させるためのイベント. default to None.
+            time_budget(float | None, optional): 持ち時間(秒). `None` のときは `self.time_budget`. default to None.
+
+        Returns:
+            SearchResult: 探索結果. `nodes` はプレイアウトの回数"""
+        if time_budget is None:
+            time_budget = self.time_budget
+        start = time.perf_counter()
+        deadline = start + time_budget
+        self.stats = MCTSStats()
+
+        moves = legal_moves(player, opponent)
+        if root_moves is not None:
+            moves &= root_moves
+        if moves == 0:
+            return SearchResult(PASS, 0, 0, 0, time.perf_counter() - start)
+
+        if self.endgame_solver is not None and self.endgame_solver.can_solve(player, opponent):
+            try:
+                return self.endgame_solver.solve(
+                    player,
+                    opponent,
+                    moves,
+                    time_budget * ENDGAME_TIME_RATIO,
+                    stop_event,
+                )
+            except SearchTimeout:
+                pass
+
+        if self.max_workers > 1:
+            root_stats = self.__search_parallel(player, opponent, moves, deadline, stop_event)
+            pv = []
+        else:
+            tree = self.grow_tree(player, opponent, moves, deadline, stop_event)
+            root_stats = {tree.moves[child]: (tree.visits[child], tree.wins[child]) for child in tree.children(0)}
+            pv = tree.principal_variation()
+        self.stats.elapsed = time.perf_counter() - start
+
+        move, (visits, wins) = max(root_stats.items(), key=lambda item: item[1][0])
+        win_rate = wins / visits if visits else DRAW
+        return SearchResult(
+            move,
+            round((2 * win_rate - 1) * WIN_RATE_SCALE),
+            self.stats.max_depth,
+            self.stats.playouts,
+            self.stats.elapsed,
+            pv or [move],
+        )
+
+    def grow_tree(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int,
+            deadline: float,
+            stop_event: threading.Event | None = None,
+    ) -> MCTSTree:
+        """持ち時間まで木を育てるメソッド
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            root_moves(int): ルートで探索する手
+            deadline(float): `time.perf_counter` での探索の期限
+            stop_event(threading.Event | None, optional): 探索を中断させるためのイベント. default to None.
+
+        Returns:
+            MCTSTree: 育てた木"""
+        start = time.perf_counter()
+        tree = MCTSTree(player, opponent, self.max_nodes)
+        tree.expand(0, root_moves)
+        stats = MCTSStats()
+        while time.perf_counter() < deadline and not (stop_event is not None and stop_event.is_set()):
+            paths = [self.__select(tree) for _ in range(self.batch_size)]
+            leaves = [path[-1] for path in paths]
+            if self.use_numpy:
+                results = random_playouts_array(
+                    numpy.array([tree.players[leaf] for leaf in leaves], dtype=numpy.uint64),
+                    numpy.array([tree.opponents[leaf] for leaf in leaves], dtype=numpy.uint64),
+                    self.__numpy_random,
+                )
+            else:
+                results = [random_playout(tree.players[leaf], tree.opponents[leaf], self.__random) for leaf in leaves]
+            for path, result in zip(paths, results):
+                self.__backpropagate(tree, path, result)
+                stats.max_depth = max(stats.max_depth, len(path) - 1)
+            stats.playouts += len(paths)
+        stats.elapsed = time.perf_counter() - start
+        stats.node_count = len(tree)
+        stats.tree_bytes = tree.nbytes
+        self.stats = stats
+        return tree
+
+    def __select(self, tree: MCTSTree) -> list[int]:
+        """UCB1 が最大の子ノードを辿って葉を選び, ルートからの経路を返すメソッド
+
+        経路上のノードには先に訪問回数を加える."""
+        node = 0
+        path = [node]
+        tree.visits[node] += 1
+        while True:
+            count = tree.child_counts[node]
+            if count == UNEXPANDED:
+                if tree.visits[node] < EXPANSION_VISITS or not tree.expand(node):
+                    return path
+                count = tree.child_counts[node]
+            if count == 0:
+                return path
+
+            first = tree.first_children[node]
+            log_visits = math.log(tree.visits[node])
+            best_child = first
+            best_value = -1.
+            for child in range(first, first + count):
+                child_visits = tree.visits[child]
+                if child_visits == 0:
+                    best_child = child
+                    break
+                value = (
+                    tree.wins[child] / child_visits
+                    + self.exploration * math.sqrt(log_visits / child_visits)
+                )
+                if value > best_value:
+                    best_value = value
+                    best_child = child
+            node = best_child
+            tree.visits[node] += 1
+            path.append(node)
+
+    @staticmethod
+    def __backpropagate(tree: MCTSTree, path: list[int], result: float):
+        """プレイアウトの結果を経路上のノードに反映するメソッド
+
+        Args:
+            tree(MCTSTree): 探索木
+            path(list[int]): ルートから葉までの経路
+            result(float): 葉の局面の手番側から見たプレイアウトの結果"""
+        value = 1. - result
+        for node in reversed(path):
+            tree.wins[node] += value
+            value = 1. - value
+
+    def __search_parallel(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int,
+            deadline: float,
+            stop_event: threading.Event | None,
+    ) -> dict[int, tuple[int, float]]:
+        """プロセスごとに木を育て, ルートの子ノードの統計を合算するメソッド"""
+        if self.__pool is None:
+            self.__stop = multiprocessing.Value("b", 0)
+            self.__pool = ProcessPoolExecutor(
+                self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.__stop, self.exploration, self.batch_size, self.max_nodes, self.use_numpy),
+            )
+        self.__stop.value = 0
+        futures = [
+            self.__pool.submit(
+                _search_tree,
+                player,
+                opponent,
+                root_moves,
+                deadline - time.perf_counter(),
+                self.__random.getrandbits(32),
+            )
+            for _ in range(self.max_workers)
+        ]
+        pending = set(futures)
+        while pending:
+            if stop_event is not None and stop_event.is_set():
+                self.__stop.value = 1
+            _, pending = wait(pending, timeout=STOP_POLL_INTERVAL)
+
+        merged: dict[int, list] = {}
+        for future in futures:
+            root_stats, stats = future.result()
+            self.stats.merge(stats)
+            for move, (visits, wins) in root_stats.items():
+                total = merged.setdefault(move, [0, 0.])
+                total[0] += visits
+                total[1] += wins
+        return {move: (visits, wins) for move, (visits, wins) in merged.items()}
@@ -0,0 +1,111 @@
+# 棋譜による履歴の保存形式
+# 対局を盤面の並びではなく, 1手1バイトの手の並び(パスを含む)として表す. 盤面は復元時にビットボードで打ち直して求める.
+# 盤面1つを JSON で保存すると約500バイトになるのに対し, 1局を100バイト足らずで保存できる.
+# シーンは `DBController.get_scene_records` と同じく, 色の名前の二次元リストとターンプレイヤーの色の名前の組で扱う.
+# tkinter に依存しないので, 定石の作成などのツールからも使用できる.
+from __future__ import annotations
+
+from typing import Sequence
+
+from bitboard import legal_moves, play, from_names, to_names, INITIAL_BLACK, INITIAL_WHITE, SQUARE_COUNT
+
+
+PASS_BYTE = SQUARE_COUNT     # パスを表すバイト. 0 から 63 はマスの番号
+BLACK_NAME = "BLACK"
+WHITE_NAME = "WHITE"
+
+
+type SceneRecord = tuple[list[list[str | None]], str]
+
+
+def _other(color_name: str) -> str:
+    return WHITE_NAME if color_name == BLACK_NAME else BLACK_NAME
+
+
+def _to_player_opponent(black: int, white: int, color_name: str) -> tuple[int, int]:
+    """黒と白の石を, 指定の色の側から見た手番側と相手側の石に変換する関数"""
+    return (black, white) if color_name == BLACK_NAME else (white, black)
+
+
+def encode_moves(scenes: Sequence[tuple[Sequence[Sequence[str | None]], str]]) -> bytes:
+    """シーンの並びを手の並びに変換する関数
+
+    隣り合うシーンの間で新しく置かれたマスを手とし, 次のシーンのターンプレイヤーが手番の交代と合わないときはパスを加える.
+    変換した結果は `decode_moves` で同じシーンの並びに戻る.
+
+    Args:
+        scenes(Sequence[tuple[Sequence[Sequence[str | None]], str]]): 盤面とターンプレイヤーの色の名前の組の並び
+
+    Returns:
+        bytes: 1手1バイトの手の並び
+
+    Raises:
+        ValueError: 初期配置から始まっていないときや, 隣り合うシーンが1手の合法手で移り変わっていないときに生じる"""
+    if not scenes:
+        raise ValueError("history has no scenes")
+    black, white = from_names(scenes[0][0])
+    if (black, white) != (INITIAL_BLACK, INITIAL_WHITE):
+        raise ValueError("history does not start from the initial position")
+
+    moves = bytearray()
+    expected_turn = BLACK_NAME
+    for index, (_, turn) in enumerate(scenes):
+        if turn != expected_turn:
+            moves.append(PASS_BYTE)
+        if index == len(scenes) - 1:
+            break
+
+        next_black, next_white = from_names(scenes[index + 1][0])
+        placed = (next_black | next_white) & ~(black | white)
+        if placed.bit_count() != 1:
+            raise ValueError(f"scenes {index} and {index + 1} are not one move apart")
+        move = placed.bit_length() - 1
+        player, opponent = _to_player_opponent(black, white, turn)
+        if not legal_moves(player, opponent) >> move & 1:
+            raise ValueError(f"illegal move between scenes {index} and {index + 1}")
+        opponent, player = play(player, opponent, move)
+        black, white = _to_player_opponent(player, opponent, turn)
+        if (black, white) != (next_black, next_white):
+            raise ValueError(f"scenes {index} and {index + 1} are not one move apart")
+
+        moves.append(move)
+        expected_turn = _other(turn)
+    return bytes(moves)
+
+
+def decode_moves(moves: bytes, final_position: tuple[int, int] | None = None) -> list[SceneRecord]:
+    """手の並びを打ち直して, シーンの並びに変換する関数
+
+    Args:
+        moves(bytes): `encode_moves` で変換した手の並び
+        final_position(tuple[int, int] | None, optional): 照合する最後の盤面の黒と白の石. default to None.
+
+    Returns:
+        list[SceneRecord]: 盤面とターンプレイヤーの色の名前の組のリスト. 手がないときは初期配置のシーンだけを返す
+
+    Raises:
+        ValueError: 合法手でない手があるときや, 最後の盤面が `final_position` と一致しないときに生じる"""
+    black, white = INITIAL_BLACK, INITIAL_WHITE
+    turn = BLACK_NAME
+    scenes: list[SceneRecord] = []
+    for move in moves:
+        if move == PASS_BYTE:
+            turn = _other(turn)
+            continue
+        player, opponent = _to_player_opponent(black, white, turn)
+        if move > PASS_BYTE or not legal_moves(player, opponent) >> move & 1:
+            raise ValueError(f"illegal move {move} in move list")
+        scenes.append((to_names(black, white), turn))
+        opponent, player = play(player, opponent, move)
+        black, white = _to_player_opponent(player, opponent, turn)
+        turn = _other(turn)
+    scenes.append((to_names(black, white), turn))
+
+    if final_position is not None and (black, white) != tuple(final_position):
+        raise ValueError("replayed position does not match the stored final position")
+    return scenes
+
+
+def last_position(scenes: Sequence[tuple[Sequence[Sequence[str | None]], str]]) -> tuple[int, int]:
+    """最後のシーンの黒と白の石を返す関数. 復元時の照合に使う"""
+    return from_names(scenes[-1][0])
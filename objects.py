@@ -4,7 +4,7 @@ from __future__ import annotations
 from tkinter import Misc
 
 from boardgame import Piece, Tile, BGEvent, Board
-from systems import Color, CONFIG
+from systems import Color, CONFIG, ComputerPlayer
 
 OTHELLO_BOARD_SIZE = (8, 8)
 
@@ -43,6 +43,8 @@ class PutableSpaceTile(Tile):
     
     def execute_put_stone(self, event: BGEvent):
         manager = event.board.master.manager
+        if isinstance(manager.turn_player, ComputerPlayer):
+            return
         stone = Stone(manager.turn_player.color)
         manager.put_stone(stone, event.coordinate)
 
@@ -0,0 +1,235 @@
+# 定石(オープニングブック)
+# 局面を8通りの対称変換で正規化したハッシュ値と, その局面で打たれた手の成績を
+# ハッシュ値の順に並べた固定長レコードとしてバイナリファイルに保存する.
+# ファイルは mmap で読み取り専用に開き, 二分探索で引くので全体をメモリに読み込まない.
+# 同じファイルを開いた複数のプロセスは OS のページキャッシュを共有する.
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+import argparse
+import mmap
+import struct
+
+from bitboard import legal_moves, from_names, transform, transform_square, SYMMETRY_COUNT, FULL_MASK
+
+
+DEFAULT_MIN_GAMES = 2
+
+MAGIC = b"OTBK"
+VERSION = 1
+HEADER = struct.Struct("<4sII")     # マジックナンバー, バージョン, レコード数
+RECORD = struct.Struct("<QB3xII")   # 正規化した局面のハッシュ値, 手, 対局数, 勝ち点(勝ち2, 引き分け1)
+
+
+def position_hash(player: int, opponent: int) -> int:
+    """局面から64bitのハッシュ値を求める関数"""
+    h = (player * 0x9E37_79B9_7F4A_7C15 ^ opponent * 0xC2B2_AE3D_27D4_EB4F) & FULL_MASK
+    h = ((h ^ (h >> 30)) * 0xBF58_476D_1CE4_E5B9) & FULL_MASK
+    h = ((h ^ (h >> 27)) * 0x94D0_49BB_1331_11EB) & FULL_MASK
+    return h ^ (h >> 31)
+
+
+def canonicalize(player: int, opponent: int) -> tuple[int, int]:
+    """局面を正規化し, そのハッシュ値と使った対称変換の番号を返す関数
+
+    8通りの対称変換のうち, 変換後の局面が最も小さくなるものを選ぶ.
+
+    Returns:
+        tuple[int, int]: 正規化した局面のハッシュ値と対称変換の番号"""
+    best = None
+    best_symmetry = 0
+    for symmetry in range(SYMMETRY_COUNT):
+        candidate = (transform(player, symmetry), transform(opponent, symmetry))
+        if best is None or candidate < best:
+            best = candidate
+            best_symmetry = symmetry
+    return position_hash(*best), best_symmetry
+
+
+@dataclass
+class BookMove:
+    """定石に登録された手とその成績を保持するデータクラス
+
+    Attributes:
+        move(int): 手のマス
+        games(int): この手が打たれた対局数
+        points(int): 手番側から見た勝ち点の合計. 勝ちを2, 引き分けを1とする"""
+    move: int
+    games: int
+    points: int
+
+    @property
+    def win_rate(self) -> float:
+        """引き分けを0.5勝として数えた勝率"""
+        if self.games == 0:
+            return 0.
+        return self.points / (2 * self.games)
+
+
+class OpeningBook:
+    """mmap で開いた定石ファイルを引くクラス
+
+    Attributes:
+        path(str): 定石ファイルのパス
+        record_count(int): 登録されているレコードの数"""
+
+    def __init__(self, path: str):
+        """コンストラクタ
+
+        Args:
+            path(str): 定石ファイルのパス
+
+        Raises:
+            ValueError: 定石ファイルの形式が正しくないときに生じる"""
+        self.path: str = path
+        with open(path, "rb") as file:
+            self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.__mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+        magic, version, record_count = HEADER.unpack_from(self.__mmap, 0)
+        if magic != MAGIC or version != VERSION or len(self.__mmap) != HEADER.size + record_count * RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.record_count: int = record_count
+
+    def close(self):
+        """定石ファイルを閉じるメソッド"""
+        self.__mmap.close()
+
+    def __read_key(self, index: int) -> int:
+        return struct.unpack_from("<Q", self.__mmap, HEADER.size + index * RECORD.size)[0]
+
+    def __lower_bound(self, key: int) -> int:
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.__read_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, player: int, opponent: int) -> list[BookMove]:
+        """局面に登録されている手の一覧を返すメソッド
+
+        手は元の局面の向きに戻して返す.
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+
+        Returns:
+            list[BookMove]: 登録されている手. 登録がないときは空のリスト"""
+        key, symmetry = canonicalize(player, opponent)
+        moves = []
+        index = self.__lower_bound(key)
+        while index < self.record_count:
+            record_key, move, games, points = RECORD.unpack_from(
+                self.__mmap,
+                HEADER.size + index * RECORD.size,
+            )
+            if record_key != key:
+                break
+            moves.append(BookMove(transform_square(move, symmetry, inverse=True), games, points))
+            index += 1
+        return moves
+
+    def choose(self, player: int, opponent: int, min_games: int = DEFAULT_MIN_GAMES) -> int | None:
+        """局面で最も成績のよい手を選ぶメソッド
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            min_games(int, optional): 選ぶ手に必要な対局数. default to DEFAULT_MIN_GAMES.
+
+        Returns:
+            int | None: 選んだ手. 条件を満たす手がないときは `None`"""
+        moves = legal_moves(player, opponent)
+        candidates = [
+            book_move for book_move in self.lookup(player, opponent)
+            if book_move.games >= min_games and moves >> book_move.move & 1
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda book_move: (book_move.win_rate, book_move.games)).move
+
+
+def iter_game_moves(
+        scenes: Sequence[tuple[Sequence[Sequence[str | None]], str]],
+) -> Iterable[tuple[int, int, int, str]]:
+    """履歴のシーンから, 各局面とそこで打たれた手を順に返すジェネレータ
+
+    履歴には石を置く前の盤面とターンプレイヤーが保存されているので,
+    次のシーンで新たに石が置かれたマスをそのターンプレイヤーの手とする.
+
+    Args:
+        scenes(Sequence[tuple[Sequence[Sequence[str | None]], str]]): `DBController.get_scene_records` の戻り値
+
+    Returns:
+        Iterable[tuple[int, int, int, str]]: 手番側の石, 相手側の石, 手, 手番側の色の名前"""
+    for (board, turn_player), (next_board, _) in zip(scenes, scenes[1:]):
+        black, white = from_names(board)
+        next_black, next_white = from_names(next_board)
+        placed = (next_black | next_white) & ~(black | white)
+        if placed.bit_count() != 1:
+            continue
+        if turn_player == "BLACK":
+            yield black, white, placed.bit_length() - 1, turn_player
+        else:
+            yield white, black, placed.bit_length() - 1, turn_player
+
+
+def build(
+        path: str,
+        games: Iterable[Sequence[tuple[Sequence[Sequence[str | None]], str]]],
+        max_plies: int | None = None,
+) -> int:
+    """終局した対局の履歴から定石ファイルを作成する関数
+
+    Args:
+        path(str): 作成する定石ファイルのパス
+        games(Iterable[Sequence[tuple[Sequence[Sequence[str | None]], str]]]): 対局ごとの `DBController.get_scene_records` の戻り値
+        max_plies(int | None, optional): 登録する手数の上限. `None` のときは全ての手を登録する. default to None.
+
+    Returns:
+        int: 書き込んだレコードの数"""
+    stats: dict[tuple[int, int], list[int]] = {}
+    for scenes in games:
+        if not scenes:
+            continue
+        black, white = from_names(scenes[-1][0])
+        difference = black.bit_count() - white.bit_count()
+        for ply, (player, opponent, move, color) in enumerate(iter_game_moves(scenes)):
+            if max_plies is not None and ply >= max_plies:
+                break
+            key, symmetry = canonicalize(player, opponent)
+            record = stats.setdefault((key, transform_square(move, symmetry)), [0, 0])
+            mover_difference = difference if color == "BLACK" else -difference
+            record[0] += 1
+            record[1] += 2 if mover_difference > 0 else 1 if mover_difference == 0 else 0
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(stats)))
+        for (key, move), (games_count, points) in sorted(stats.items()):
+            file.write(RECORD.pack(key, move, games_count, points))
+    return len(stats)
+
+
+def main():
+    """保存された対局から定石ファイルを作成するコマンド"""
+    from storage import open_storage
+
+    parser = argparse.ArgumentParser(description="保存された対局から定石ファイルを作成する")
+    parser.add_argument("path", help="作成する定石ファイルのパス")
+    parser.add_argument("--max-plies", type=int, default=None, help="登録する手数の上限")
+    args = parser.parse_args()
+
+    games = (scenes for _, scenes in open_storage().query(is_finished=True))
+    record_count = build(args.path, games, args.max_plies)
+    print(f"{record_count} records written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
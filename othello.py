@@ -2,13 +2,14 @@ from __future__ import annotations
 
 import tkinter
 
-import mysql
-
-from systems import CONFIG
+from systems import CONFIG, ComputerPlayer
 from game_display import GameDisplay
 from history_display import HistoryDisplay
 from home_display import HomeDisplay
 from spectator_display import SpectatorDisplay
+from spectator_wall import SpectatorWallDisplay
+from history_writer import HistoryWriter
+from storage import StorageUnavailableError
 
 
 ICON_IMAGE_PATH = CONFIG["ICON_IMAGE_PATH"]
@@ -28,7 +29,7 @@ def main():
         is_using_database = True
         history_display = HistoryDisplay(root)
         history_display.grid(row=0, column=0, sticky="nsew")
-    except mysql.connector.errors.InterfaceError:
+    except StorageUnavailableError:
         history_display = None
         is_using_database = False
 
@@ -38,12 +39,25 @@ def main():
     spectator_display = SpectatorDisplay(root, 5)
     spectator_display.grid(row=0, column=0, sticky="nsew")
 
+    spectator_wall_display = SpectatorWallDisplay(root)
+    spectator_wall_display.grid(row=0, column=0, sticky="nsew")
+
     home_display.tkraise()
 
     if not is_using_database:
         game_display.manager_display.save_button["state"] = "disable"
+    else:
+        # 前回の起動で書き込めなかった履歴を書き込む
+        HistoryWriter.shared().start()
 
     root.mainloop()
 
+    HistoryWriter.shared().shutdown()
+
+    game_display.manager.executor.shutdown()
+    for player in game_display.manager.players:
+        if isinstance(player, ComputerPlayer):
+            player.engine.shutdown()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, Future, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+import multiprocessing
+import os
+import threading
+import time
+
+from bitboard import legal_moves, play, iter_squares, PASS
+from engine import (
+    AlphaBetaEngine,
+    SearchResult,
+    SearchTimeout,
+    Evaluator,
+    evaluate,
+    INFINITY,
+    DEFAULT_TIME_BUDGET,
+    MAX_SEARCH_DEPTH,
+    ENDGAME_TIME_RATIO,
+)
+
+if TYPE_CHECKING:
+    from endgame import EndgameSolver
+
+
+STOP_POLL_INTERVAL = 0.05
+
+# 共有配列のインデックス
+SHARED_ITERATION = 0
+SHARED_BEST_SCORE = 1
+SHARED_STOP = 2
+
+
+# ワーカープロセスごとの状態. initializer で設定される
+_worker_engine: AlphaBetaEngine | None = None
+_worker_shared = None
+
+
+@dataclass
+class RootMoveOutcome:
+    """ワーカーがルートの手を1つ探索した結果を保持するデータクラス
+
+    Attributes:
+        move(int): 探索した手
+        score(int | None): 手番側から見た評価値. 時間切れのときは `None`
+        is_exact(bool): 評価値が窓の内側に収まったかどうか. `False` のときは上限値
+        nodes(int): 探索したノード数
+        pv(list[int]): この手から始まる読み筋"""
+    move: int
+    score: int | None
+    is_exact: bool
+    nodes: int
+    pv: list[int] = field(default_factory=list)
+
+
+class _SharedStopFlag:
+    """共有配列を `threading.Event` と同じように参照するためのクラス
+
+    親プロセスが中断を求めたときと, 次の反復が始まって探索が不要になったときにセットされる."""
+
+    def __init__(self, shared, iteration: int):
+        self.shared = shared
+        self.iteration: int = iteration
+
+    def is_set(self) -> bool:
+        return bool(self.shared[SHARED_STOP]) or self.shared[SHARED_ITERATION] != self.iteration
+
+
+def _init_worker(shared, evaluator: Evaluator, max_depth: int):
+    """ワーカープロセスの初期化を行う関数"""
+    global _worker_engine, _worker_shared
+    _worker_engine = AlphaBetaEngine(max_depth=max_depth, evaluator=evaluator)
+    _worker_shared = shared
+
+
+def _search_root_move(
+        player: int,
+        opponent: int,
+        move: int,
+        depth: int,
+        iteration: int,
+        time_left: float,
+) -> RootMoveOutcome:
+    """ワーカープロセスでルートの手を1つ探索する関数
+
+    他のワーカーが見つけた最善の評価値を共有配列から読み, 探索の窓を狭める."""
+    engine = _worker_engine
+    shared = _worker_shared
+    with shared.get_lock():
+        alpha = shared[SHARED_BEST_SCORE] if shared[SHARED_ITERATION] == iteration else -INFINITY
+    child = play(player, opponent, move)
+    nodes_before = engine.nodes
+    try:
+        score = -engine.search_window(
+            *child,
+            depth - 1,
+            -INFINITY,
+            -alpha,
+            time_left,
+            _SharedStopFlag(shared, iteration),
+        )
+    except SearchTimeout:
+        return RootMoveOutcome(move, None, False, engine.nodes - nodes_before)
+
+    with shared.get_lock():
+        if shared[SHARED_ITERATION] == iteration and score > shared[SHARED_BEST_SCORE]:
+            shared[SHARED_BEST_SCORE] = score
+    pv = [move] + engine.principal_variation(*child, depth - 1)
+    return RootMoveOutcome(move, score, score > alpha, engine.nodes - nodes_before, pv)
+
+
+class ParallelSearchEngine:
+    """ルートの手を複数のプロセスに分けて探索するエンジン
+
+    反復深化の各深さで, ルートの全ての手をプロセスプールに投入する.
+    ワーカー間では, その深さで見つかった最善の評価値だけを共有配列で共有し,
+    各ワーカーはそれを窓の下限として使う.
+    `AlphaBetaEngine` と同じ `search` を持つので, `ComputerPlayer` にそのまま渡せる.
+
+    Attributes:
+        time_budget(float): 1手あたりの持ち時間(秒)
+        max_depth(int): 探索する最大の深さ
+        max_workers(int): ワーカープロセスの数
+        evaluator(Evaluator): 末端の局面の評価関数
+        endgame_solver(EndgameSolver | None): 終盤に読み切りを行うソルバー. 親プロセスで実行する
+        nodes(int): 直近の探索で全ワーカーが探索したノード数"""
+
+    def __init__(
+            self,
+            time_budget: float = DEFAULT_TIME_BUDGET,
+            max_depth: int = MAX_SEARCH_DEPTH,
+            max_workers: int | None = None,
+            evaluator: Evaluator = evaluate,
+            endgame_solver: EndgameSolver | None = None,
+    ):
+        self.time_budget: float = time_budget
+        self.max_depth: int = max_depth
+        self.max_workers: int = max_workers or os.cpu_count() or 1
+        self.evaluator: Evaluator = evaluator
+        self.endgame_solver: EndgameSolver | None = endgame_solver
+        self.nodes: int = 0
+        self.__shared = multiprocessing.Array("q", 3)
+        self.__pool: ProcessPoolExecutor | None = None
+
+    def __get_pool(self) -> ProcessPoolExecutor:
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(
+                self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.__shared, self.evaluator, self.max_depth),
+            )
+        return self.__pool
+
+    def shutdown(self):
+        """ワーカープロセスを終了するメソッド"""
+        self.__shared[SHARED_STOP] = 1
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=False, cancel_futures=True)
+            self.__pool = None
+
+    def search(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int | None = None,
+            stop_event: threading.Event | None = None,
+            time_budget: float | None = None,
+    ) -> SearchResult:
+        """最善手を探索するメソッド
+
+        Args:
+            player(int): 手番側の石
+            opponent(int): 相手側の石
+            root_moves(int | None, optional): 探索する手を絞り込むときに指定する. default to None.
+            stop_event(threading.Event | None, optional): 探索を中断させるためのイベント. default to None.
+            time_budget(float | None, optional): 持ち時間(秒). `None` のときは `self.time_budget`. default to None.
+
+        Returns:
+            SearchResult: 探索結果"""
+        if time_budget is None:
+            time_budget = self.time_budget
+        start = time.perf_counter()
+        deadline = start + time_budget
+        self.nodes = 0
+
+        moves = legal_moves(player, opponent)
+        if root_moves is not None:
+            moves &= root_moves
+        if moves == 0:
+            return SearchResult(PASS, 0, 0, 0, time.perf_counter() - start)
+
+        if self.endgame_solver is not None and self.endgame_solver.can_solve(player, opponent):
+            try:
+                return self.endgame_solver.solve(
+                    player,
+                    opponent,
+                    moves,
+                    time_budget * ENDGAME_TIME_RATIO,
+                    stop_event,
+                )
+            except SearchTimeout:
+                pass
+
+        pool = self.__get_pool()
+        empties = 64 - (player | opponent).bit_count()
+        ordered_moves = list(iter_squares(moves))
+        result = SearchResult(ordered_moves[0], 0, 0, 0, 0.)
+        for depth in range(1, min(self.max_depth, empties) + 1):
+            with self.__shared.get_lock():
+                iteration = self.__shared[SHARED_ITERATION] + 1
+                self.__shared[SHARED_ITERATION] = iteration
+                self.__shared[SHARED_BEST_SCORE] = -INFINITY
+                self.__shared[SHARED_STOP] = 0
+
+            futures = [
+                pool.submit(
+                    _search_root_move,
+                    player,
+                    opponent,
+                    move,
+                    depth,
+                    iteration,
+                    deadline - time.perf_counter(),
+                )
+                for move in ordered_moves
+            ]
+            is_completed = self.__wait(futures, deadline, stop_event)
+            outcomes = [future.result() for future in futures if future.done() and not future.cancelled()]
+            self.nodes += sum(outcome.nodes for outcome in outcomes)
+            if not is_completed or any(outcome.score is None for outcome in outcomes):
+                break
+
+            best = max(outcomes, key=lambda outcome: (outcome.score, outcome.is_exact))
+            result = SearchResult(
+                best.move,
+                best.score,
+                depth,
+                self.nodes,
+                time.perf_counter() - start,
+                best.pv,
+                is_exact=(depth == empties),
+            )
+            # 次の深さでは評価値の高い手から探索する
+            ordered_moves = [
+                outcome.move for outcome in sorted(outcomes, key=lambda outcome: -outcome.score)
+            ]
+
+        # 残っているワーカーの探索を止める
+        self.__shared[SHARED_STOP] = 1
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def __wait(
+            self,
+            futures: list[Future],
+            deadline: float,
+            stop_event: threading.Event | None,
+    ) -> bool:
+        """全てのワーカーの探索が終わるまで待つメソッド
+
+        Returns:
+            bool: 持ち時間内に中断されずに全ての探索が終わったかどうか"""
+        pending = set(futures)
+        while pending:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            timeout = min(STOP_POLL_INTERVAL, deadline - time.perf_counter())
+            if timeout <= 0:
+                return False
+            _, pending = wait(pending, timeout=timeout)
+        return True
@@ -0,0 +1,358 @@
+# 合法手生成の検証とベンチマーク(perft)
+# 局面から指定の深さまでの全ての手順をたどり, 末端の局面の数を数える.
+# パスは `GameManager.change_turn` と同じく1手として数え, 両者とも置けない局面(終局)はその時点で末端とする.
+# ビットボードの結果を既知の値と, `GameManager` の判定をそのまま移した参照実装の結果と照合し, 1秒あたりのノード数を表示する.
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import argparse
+import json
+import os
+import sys
+import time
+
+from bitboard import legal_moves, play, iter_squares, to_names, to_notation, INITIAL_BLACK, INITIAL_WHITE, BOARD_LENGTH
+
+
+DEFAULT_DEPTH = 8
+DEFAULT_REFERENCE_DEPTH = 5
+BASELINE_TOLERANCE = .9     # 基準のNPSに対してこの割合を下回ったら遅くなったとみなす
+BASELINE_REPEATS = 5     # 基準と比べるときに最大の深さを繰り返す回数. 最も速かった回のNPSを使う
+BLACK_MARK = "X"
+WHITE_MARK = "O"
+EMPTY_MARK = "-"
+
+# `game_manager.Direction` と同じ8方向
+DIRECTIONS = (
+    (0, -1),
+    (0, 1),
+    (1, 0),
+    (-1, 0),
+    (1, -1),
+    (-1, -1),
+    (1, 1),
+    (-1, 1),
+)
+
+
+@dataclass
+class PerftPosition:
+    """perft の対象の局面と既知のノード数を保持するデータクラス
+
+    Attributes:
+        name(str): 局面の名前
+        board(str): 盤面. 上の行から順に64マスを `X`(黒), `O`(白), `-`(空き)で表す
+        turn(str): 手番の色の名前("BLACK" / "WHITE")
+        counts(dict[int, int]): 深さごとの末端の局面の数"""
+    name: str
+    board: str
+    turn: str
+    counts: dict[int, int] = field(default_factory=dict)
+
+    def to_bitboards(self) -> tuple[int, int]:
+        """手番側の石と相手側の石を返すメソッド"""
+        black = white = 0
+        for square, mark in enumerate(self.board):
+            if mark == BLACK_MARK:
+                black |= 1 << square
+            elif mark == WHITE_MARK:
+                white |= 1 << square
+        return (black, white) if self.turn == "BLACK" else (white, black)
+
+
+# 初期配置は `OthelloBoard.init_board` と同じ. ノード数はパスを1手として数えた既知の値
+INITIAL_POSITION = PerftPosition(
+    "initial",
+    "".join(
+        BLACK_MARK if INITIAL_BLACK >> square & 1 else WHITE_MARK if INITIAL_WHITE >> square & 1 else EMPTY_MARK
+        for square in range(BOARD_LENGTH * BOARD_LENGTH)
+    ),
+    "BLACK",
+    {
+        1: 4,
+        2: 12,
+        3: 56,
+        4: 244,
+        5: 1396,
+        6: 8200,
+        7: 55092,
+        8: 390216,
+        9: 3005288,
+        10: 24571284,
+        11: 212258800,
+    },
+)
+
+# 途中の局面のノード数は, ビットボードと参照実装の両方で数えて一致したもの
+TEST_POSITIONS: tuple[PerftPosition, ...] = (
+    INITIAL_POSITION,
+    PerftPosition(
+        "midgame",
+        "--------------O----XX-O----XOXOX---XO-O----XOOO---XXX-O---OXO-O-",
+        "BLACK",
+        {1: 9, 2: 74, 3: 809, 4: 6738, 5: 80704, 6: 682059},
+    ),
+    # 深いところでパスが多く生じる局面
+    PerftPosition(
+        "passes",
+        "-X-XXXXX-OOOXXXO-OOOOXOOOOOOOOO-OOXXOO-X-OXOXO---OOXXOO--XXXXX--",
+        "BLACK",
+        {1: 12, 2: 23, 3: 248, 4: 740, 5: 6530, 6: 23918, 7: 161653, 8: 606695},
+    ),
+    # 手番側が置けず, ルートでパスする局面
+    PerftPosition(
+        "root_pass",
+        "------O---XXXXOO--X-X-O---XXXOOO--XXX-O--XXXXXOO-XXX--O------OOO",
+        "BLACK",
+        {1: 1, 2: 8, 3: 28, 4: 284, 5: 1919, 6: 21211, 7: 189122, 8: 2053209},
+    ),
+    # 空きマス9の局面. 深さ9以降は終局とパスを含む
+    PerftPosition(
+        "endgame",
+        "---O-OOOOXOOOOOO-XXOOOXO-XOXXXXOOXXXXXOOOXXXXXOXOXOOOOO-XXXXO-O-",
+        "WHITE",
+        {1: 4, 2: 26, 3: 100, 4: 520, 5: 1482, 6: 5379, 7: 9759, 8: 19160, 9: 19226, 10: 19971},
+    ),
+)
+
+
+def perft(player: int, opponent: int, depth: int) -> int:
+    """ビットボードで末端の局面の数を数える関数
+
+    Args:
+        player(int): 手番側の石
+        opponent(int): 相手側の石
+        depth(int): 深さ
+
+    Returns:
+        int: 末端の局面の数"""
+    if depth == 0:
+        return 1
+    moves = legal_moves(player, opponent)
+    if moves == 0:
+        if legal_moves(opponent, player) == 0:
+            return 1
+        return perft(opponent, player, depth - 1)
+    if depth == 1:
+        return moves.bit_count()
+    return sum(perft(*play(player, opponent, move), depth - 1) for move in iter_squares(moves))
+
+
+def _reference_can_flip_along_direction(
+        board: list[list[str | None]],
+        color: str,
+        x: int,
+        y: int,
+        dx: int,
+        dy: int,
+) -> bool:
+    """`GameManager.can_flip_along_direction` と同じ判定を行う関数"""
+    if board[y][x] is not None:
+        return False
+    x, y = x + dx, y + dy
+    exists_opponent_stone = False
+    while 0 <= x < BOARD_LENGTH and 0 <= y < BOARD_LENGTH:
+        stone = board[y][x]
+        if stone is None:
+            break
+        if stone != color:
+            exists_opponent_stone = True
+        if stone == color:
+            return exists_opponent_stone
+        x, y = x + dx, y + dy
+    return False
+
+
+def _reference_putable_coordinates(board: list[list[str | None]], color: str) -> list[tuple[int, int]]:
+    """`GameManager.set_putable_tiles` と同じ順に, 置ける座標を返す関数"""
+    return [
+        (x, y)
+        for x in range(BOARD_LENGTH)
+        for y in range(BOARD_LENGTH)
+        if any(_reference_can_flip_along_direction(board, color, x, y, dx, dy) for dx, dy in DIRECTIONS)
+    ]
+
+
+def _reference_put(board: list[list[str | None]], color: str, x: int, y: int) -> list[list[str | None]]:
+    """`GameManager.put_stone` と同じ手順で石を置いた盤面を返す関数"""
+    directions = [
+        (dx, dy) for dx, dy in DIRECTIONS
+        if _reference_can_flip_along_direction(board, color, x, y, dx, dy)
+    ]
+    board = [list(row) for row in board]
+    board[y][x] = color
+    for dx, dy in directions:
+        cx, cy = x + dx, y + dy
+        while 0 <= cx < BOARD_LENGTH and 0 <= cy < BOARD_LENGTH:
+            if board[cy][cx] == color:
+                break
+            board[cy][cx] = color
+            cx, cy = cx + dx, cy + dy
+    return board
+
+
+def reference_perft(board: list[list[str | None]], color: str, depth: int) -> int:
+    """`GameManager` と同じ判定で末端の局面の数を数える関数
+
+    `GameManager.change_turn` と同じく, 置けるところがなければパスして相手の番にし,
+    両者とも置けなければ終局とする. ビットボードの実装の検証に使うので, 速さは考えない.
+
+    Args:
+        board(list[list[str | None]]): 色の名前("BLACK" / "WHITE")か `None` の二次元リスト
+        color(str): 手番の色の名前
+        depth(int): 深さ
+
+    Returns:
+        int: 末端の局面の数"""
+    if depth == 0:
+        return 1
+    other = "WHITE" if color == "BLACK" else "BLACK"
+    coordinates = _reference_putable_coordinates(board, color)
+    if not coordinates:
+        if not _reference_putable_coordinates(board, other):
+            return 1
+        return reference_perft(board, other, depth - 1)
+    return sum(reference_perft(_reference_put(board, color, x, y), other, depth - 1) for x, y in coordinates)
+
+
+@dataclass
+class PerftResult:
+    """1つの局面と深さの perft の結果を保持するデータクラス
+
+    Attributes:
+        name(str): 局面の名前
+        depth(int): 深さ
+        nodes(int): 末端の局面の数
+        elapsed(float): かかった秒数
+        expected(int | None): 既知のノード数. 不明なときは `None`"""
+    name: str
+    depth: int
+    nodes: int
+    elapsed: float
+    expected: int | None = None
+
+    @property
+    def nps(self) -> int:
+        """1秒あたりの末端の局面の数"""
+        if self.elapsed <= 0:
+            return 0
+        return int(self.nodes / self.elapsed)
+
+    @property
+    def is_ok(self) -> bool:
+        """既知のノード数と一致したか. 不明なときは `True`"""
+        return self.expected is None or self.nodes == self.expected
+
+
+def run_perft(position: PerftPosition, depth: int, reference: bool = False) -> PerftResult:
+    """局面の perft を行う関数
+
+    Args:
+        position(PerftPosition): 局面
+        depth(int): 深さ
+        reference(bool, optional): ビットボードではなく参照実装で数えるかどうか. default to False.
+
+    Returns:
+        PerftResult: 結果"""
+    player, opponent = position.to_bitboards()
+    start = time.perf_counter()
+    if reference:
+        black, white = (player, opponent) if position.turn == "BLACK" else (opponent, player)
+        nodes = reference_perft(to_names(black, white), position.turn, depth)
+    else:
+        nodes = perft(player, opponent, depth)
+    return PerftResult(position.name, depth, nodes, time.perf_counter() - start, position.counts.get(depth))
+
+
+def divide(position: PerftPosition, depth: int) -> dict[str, int]:
+    """ルートの手ごとの末端の局面の数を返す関数. 数が合わないときに, どの手の下で違うかを調べるのに使う"""
+    player, opponent = position.to_bitboards()
+    moves = legal_moves(player, opponent)
+    return {
+        to_notation(move): perft(*play(player, opponent, move), depth - 1)
+        for move in iter_squares(moves)
+    }
+
+
+def main():
+    """perft を行い, 既知のノード数, 参照実装, 基準の速さと比べるコマンド
+
+    ノード数が一致しなかったときや, 基準より遅くなったときは終了コード1で終わる."""
+    parser = argparse.ArgumentParser(description="合法手生成の正しさと速さを perft で検証する")
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help=f"最大の深さ. 省略すると局面ごとに既知のノード数がある深さまで(ただし{DEFAULT_DEPTH}まで)",
+    )
+    parser.add_argument("--position", default=None, help="対象の局面の名前. 省略すると全ての局面")
+    parser.add_argument(
+        "--reference",
+        type=int,
+        nargs="?",
+        const=DEFAULT_REFERENCE_DEPTH,
+        default=None,
+        metavar="DEPTH",
+        help="この深さまで `GameManager` と同じ判定の参照実装とも照合する",
+    )
+    parser.add_argument("--divide", action="store_true", help="最大の深さでルートの手ごとのノード数を表示する")
+    parser.add_argument("--baseline", default=None, help="NPSの基準を保存するJSONファイル. なければ作成し, あれば比べる")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=BASELINE_TOLERANCE,
+        help="基準のNPSに対してこの割合を下回ったら遅くなったとみなす",
+    )
+    args = parser.parse_args()
+
+    positions = [position for position in TEST_POSITIONS if args.position in (None, position.name)]
+    if not positions:
+        parser.error(f"unknown position: {args.position}")
+
+    is_ok = True
+    throughput: dict[str, dict[str, int]] = {}
+    for position in positions:
+        max_depth = args.depth
+        if max_depth is None:
+            max_depth = min(max(position.counts, default=DEFAULT_DEPTH), DEFAULT_DEPTH)
+        for depth in range(1, max_depth + 1):
+            result = run_perft(position, depth)
+            status = "ok" if result.expected is not None and result.is_ok else "--" if result.is_ok else f"MISMATCH(expected {result.expected})"
+            if args.reference is not None and depth <= args.reference:
+                reference_result = run_perft(position, depth, reference=True)
+                if reference_result.nodes != result.nodes:
+                    status += f" REFERENCE MISMATCH({reference_result.nodes})"
+                    is_ok = False
+                else:
+                    status += f" reference ok({reference_result.nps} nps)"
+            is_ok = is_ok and result.is_ok
+            print(f"{position.name} depth {depth}: {result.nodes} nodes {result.elapsed:.3f}s {result.nps} nps {status}")
+        if args.baseline is not None:
+            nps = max([result.nps] + [run_perft(position, max_depth).nps for _ in range(BASELINE_REPEATS - 1)])
+            throughput[position.name] = {"depth": max_depth, "nps": nps}
+        if args.divide:
+            for move, nodes in divide(position, max_depth).items():
+                print(f"  {move}: {nodes}")
+
+    if args.baseline is not None:
+        if not os.path.exists(args.baseline):
+            with open(args.baseline, "w") as file:
+                json.dump(throughput, file, indent=2)
+            print(f"baseline written to {args.baseline}")
+        else:
+            with open(args.baseline, "r") as file:
+                baseline = json.load(file)
+            for name, measured in throughput.items():
+                expected = baseline.get(name)
+                if expected is None or expected["depth"] != measured["depth"] or expected["nps"] == 0:
+                    print(f"{name}: no baseline at depth {measured['depth']}")
+                    continue
+                ratio = measured["nps"] / expected["nps"]
+                is_slower = ratio < args.tolerance
+                print(f"{name}: {ratio:.2f}x baseline{' SLOWER' if is_slower else ''}")
+                is_ok = is_ok and not is_slower
+    sys.exit(0 if is_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Sequence
+
+from systems import Color, OthelloPlayer
+
+if TYPE_CHECKING:
+    from history import History
+    from objects import Stone
+
+
+KEYFRAME_INTERVAL = 8
+
+
+type ColorGrid = tuple[Color | None, ...]
+
+
+def to_color_grid(board: Sequence[Sequence[Stone | None]]) -> ColorGrid:
+    """盤面の二次元リストを, 各マスの色を行優先で並べたタプルに変換する関数
+
+    Args:
+        board(Sequence[Sequence[Stone | None]]): 盤面状況を保持する二次元リスト
+
+    Returns:
+        ColorGrid: インデックス `y * 盤面の横幅 + x` のマスの色を保持するタプル"""
+    return tuple(None if stone is None else stone.color for row in board for stone in row)
+
+
+@dataclass(frozen=True)
+class SceneDelta:
+    """隣り合う2つのシーン間で変化したマスを保持するデータクラス
+
+    Attributes:
+        indexes(tuple[int, ...]): 変化したマスのインデックス
+        before(tuple[Color | None, ...]): 変化前の各マスの色
+        after(tuple[Color | None, ...]): 変化後の各マスの色"""
+    indexes: tuple[int, ...]
+    before: tuple[Color | None, ...]
+    after: tuple[Color | None, ...]
+
+    @staticmethod
+    def between(before: ColorGrid, after: ColorGrid) -> SceneDelta:
+        """2つの盤面の差分を作成するメソッド"""
+        indexes = tuple(i for i, (b, a) in enumerate(zip(before, after)) if b != a)
+        return SceneDelta(
+            indexes,
+            tuple(before[i] for i in indexes),
+            tuple(after[i] for i in indexes),
+        )
+
+    def apply(self, grid: list[Color | None]) -> None:
+        """差分を順方向に適用するメソッド"""
+        for index, color in zip(self.indexes, self.after):
+            grid[index] = color
+
+    def revert(self, grid: list[Color | None]) -> None:
+        """差分を逆方向に適用するメソッド"""
+        for index, color in zip(self.indexes, self.before):
+            grid[index] = color
+
+
+class ReplayTimeline:
+    """履歴の任意のターンへ定数時間でシークするためのタイムライン
+
+    `keyframe_interval` ターンごとに盤面全体をキーフレームとして保持し,
+    それ以外のターンはシーン間の差分から復元する.
+    任意のターンの盤面は, 最も近いキーフレームから前方または後方へ
+    高々 `keyframe_interval // 2` 個の差分を適用するだけで得られる.
+
+    Attributes:
+        board_width(int): 盤面の横幅
+        keyframe_interval(int): キーフレームの間隔
+        keyframes(list[ColorGrid]): キーフレームの盤面
+        deltas(list[SceneDelta]): `deltas[i]` は `i` ターン目から `i + 1` ターン目への差分
+        stone_counts(list[tuple[int, int]]): 各ターンの黒と白の石の数
+        turn_players(list[OthelloPlayer]): 各ターンのターンプレイヤー"""
+
+    def __init__(self, history: History, keyframe_interval: int = KEYFRAME_INTERVAL):
+        """コンストラクタ
+
+        Args:
+            history(History): タイムラインを作成する履歴
+            keyframe_interval(int, optional): キーフレームの間隔. default to KEYFRAME_INTERVAL."""
+        self.board_width: int = len(history[0].board[0])
+        self.keyframe_interval: int = keyframe_interval
+        self.keyframes: list[ColorGrid] = []
+        self.deltas: list[SceneDelta] = []
+        self.stone_counts: list[tuple[int, int]] = []
+        self.turn_players: list[OthelloPlayer] = []
+
+        previous: ColorGrid | None = None
+        for turn_index, scene in enumerate(history):
+            grid = to_color_grid(scene.board)
+            if turn_index % keyframe_interval == 0:
+                self.keyframes.append(grid)
+            if previous is not None:
+                self.deltas.append(SceneDelta.between(previous, grid))
+            self.stone_counts.append((grid.count(Color.BLACK), grid.count(Color.WHITE)))
+            self.turn_players.append(scene.turn_player)
+            previous = grid
+
+    def __len__(self) -> int:
+        return len(self.turn_players)
+
+    def colors_at(self, turn_index: int) -> ColorGrid:
+        """指定ターンの盤面を返すメソッド
+
+        Args:
+            turn_index(int): 盤面を取得したいターンの番号
+
+        Returns:
+            ColorGrid: 指定ターンの盤面"""
+        keyframe_index = min(
+            (turn_index + self.keyframe_interval // 2) // self.keyframe_interval,
+            len(self.keyframes) - 1,
+        )
+        keyframe_turn = keyframe_index * self.keyframe_interval
+        grid = list(self.keyframes[keyframe_index])
+        if keyframe_turn <= turn_index:
+            for delta in self.deltas[keyframe_turn:turn_index]:
+                delta.apply(grid)
+        else:
+            for delta in reversed(self.deltas[turn_index:keyframe_turn]):
+                delta.revert(grid)
+        return tuple(grid)
+
+    @staticmethod
+    def diff(current: ColorGrid, target: ColorGrid) -> list[tuple[int, Color | None]]:
+        """現在の盤面から目的の盤面にするために書き換えるマスを返すメソッド
+
+        Args:
+            current(ColorGrid): 現在描画している盤面
+            target(ColorGrid): 描画したい盤面
+
+        Returns:
+            list[tuple[int, Color | None]]: 書き換えるマスのインデックスと色の組のリスト"""
+        return [(i, color) for i, (pre, color) in enumerate(zip(current, target)) if pre != color]
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+from typing import Protocol
+import math
+import time
+import tkinter
+from tkinter import Frame, Misc, Canvas
+
+from boardgame import Coordinate, BoardGamePhotoImage
+from boardgame.imagetools import get_frame_width
+
+from systems import Color
+from objects import (
+    OTHELLO_BOARD_SIZE,
+    BLACK_STONE_IMAGE,
+    WHITE_STONE_IMAGE,
+    BOARD_BACKGROUND_IMAGE_PATH,
+    FRAME_IMAGE_PATH,
+    GRID_IMAGE_PATH,
+)
+from display_items import SceneTransitionButton, Display
+from replay import ReplayTimeline, ColorGrid
+from history import History
+
+
+WALL_HOME_BUTTON_TEXT = "ホームへ戻る"
+WALL_BOARD_PADDING = 8
+WALL_TITLE_HEIGHT = 16
+WALL_GRID_WIDTH = 1
+WALL_FPS = 30
+WALL_SECONDS_PER_MOVE = 1.0
+WALL_SECONDS_TO_HOLD_LAST_SCENE = 5.0
+
+
+class SpriteCache:
+    """画像を元のパスと大きさごとに1つだけ保持するキャッシュ
+
+    ウォール上の全てのボードは同じ画像オブジェクトを参照するので,
+    ボードを増やしても画像のメモリは増えない."""
+
+    def __init__(self):
+        self.__images: dict[tuple[str, tuple[int, int]], BoardGamePhotoImage] = {}
+
+    def get(self, path: str, size: tuple[int, int]) -> BoardGamePhotoImage:
+        """指定の画像を指定の大きさで取得するメソッド
+
+        Args:
+            path(str): 画像のパス
+            size(tuple[int, int]): 画像の大きさ
+
+        Returns:
+            BoardGamePhotoImage: キャッシュされた画像"""
+        key = (path, tuple(size))
+        if key not in self.__images:
+            self.__images[key] = BoardGamePhotoImage(path, size)
+        return self.__images[key]
+
+    def stone(self, color: Color, size: tuple[int, int]) -> BoardGamePhotoImage:
+        """指定の色の石の画像を取得するメソッド"""
+        return self.get(BLACK_STONE_IMAGE if color == Color.BLACK else WHITE_STONE_IMAGE, size)
+
+    def clear(self):
+        """キャッシュを空にするメソッド"""
+        self.__images.clear()
+
+
+class WallBoardLayout:
+    """ウォール上の1枚のボードの大きさを表すクラス
+
+    背景とグリッドとフレームを合成した画像を一度だけ作成し, 同じ大きさの全てのボードで共有する.
+
+    Attributes:
+        board_length(int): ボード全体の一辺の長さ
+        frame_width(int): フレームの幅
+        space_length(int): 1マスの一辺の長さ
+        grid_width(int): グリッドの太さ
+        image(BoardGamePhotoImage): 合成済みのボード画像"""
+
+    def __init__(self, board_length: int, grid_width: int = WALL_GRID_WIDTH):
+        self.board_length: int = board_length
+        self.grid_width: int = grid_width
+
+        frame = BoardGamePhotoImage(FRAME_IMAGE_PATH, (board_length, board_length))
+        self.frame_width: int = get_frame_width(frame)
+        inner_length = board_length - self.frame_width * 2
+        columns = OTHELLO_BOARD_SIZE[0]
+        self.space_length: int = (inner_length - grid_width * (columns - 1)) // columns
+
+        image = BoardGamePhotoImage(BOARD_BACKGROUND_IMAGE_PATH, (board_length, board_length))
+        vertical_grid = BoardGamePhotoImage(GRID_IMAGE_PATH)
+        if vertical_grid.height() < vertical_grid.width():
+            vertical_grid.rotate(90)
+        horizontal_grid = vertical_grid.copy()
+        horizontal_grid.rotate(90)
+        vertical_grid.resize((grid_width, inner_length))
+        horizontal_grid.resize((inner_length, grid_width))
+        for i in range(1, columns):
+            offset = self.frame_width + i * self.space_length + (i - 1) * grid_width
+            image.put_on(vertical_grid, (offset, self.frame_width))
+            image.put_on(horizontal_grid, (self.frame_width, offset))
+        image.put_on(frame, (0, 0))
+        self.image: BoardGamePhotoImage = image
+
+    def get_space_origin(self, index: int) -> tuple[int, int]:
+        """マスの左上のボード上の座標を返すメソッド
+
+        Args:
+            index(int): `y * 盤面の横幅 + x` で表されるマスのインデックス"""
+        x, y = index % OTHELLO_BOARD_SIZE[0], index // OTHELLO_BOARD_SIZE[0]
+        step = self.space_length + self.grid_width
+        return self.frame_width + x * step, self.frame_width + y * step
+
+
+class WallBoard:
+    """ウォールのキャンバス上に描画される小さなボード
+
+    石はキャンバスのアイテムとして直接描画し, 置かれている石の数だけアイテムを持つ.
+    盤面の更新は `show` で予約され, `RenderScheduler` がまとめて描画する.
+
+    Attributes:
+        origin(tuple[int, int]): キャンバス上のボードの左上の座標
+        layout(WallBoardLayout): ボードの大きさ
+        displayed_colors(ColorGrid): 現在描画されている盤面"""
+
+    def __init__(
+            self,
+            canvas: Canvas,
+            origin: tuple[int, int],
+            layout: WallBoardLayout,
+            sprites: SpriteCache,
+            scheduler: RenderScheduler,
+            title: str = "",
+    ):
+        self.canvas = canvas
+        self.origin: tuple[int, int] = origin
+        self.layout: WallBoardLayout = layout
+        self.sprites: SpriteCache = sprites
+        self.scheduler: RenderScheduler = scheduler
+        self.displayed_colors: ColorGrid = (None,) * (OTHELLO_BOARD_SIZE[0] * OTHELLO_BOARD_SIZE[1])
+        self.__pending_colors: ColorGrid | None = None
+        self.__stone_ids: dict[int, int] = {}
+        self.__item_ids: list[int] = [
+            canvas.create_image(*origin, image=layout.image, anchor=tkinter.NW),
+            canvas.create_text(
+                origin[0] + layout.board_length // 2,
+                origin[1] + layout.board_length + WALL_TITLE_HEIGHT // 2,
+                text=title,
+            ),
+        ]
+
+    def show(self, colors: ColorGrid):
+        """盤面の描画を予約するメソッド
+
+        同じフレーム内に何度呼ばれても, 最後に渡された盤面だけが描画される.
+
+        Args:
+            colors(ColorGrid): 描画する盤面"""
+        self.__pending_colors = colors
+        self.scheduler.request_render(self)
+
+    def render(self):
+        """予約されている盤面を描画するメソッド
+
+        現在の描画と異なるマスのみを書き換える."""
+        if self.__pending_colors is None:
+            return
+        size = (self.layout.space_length, self.layout.space_length)
+        for index, color in ReplayTimeline.diff(self.displayed_colors, self.__pending_colors):
+            item_id = self.__stone_ids.get(index)
+            if color is None:
+                if item_id is not None:
+                    self.canvas.delete(item_id)
+                    del self.__stone_ids[index]
+                continue
+            image = self.sprites.stone(color, size)
+            if item_id is None:
+                x, y = self.layout.get_space_origin(index)
+                self.__stone_ids[index] = self.canvas.create_image(
+                    self.origin[0] + x,
+                    self.origin[1] + y,
+                    image=image,
+                    anchor=tkinter.NW,
+                )
+            else:
+                self.canvas.itemconfigure(item_id, image=image)
+        self.displayed_colors = self.__pending_colors
+        self.__pending_colors = None
+
+    def destroy(self):
+        """キャンバスからボードを取り除くメソッド"""
+        for item_id in (*self.__item_ids, *self.__stone_ids.values()):
+            self.canvas.delete(item_id)
+        self.__stone_ids.clear()
+
+
+class BoardFeed(Protocol):
+    """`WallBoard` に盤面を供給するオブジェクト"""
+
+    def update(self, now: float) -> None:
+        """毎フレーム呼ばれ, 必要であれば盤面を更新する
+
+        Args:
+            now(float): `time.monotonic` による現在時刻"""
+
+
+class ReplayFeed:
+    """履歴を一定の速さで再生してボードに供給するクラス
+
+    最後のシーンを一定時間表示したあと, 最初から再生し直す."""
+
+    def __init__(
+            self,
+            board: WallBoard,
+            timeline: ReplayTimeline,
+            seconds_per_move: float = WALL_SECONDS_PER_MOVE,
+    ):
+        self.board: WallBoard = board
+        self.timeline: ReplayTimeline = timeline
+        self.seconds_per_move: float = seconds_per_move
+        self.__start_time: float = time.monotonic()
+        self.__turn_index: int | None = None
+
+    def update(self, now: float):
+        loop_length = len(self.timeline) * self.seconds_per_move + WALL_SECONDS_TO_HOLD_LAST_SCENE
+        elapsed = (now - self.__start_time) % loop_length
+        turn_index = min(int(elapsed / self.seconds_per_move), len(self.timeline) - 1)
+        if turn_index != self.__turn_index:
+            self.__turn_index = turn_index
+            self.board.show(self.timeline.colors_at(turn_index))
+
+
+class RenderScheduler:
+    """ウォール上の全てのボードの更新と描画を1つの `after` ループで行うクラス
+
+    毎フレーム全てのフィードを更新したあと, 描画が予約されたボードだけを描画する."""
+
+    def __init__(self, master: Misc, fps: int = WALL_FPS):
+        self.master = master
+        self.interval_ms: int = 1000 // fps
+        self.feeds: list[BoardFeed] = []
+        self.__dirty_boards: dict[int, WallBoard] = {}
+        self.__after_id: str | None = None
+
+    def request_render(self, board: WallBoard):
+        """次のフレームでボードを描画するよう予約するメソッド"""
+        self.__dirty_boards[id(board)] = board
+
+    def start(self):
+        """フレームのループを開始するメソッド"""
+        if self.__after_id is None:
+            self.__frame()
+
+    def stop(self):
+        """フレームのループを停止するメソッド"""
+        if self.__after_id is not None:
+            self.master.after_cancel(self.__after_id)
+            self.__after_id = None
+
+    def __frame(self):
+        now = time.monotonic()
+        for feed in self.feeds:
+            feed.update(now)
+        dirty_boards = self.__dirty_boards
+        self.__dirty_boards = {}
+        for board in dirty_boards.values():
+            board.render()
+        self.__after_id = self.master.after(self.interval_ms, self.__frame)
+
+
+class SpectatorWallDisplay(Frame):
+    """複数のゲームを同時に観戦する画面
+
+    盤面を格子状に並べ, それぞれのボードで履歴を再生する.
+    全てのボードは石の画像とボード画像と描画ループを共有する.
+
+    Attributes:
+        display_size(Coordinate): 画面に表示される大きさ
+        canvas(Canvas): 全てのボードを描画するキャンバス
+        sprites(SpriteCache): 全てのボードで共有する画像キャッシュ
+        scheduler(RenderScheduler): 全てのボードで共有する描画ループ
+        boards(list[WallBoard]): 表示しているボード"""
+
+    def __init__(self, master: Misc):
+        master.update_idletasks()
+        self.display_size: Coordinate = Coordinate(master.winfo_width(), master.winfo_height())
+        super().__init__(
+            master,
+            width=self.display_size.x,
+            height=self.display_size.y,
+            name=Display.SPECTATOR_WALL,
+        )
+        self.sprites: SpriteCache = SpriteCache()
+        self.scheduler: RenderScheduler = RenderScheduler(self)
+        self.boards: list[WallBoard] = []
+        self.__layouts: dict[int, WallBoardLayout] = {}
+        self.__histories: list[History] = []
+
+        self.home_button = SceneTransitionButton(
+            self,
+            WALL_HOME_BUTTON_TEXT,
+            Display.HOME,
+            self.reset,
+        )
+        self.home_button.pack(side=tkinter.TOP, fill=tkinter.X)
+        self.update_idletasks()
+        self.canvas = Canvas(
+            self,
+            width=self.display_size.x,
+            height=self.display_size.y - self.home_button.winfo_reqheight(),
+            highlightthickness=0,
+        )
+        self.canvas.pack(side=tkinter.TOP)
+
+    def set_games(self, histories: list[History]):
+        """表示するゲームを設定し, 全てのボードで再生を開始するメソッド
+
+        Args:
+            histories(list[History]): 再生する履歴"""
+        self.reset()
+        self.__histories = list(histories)
+        self.__arrange()
+
+    def reset(self):
+        """全てのボードを取り除くメソッド"""
+        self.scheduler.stop()
+        self.scheduler.feeds.clear()
+        for board in self.boards:
+            board.destroy()
+        self.boards.clear()
+        self.__histories = []
+
+    def __get_layout(self, board_length: int) -> WallBoardLayout:
+        if board_length not in self.__layouts:
+            self.__layouts.clear()
+            self.sprites.clear()
+            self.__layouts[board_length] = WallBoardLayout(board_length)
+        return self.__layouts[board_length]
+
+    def __arrange(self):
+        """全てのボードを画面の大きさに合わせて並べ直すメソッド"""
+        self.scheduler.stop()
+        self.scheduler.feeds.clear()
+        for board in self.boards:
+            board.destroy()
+        self.boards.clear()
+        if len(self.__histories) == 0:
+            return
+
+        canvas_width, canvas_height = self.canvas.winfo_reqwidth(), self.canvas.winfo_reqheight()
+        columns = math.ceil(math.sqrt(len(self.__histories) * canvas_width / canvas_height))
+        rows = math.ceil(len(self.__histories) / columns)
+        cell_width, cell_height = canvas_width // columns, canvas_height // rows
+        board_length = min(cell_width, cell_height - WALL_TITLE_HEIGHT) - WALL_BOARD_PADDING * 2
+        layout = self.__get_layout(board_length)
+
+        for i, history in enumerate(self.__histories):
+            origin = (
+                (i % columns) * cell_width + (cell_width - board_length) // 2,
+                (i // columns) * cell_height + WALL_BOARD_PADDING,
+            )
+            board = WallBoard(self.canvas, origin, layout, self.sprites, self.scheduler, history.title)
+            feed = ReplayFeed(board, ReplayTimeline(history))
+            self.boards.append(board)
+            self.scheduler.feeds.append(feed)
+        self.scheduler.start()
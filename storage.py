@@ -0,0 +1,1009 @@
+# 履歴の保存先
+# 履歴を保存するデータベースを `HistoryStorage` として抽象化し, MySQL と SQLite の実装を提供する.
+# どの実装を使うかは database_info.yaml の `storage_backend` で選ぶ. SQLite ならサーバーなしで手元のファイルに保存できる.
+# 履歴は tkinter のオブジェクトを含まない `HistoryRecord` で受け渡すので, 別スレッドやツールからも使用できる.
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterator, TypeVar
+import json
+import re
+import sqlite3
+import threading
+import time
+from uuid import UUID
+
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+from systems import CONFIG, load_database_info
+from movelist import encode_moves, decode_moves, last_position, SceneRecord
+from connection_pool import ConnectionPool, DEFAULT_POOL_SIZE
+
+
+INDEX_LIST_TABLE_NAME = "index_list"
+SCENE_LIST_TABLE_NAME = "scene_list"
+MOVE_LIST_TABLE_NAME = "move_list"
+SCHEMA_VERSION_TABLE_NAME = "schema_version"
+LEGACY_SCENE_LIST_TABLE_NAME = "scene_list_v1"     # 移行の途中で, 古いscene_listテーブルを置いておく名前
+LEGACY_SCHEMA_VERSION = 1     # schema_versionテーブルを作る前のスキーマ. シーンの順序を行のidで表していた
+SCHEMA_VERSION = 2            # シーンの番号(turn_no)と作成日時・終局日時を持つスキーマ
+SCENES_FORMAT = "scenes"     # シーンごとに盤面をJSONで保存する形式
+MOVES_FORMAT = "moves"       # 1局を手の並びで保存する形式
+STORAGE_FORMAT = CONFIG.get("HISTORY_STORAGE_FORMAT", SCENES_FORMAT)
+SAVE_CHUNK_ROWS = 256     # 1回の INSERT 文で追加するシーンの行数の上限. 文が max_allowed_packet を超えないようにする
+QUERY_BATCH_SIZE = 100    # `query` で1回に読み込む履歴の数
+MIGRATION_BATCH_SIZE = 500     # スキーマの移行で, 1つの文で写す対局の数
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TITLE_DATE_FORMAT = "%Y-%m/%d"     # `History` のタイトルの日付の書式
+UNKNOWN_CREATED_AT = "1970-01-01 00:00:00"     # 移行で, タイトルから作成日が分からない対局に記録する作成日時
+
+MYSQL_BACKEND = "mysql"
+SQLITE_BACKEND = "sqlite"
+DEFAULT_SQLITE_PATH = "history.sqlite3"
+SQLITE_BUSY_TIMEOUT = 5.0     # ほかのスレッドが書き込み中のとき, 待つ時間の上限(秒)
+
+# データベースのライブラリが生じる例外. 書き込み直せば成功するかもしれない失敗を表す
+DATABASE_ERRORS: tuple[type[Exception], ...] = (sqlite3.Error,) + ((mysql.connector.Error,) if mysql is not None else ())
+
+T = TypeVar("T")
+
+type IndexRecord = tuple[bytes, str, bool]
+type IndexPageRecord = tuple[bytes, str, bool, str]
+
+
+class StorageUnavailableError(Exception):
+    """保存先を使用できないときに生じる例外"""
+
+    def __init__(self, backend: str, reason: object):
+        super().__init__(backend, reason)
+        self.backend = backend
+        self.reason = reason
+
+    def __str__(self):
+        return f"{self.backend} storage is unavailable: {self.reason}"
+
+
+@dataclass
+class HistoryRecord:
+    """保存する履歴の内容を, tkinterのオブジェクトを含まない形で保持するデータクラス
+
+    シーンは `DBController.get_scene_records` と同じく, 石の色を文字列で表した盤面とターンプレイヤーの色の文字列の組で表す.
+    保存済みの内容を表す属性の意味は `History` と同じ.
+
+    Attributes:
+        uuid(str): 履歴のid
+        title(str): 履歴のタイトル
+        is_finished(bool): 終局しているかどうか
+        scenes(list[tuple[list, str]]): シーンのリスト
+        storage_format(str | None): データベースでの保存形式. 未保存のときは `None`
+        saved_scene_count(int): データベースに保存されているシーンの数
+        clean_scene_count(int): 先頭から何シーンがデータベースの内容と一致しているか
+        saved_is_finished(bool | None): データベースに保存されている `is_finished`. 未保存のときは `None`"""
+    uuid: str
+    title: str
+    is_finished: bool
+    scenes: list[tuple[list, str]]
+    storage_format: str | None = None
+    saved_scene_count: int = 0
+    clean_scene_count: int = 0
+    saved_is_finished: bool | None = None
+
+    def mark_saved(self, storage_format: str):
+        """全てのシーンがデータベースの内容と一致していることを記録するメソッド"""
+        self.storage_format = storage_format
+        self.saved_scene_count = self.clean_scene_count = len(self.scenes)
+        self.saved_is_finished = self.is_finished
+
+
+@dataclass
+class SaveStats:
+    """履歴の保存にかかった時間を保持するデータクラス
+
+    Attributes:
+        rows(int): 追加したシーンの行数
+        statements(int): シーンの追加に使った INSERT 文の数
+        seconds(float): 保存にかかった秒数"""
+    rows: int
+    statements: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        """1秒あたりに保存した行数"""
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+@dataclass
+class HistoryOutline:
+    """履歴の一部のシーンだけを読み込んだ内容を保持するデータクラス
+
+    手の並びで保存された履歴は打ち直すだけで全てのシーンが求まるので, 全てのシーンを含む.
+    シーンごとに保存された履歴は, 最初と最後のシーンだけを含む.
+
+    Attributes:
+        uuid(str): 履歴のid
+        title(str): 履歴のタイトル
+        is_finished(bool): 終局しているかどうか
+        storage_format(str): データベースでの保存形式
+        scene_count(int): 履歴の全てのシーンの数
+        scenes(dict[int, SceneRecord]): 読み込んだシーン. キーはシーンの番号"""
+    uuid: str
+    title: str
+    is_finished: bool
+    storage_format: str
+    scene_count: int
+    scenes: dict[int, SceneRecord]
+
+
+class HistoryStorage(ABC):
+    """履歴の保存先のインターフェース
+
+    全てのメソッドは複数のスレッドから同時に呼び出してよい. 履歴は16バイトのuuidで指定する."""
+
+    @abstractmethod
+    def save(self, record: HistoryRecord) -> SaveStats:
+        """履歴を保存するメソッド
+
+        前回の保存からの差分だけを書き込み, 全体を1つのトランザクションで確定する.
+        保存できたときは `record` の保存済みの内容を表す属性を更新する.
+
+        Args:
+            record(HistoryRecord): 保存する履歴
+
+        Returns:
+            SaveStats: 保存にかかった時間"""
+
+    @abstractmethod
+    def load(self, uuid: bytes) -> HistoryRecord:
+        """履歴を読み込むメソッド
+
+        Args:
+            uuid(bytes): 読み込む履歴のid
+
+        Returns:
+            HistoryRecord: 読み込んだ履歴. 全てのシーンが保存済みとして記録されている
+
+        Raises:
+            KeyError: 履歴がないときに生じる
+            ValueError: 手の並びで保存された履歴を打ち直せないときに生じる"""
+
+    @abstractmethod
+    def load_outline(self, uuid: bytes) -> HistoryOutline:
+        """履歴のシーンの数と, 最初と最後のシーンだけを読み込むメソッド
+
+        長い対局でも, 全てのシーンを読み込んで変換するのを待たずに盤面を表示できる.
+        残りのシーンは `load_scene_range` で読み込む.
+
+        Args:
+            uuid(bytes): 読み込む履歴のid
+
+        Returns:
+            HistoryOutline: 読み込んだ内容
+
+        Raises:
+            KeyError: 履歴がないときに生じる"""
+
+    @abstractmethod
+    def load_scene_range(self, uuid: bytes, start: int, stop: int) -> list[SceneRecord]:
+        """履歴の `start` 番目から `stop` 番目の前までのシーンを読み込むメソッド
+
+        Args:
+            uuid(bytes): 読み込む履歴のid
+            start(int): 最初のシーンの番号
+            stop(int): 最後のシーンの次の番号
+
+        Returns:
+            list[SceneRecord]: シーンのリスト. 履歴の範囲を超えた分は含まない"""
+
+    @abstractmethod
+    def delete(self, uuid: bytes) -> None:
+        """履歴を削除するメソッド"""
+
+    @abstractmethod
+    def list_indexes(self) -> list[IndexRecord]:
+        """全ての履歴の uuid, title, is_finished を, 作成日時の順に返すメソッド"""
+
+    @abstractmethod
+    def list_index_page(
+            self,
+            limit: int,
+            before: tuple[str, bytes] | None = None,
+            is_finished: bool | None = None,
+            created_since: datetime | None = None,
+            created_until: datetime | None = None,
+            after: tuple[str, bytes] | None = None,
+    ) -> list[IndexPageRecord]:
+        """条件に合う履歴の一覧を, 新しいものから1ページ分返すメソッド
+
+        前のページの最後の履歴の作成日時とidを `before` に渡すと, その続きを返す(キーセットページネーション).
+        次のページの最初の履歴の作成日時とidを `after` に渡すと, その直前の1ページを返す.
+        何ページ目でも, 索引を読み込む量はページの大きさと変わらない.
+
+        Args:
+            limit(int): 1ページの履歴の数
+            before(tuple[str, bytes] | None, optional): 前のページの最後の履歴の作成日時とid. `None` のときは最初のページを返す. default to None.
+            is_finished(bool | None, optional): 終局しているかどうかで絞り込む. `None` のときは絞り込まない. default to None.
+            created_since(datetime | None, optional): この日時以降に作成された履歴に絞り込む. default to None.
+            created_until(datetime | None, optional): この日時より前に作成された履歴に絞り込む. default to None.
+            after(tuple[str, bytes] | None, optional): 次のページの最初の履歴の作成日時とid. `before` と同時には指定しない. default to None.
+
+        Returns:
+            list[IndexPageRecord]: 履歴の uuid, title, is_finished, 作成日時の組のリスト"""
+
+    @abstractmethod
+    def query(
+            self,
+            is_finished: bool | None = None,
+            created_since: datetime | None = None,
+            created_until: datetime | None = None,
+    ) -> Iterator[tuple[bytes, list[SceneRecord]]]:
+        """条件に合う全ての履歴のシーンを, 作成日時の順にまとめて読み込みながら返すジェネレータ
+
+        Args:
+            is_finished(bool | None, optional): 終局しているかどうかで絞り込む. `None` のときは絞り込まない. default to None.
+            created_since(datetime | None, optional): この日時以降に作成された履歴に絞り込む. default to None.
+            created_until(datetime | None, optional): この日時より前に作成された履歴に絞り込む. default to None.
+
+        Returns:
+            Iterator[tuple[bytes, list[SceneRecord]]]: 履歴のidとシーンのリストの組"""
+
+    def close(self) -> None:
+        """接続を閉じるメソッド"""
+
+
+class SQLHistoryStorage(HistoryStorage):
+    """SQLのデータベースに保存する実装に共通の処理をまとめたクラス
+
+    3つのテーブル(index_list, scene_list, move_list)に保存する. SQL文のプレースホルダは `%s` で書き,
+    データベースごとの違いはサブクラスのメソッドで吸収する."""
+
+    backend: str = ""
+    datetime_type: str = "DATETIME"     # 日時の列の型
+
+    @abstractmethod
+    def run(self, operation: Callable[[Any], T], is_write: bool = False) -> T:
+        """カーソルを受け取る操作を実行するメソッド
+
+        `is_write` のときはトランザクションの中で実行し, 例外が生じなければ確定する."""
+
+    def sql(self, statement: str) -> str:
+        """SQL文をこのデータベースの書き方に直すメソッド"""
+        return statement
+
+    @abstractmethod
+    def create_tables(self, cursor):
+        """最新のスキーマのテーブルがなければ作成するメソッド. 索引は `create_indexes` で作成する"""
+
+    @abstractmethod
+    def table_names(self, cursor) -> set[str]:
+        """データベースにあるテーブルの名前を返すメソッド"""
+
+    @abstractmethod
+    def column_names(self, cursor, table_name: str) -> set[str]:
+        """テーブルの列の名前を返すメソッド"""
+
+    @abstractmethod
+    def index_names(self, cursor, table_name: str) -> set[str]:
+        """テーブルの索引の名前を返すメソッド"""
+
+    @abstractmethod
+    def upsert_index(
+            self, cursor, uuid: bytes, title: str, is_finished: bool, created_at: str, finished_at: str | None):
+        """index_listテーブルに行を追加し, すでにあるときはis_finishedとfinished_atを更新するメソッド"""
+
+    @abstractmethod
+    def upsert_moves(self, cursor, uuid: bytes, moves: bytes, final_black: int, final_white: int):
+        """move_listテーブルに行を追加し, すでにあるときは書き換えるメソッド"""
+
+    def to_position(self, value: int) -> int:
+        """データベースに保存した盤面の値を, 64bitの符号なし整数に直すメソッド"""
+        return value
+
+    def supports_window_functions(self, cursor) -> bool:
+        """`ROW_NUMBER() OVER` などのウィンドウ関数を使えるかどうかを返すメソッド"""
+        return True
+
+    def initialize_schema(self, cursor):
+        """テーブルを最新のスキーマにするメソッド
+
+        新しいデータベースには最新のスキーマでテーブルを作成し, 古いスキーマのデータベースは移行する.
+        スキーマの版は schema_versionテーブルに記録する. schema_versionテーブルがなく, index_listテーブルがあるときは,
+        版を記録する前のスキーマ(`LEGACY_SCHEMA_VERSION`)とみなす."""
+        table_names = self.table_names(cursor)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE_NAME}(
+                    version INTEGER NOT NULL
+            )
+        """)
+        cursor.execute(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE_NAME}")
+        version = cursor.fetchall()[0][0]
+        if version is None:
+            version = LEGACY_SCHEMA_VERSION if INDEX_LIST_TABLE_NAME in table_names else SCHEMA_VERSION
+        if version > SCHEMA_VERSION:
+            raise StorageUnavailableError(self.backend, f"schema version {version} is newer than {SCHEMA_VERSION}")
+
+        if version < 2:
+            self.migrate_to_turn_numbers(cursor, table_names)
+        self.create_tables(cursor)
+        self.create_indexes(cursor)
+
+        cursor.execute(f"DELETE FROM {SCHEMA_VERSION_TABLE_NAME}")
+        cursor.execute(self.sql(f"INSERT INTO {SCHEMA_VERSION_TABLE_NAME} (version) VALUES (%s)"), (SCHEMA_VERSION,))
+
+    def create_indexes(self, cursor):
+        """索引がなければ作成するメソッド. 対局の一覧を作成日時や終局日時の範囲で読み込むときに使う
+
+        作成日時の索引には uuid を加え, 作成日時と uuid の順に並べた一覧を索引だけで読み込めるようにする."""
+        index_names = self.index_names(cursor, INDEX_LIST_TABLE_NAME)
+        for column_name, columns in (("created_at", "created_at, uuid"), ("finished_at", "finished_at")):
+            index_name = f"{INDEX_LIST_TABLE_NAME}_{column_name}"
+            if index_name not in index_names:
+                cursor.execute(f"CREATE INDEX {index_name} ON {INDEX_LIST_TABLE_NAME}({columns})")
+
+    def migrate_to_turn_numbers(self, cursor, table_names: set[str]):
+        """版2のスキーマへ移行するメソッド
+
+        index_listテーブルに created_at と finished_at を加え, 作成日をタイトルの日付から埋める.
+        scene_listテーブルは (history_id, turn_no) を主キーとするテーブルに作り直し, シーンの番号を行のidの順に振る.
+        MySQLのDDLはトランザクションで囲めないので, どの段階で中断しても, 次の起動でやり直せる順に行う."""
+        # index_listテーブルに列を加え, 既存の対局の作成日時と終局日時を埋める
+        column_names = self.column_names(cursor, INDEX_LIST_TABLE_NAME)
+        for column_name in ("created_at", "finished_at"):
+            if column_name not in column_names:
+                cursor.execute(f"ALTER TABLE {INDEX_LIST_TABLE_NAME} ADD COLUMN {column_name} {self.datetime_type} NULL")
+        cursor.execute(f"SELECT uuid, title, is_finished FROM {INDEX_LIST_TABLE_NAME} WHERE created_at IS NULL")
+        rows = []
+        for uuid, title, is_finished in cursor.fetchall():
+            created_at = _parse_title_date(title) or UNKNOWN_CREATED_AT
+            rows.append((created_at, created_at if is_finished else None, uuid))
+        for offset in range(0, len(rows), SAVE_CHUNK_ROWS):
+            cursor.executemany(self.sql(f"""
+                UPDATE {INDEX_LIST_TABLE_NAME} SET created_at = %s, finished_at = %s WHERE uuid = %s
+            """), rows[offset:offset + SAVE_CHUNK_ROWS])
+
+        # 古いscene_listテーブルの名前を変えてから, 新しいテーブルに写す.
+        # 名前を変えたあとで中断したときは, 写し終えていない新しいテーブルを作り直す
+        if LEGACY_SCENE_LIST_TABLE_NAME in table_names:
+            cursor.execute(f"DROP TABLE IF EXISTS {SCENE_LIST_TABLE_NAME}")
+        elif SCENE_LIST_TABLE_NAME in table_names:
+            cursor.execute(f"ALTER TABLE {SCENE_LIST_TABLE_NAME} RENAME TO {LEGACY_SCENE_LIST_TABLE_NAME}")
+        else:
+            return
+        self.create_tables(cursor)
+
+        # シーンの番号は, 1局ずつ行のidの順に0から振る. 大きな表でも1つの文が長くならないよう, 対局をまとめて写す
+        # ウィンドウ関数を使えないデータベース(MySQL 8.0 より前など)では, 読み込んだ行に番号を振ってから写す
+        uses_window_functions = self.supports_window_functions(cursor)
+        cursor.execute(f"SELECT DISTINCT history_id FROM {LEGACY_SCENE_LIST_TABLE_NAME}")
+        history_ids = [row[0] for row in cursor.fetchall()]
+        for offset in range(0, len(history_ids), MIGRATION_BATCH_SIZE):
+            batch = history_ids[offset:offset + MIGRATION_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            if uses_window_functions:
+                cursor.execute(self.sql(f"""
+                    INSERT INTO {SCENE_LIST_TABLE_NAME} (history_id, turn_no, board_status, turn_player)
+                    SELECT history_id, ROW_NUMBER() OVER (PARTITION BY history_id ORDER BY id) - 1, board_status, turn_player
+                    FROM {LEGACY_SCENE_LIST_TABLE_NAME} WHERE history_id IN ({placeholders})
+                """), batch)
+                continue
+            cursor.execute(self.sql(f"""
+                SELECT history_id, board_status, turn_player FROM {LEGACY_SCENE_LIST_TABLE_NAME}
+                WHERE history_id IN ({placeholders}) ORDER BY history_id, id
+            """), batch)
+            rows = []
+            previous_id, turn_no = None, 0
+            for history_id, board_status, turn_player in cursor.fetchall():
+                turn_no = turn_no + 1 if history_id == previous_id else 0
+                previous_id = history_id
+                rows.append((history_id, turn_no, board_status, turn_player))
+            for row_offset in range(0, len(rows), SAVE_CHUNK_ROWS):
+                cursor.executemany(self.sql(f"""
+                    INSERT INTO {SCENE_LIST_TABLE_NAME} (history_id, turn_no, board_status, turn_player)
+                    VALUES (%s, %s, %s, %s)
+                """), rows[row_offset:row_offset + SAVE_CHUNK_ROWS])
+        cursor.execute(f"DROP TABLE {LEGACY_SCENE_LIST_TABLE_NAME}")
+
+    def save(self, record: HistoryRecord) -> SaveStats:
+        start = time.perf_counter()
+        uuid_bytes = UUID(record.uuid).bytes
+
+        new_scene_count = len(record.scenes) - record.clean_scene_count
+        stale_scene_count = record.saved_scene_count - record.clean_scene_count
+        is_index_changed = record.saved_is_finished != record.is_finished
+        if new_scene_count == 0 and stale_scene_count == 0 and not is_index_changed:
+            return SaveStats(0, 0, time.perf_counter() - start)
+
+        # データベースとやりとりする前に, 保存する内容を作成しておく.
+        # 初期配置から合法手でつながっていない履歴は, 手の並びではなく盤面ごとに保存する
+        storage_format = record.storage_format or STORAGE_FORMAT
+        if storage_format == MOVES_FORMAT:
+            try:
+                moves = encode_moves(record.scenes)
+            except ValueError:
+                if record.storage_format is not None:
+                    raise
+                storage_format = SCENES_FORMAT
+            else:
+                final_black, final_white = last_position(record.scenes)
+        if storage_format == SCENES_FORMAT:
+            rows = [
+                (uuid_bytes, turn_no, json.dumps(board_list), turn_player)
+                for turn_no, (board_list, turn_player) in enumerate(
+                    record.scenes[record.clean_scene_count:], record.clean_scene_count)
+            ]
+        now = _format_datetime(datetime.now())
+
+        def operation(cursor) -> int:
+            statements = 0
+            # index_listテーブルにデータを追加. 保存済みのときはis_finishedと終局日時だけを更新する
+            if is_index_changed:
+                self.upsert_index(
+                    cursor, uuid_bytes, record.title, record.is_finished, now, now if record.is_finished else None)
+
+            if storage_format == MOVES_FORMAT:
+                # move_listテーブルの手の並びを書き換える. 待ったで取り除かれた手も, この書き換えで消える
+                self.upsert_moves(cursor, uuid_bytes, moves, final_black, final_white)
+                return statements + 1
+
+            # 待ったで取り除かれたシーンや, 前回の保存で確定したか分からないシーンを, 主キーの範囲で削除
+            cursor.execute(self.sql(f"""
+                DELETE FROM {SCENE_LIST_TABLE_NAME} WHERE history_id = %s AND turn_no >= %s
+            """), (uuid_bytes, record.clean_scene_count))
+
+            # scene_listテーブルにデータを追加
+            for offset in range(0, len(rows), SAVE_CHUNK_ROWS):
+                cursor.executemany(self.sql(f"""
+                    INSERT INTO {SCENE_LIST_TABLE_NAME} (history_id, turn_no, board_status, turn_player)
+                    VALUES (%s, %s, %s, %s)
+                """), rows[offset:offset + SAVE_CHUNK_ROWS])
+                statements += 1
+            return statements
+
+        statements = self.run(operation, is_write=True)
+        record.mark_saved(storage_format)
+        return SaveStats(new_scene_count, statements, time.perf_counter() - start)
+
+    def __decode(self, move_row: tuple | None, scene_rows: list[tuple]) -> tuple[str, list[SceneRecord]]:
+        """読み込んだ行をシーンのリストに変換するメソッド. 手の並びの行があるときはそれを使う"""
+        if move_row is not None:
+            moves, final_black, final_white = move_row
+            final_position = (self.to_position(final_black), self.to_position(final_white))
+            return MOVES_FORMAT, decode_moves(bytes(moves), final_position)
+        return SCENES_FORMAT, [(json.loads(board_json), turn_player) for board_json, turn_player in scene_rows]
+
+    def load(self, uuid: bytes) -> HistoryRecord:
+        def operation(cursor) -> tuple[list[tuple], list[tuple], list[tuple]]:
+            cursor.execute(self.sql(f"""
+                SELECT title, is_finished FROM {INDEX_LIST_TABLE_NAME} WHERE uuid = %s
+            """), (uuid,))
+            index_rows = cursor.fetchall()
+            cursor.execute(self.sql(f"""
+                SELECT moves, final_black, final_white FROM {MOVE_LIST_TABLE_NAME} WHERE history_id = %s
+            """), (uuid,))
+            move_rows = cursor.fetchall()
+            if move_rows:
+                return index_rows, move_rows, []
+            cursor.execute(self.sql(f"""
+                SELECT board_status, turn_player FROM {SCENE_LIST_TABLE_NAME} WHERE history_id = %s ORDER BY turn_no
+            """), (uuid,))
+            return index_rows, move_rows, cursor.fetchall()
+
+        index_rows, move_rows, scene_rows = self.run(operation)
+        if not index_rows:
+            raise KeyError(uuid)
+        title, is_finished = index_rows[0]
+        storage_format, scenes = self.__decode(move_rows[0] if move_rows else None, scene_rows)
+        record = HistoryRecord(str(UUID(bytes=bytes(uuid))), title, bool(is_finished), scenes)
+        record.mark_saved(storage_format)
+        return record
+
+    def load_outline(self, uuid: bytes) -> HistoryOutline:
+        def operation(cursor) -> tuple[list[tuple], list[tuple], list[tuple]]:
+            cursor.execute(self.sql(f"""
+                SELECT title, is_finished FROM {INDEX_LIST_TABLE_NAME} WHERE uuid = %s
+            """), (uuid,))
+            index_rows = cursor.fetchall()
+            cursor.execute(self.sql(f"""
+                SELECT moves, final_black, final_white FROM {MOVE_LIST_TABLE_NAME} WHERE history_id = %s
+            """), (uuid,))
+            move_rows = cursor.fetchall()
+            if move_rows:
+                return index_rows, move_rows, []
+
+            # 最初と最後のシーンを, それぞれ主キーの範囲の端から1行だけ読み込む
+            scene_rows = []
+            for order in ("ASC", "DESC"):
+                cursor.execute(self.sql(f"""
+                    SELECT turn_no, board_status, turn_player FROM {SCENE_LIST_TABLE_NAME}
+                    WHERE history_id = %s ORDER BY turn_no {order} LIMIT 1
+                """), (uuid,))
+                scene_rows.extend(cursor.fetchall())
+            return index_rows, move_rows, scene_rows
+
+        index_rows, move_rows, scene_rows = self.run(operation)
+        if not index_rows:
+            raise KeyError(uuid)
+        title, is_finished = index_rows[0]
+        if move_rows:
+            storage_format, scene_list = self.__decode(move_rows[0], [])
+            scenes = dict(enumerate(scene_list))
+        else:
+            storage_format = SCENES_FORMAT
+            scenes = {
+                turn_no: (json.loads(board_json), turn_player) for turn_no, board_json, turn_player in scene_rows
+            }
+        # シーンの番号は0から欠けずに振られているので, 最後のシーンの番号からシーンの数が分かる
+        scene_count = max(scenes) + 1 if scenes else 0
+        return HistoryOutline(
+            str(UUID(bytes=bytes(uuid))), title, bool(is_finished), storage_format, scene_count, scenes)
+
+    def load_scene_range(self, uuid: bytes, start: int, stop: int) -> list[SceneRecord]:
+        def operation(cursor) -> tuple[list[tuple], list[tuple]]:
+            cursor.execute(self.sql(f"""
+                SELECT moves, final_black, final_white FROM {MOVE_LIST_TABLE_NAME} WHERE history_id = %s
+            """), (uuid,))
+            move_rows = cursor.fetchall()
+            if move_rows:
+                return move_rows, []
+            cursor.execute(self.sql(f"""
+                SELECT board_status, turn_player FROM {SCENE_LIST_TABLE_NAME}
+                WHERE history_id = %s AND turn_no >= %s AND turn_no < %s ORDER BY turn_no
+            """), (uuid, start, stop))
+            return move_rows, cursor.fetchall()
+
+        move_rows, scene_rows = self.run(operation)
+        if move_rows:
+            return self.__decode(move_rows[0], [])[1][start:stop]
+        return self.__decode(None, scene_rows)[1]
+
+    def delete(self, uuid: bytes) -> None:
+        def operation(cursor):
+            for table_name, column_name in (
+                (SCENE_LIST_TABLE_NAME, "history_id"),
+                (MOVE_LIST_TABLE_NAME, "history_id"),
+                (INDEX_LIST_TABLE_NAME, "uuid"),
+            ):
+                cursor.execute(self.sql(f"""
+                    DELETE FROM {table_name} WHERE {column_name} = %s
+                """), (uuid,))
+
+        self.run(operation, is_write=True)
+
+    def list_indexes(self) -> list[IndexRecord]:
+        def operation(cursor) -> list[tuple]:
+            cursor.execute(self.sql(f"""
+                SELECT uuid, title, is_finished FROM {INDEX_LIST_TABLE_NAME} ORDER BY created_at, uuid
+            """))
+            return cursor.fetchall()
+
+        return [(bytes(uuid), title, bool(is_finished)) for uuid, title, is_finished in self.run(operation)]
+
+    def list_index_page(
+            self,
+            limit: int,
+            before: tuple[str, bytes] | None = None,
+            is_finished: bool | None = None,
+            created_since: datetime | None = None,
+            created_until: datetime | None = None,
+            after: tuple[str, bytes] | None = None,
+    ) -> list[IndexPageRecord]:
+        conditions, parameters = _index_conditions(is_finished, created_since, created_until)
+        order = "DESC"
+        if before is not None:
+            # (created_at, uuid) の索引を, 前のページの最後の行の続きから逆順に読む.
+            # created_at の上限を単独の条件にして, どちらのデータベースでも索引の範囲の読み込みにする
+            created_at, uuid = before
+            conditions.append("created_at <= %s AND (created_at < %s OR uuid < %s)")
+            parameters.extend((created_at, created_at, uuid))
+        elif after is not None:
+            # 次のページの最初の行の直前から, 索引を正順に読む
+            created_at, uuid = after
+            conditions.append("created_at >= %s AND (created_at > %s OR uuid > %s)")
+            parameters.extend((created_at, created_at, uuid))
+            order = "ASC"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        def operation(cursor) -> list[tuple]:
+            cursor.execute(self.sql(f"""
+                SELECT uuid, title, is_finished, created_at FROM {INDEX_LIST_TABLE_NAME} {where}
+                ORDER BY created_at {order}, uuid {order} LIMIT %s
+            """), parameters + [limit])
+            return cursor.fetchall()
+
+        page = [
+            (bytes(uuid), title, bool(is_finished), _to_datetime_str(created_at))
+            for uuid, title, is_finished, created_at in self.run(operation)
+        ]
+        if order == "ASC":
+            page.reverse()
+        return page
+
+    def query(
+            self,
+            is_finished: bool | None = None,
+            created_since: datetime | None = None,
+            created_until: datetime | None = None,
+    ) -> Iterator[tuple[bytes, list[SceneRecord]]]:
+        conditions, parameters = _index_conditions(is_finished, created_since, created_until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        def select_uuids(cursor) -> list[tuple]:
+            cursor.execute(self.sql(f"""
+                SELECT uuid FROM {INDEX_LIST_TABLE_NAME} {where} ORDER BY created_at, uuid
+            """), parameters)
+            return cursor.fetchall()
+
+        uuids = [bytes(row[0]) for row in self.run(select_uuids)]
+        for offset in range(0, len(uuids), QUERY_BATCH_SIZE):
+            batch = uuids[offset:offset + QUERY_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+
+            def operation(cursor) -> tuple[list[tuple], list[tuple]]:
+                cursor.execute(self.sql(f"""
+                    SELECT history_id, moves, final_black, final_white FROM {MOVE_LIST_TABLE_NAME}
+                    WHERE history_id IN ({placeholders})
+                """), batch)
+                move_rows = cursor.fetchall()
+                cursor.execute(self.sql(f"""
+                    SELECT history_id, board_status, turn_player FROM {SCENE_LIST_TABLE_NAME}
+                    WHERE history_id IN ({placeholders}) ORDER BY history_id, turn_no
+                """), batch)
+                return move_rows, cursor.fetchall()
+
+            move_rows, scene_rows = self.run(operation)
+            moves_by_uuid = {bytes(row[0]): row[1:] for row in move_rows}
+            scenes_by_uuid: dict[bytes, list[tuple]] = {}
+            for history_id, board_json, turn_player in scene_rows:
+                scenes_by_uuid.setdefault(bytes(history_id), []).append((board_json, turn_player))
+            for uuid in batch:
+                yield uuid, self.__decode(moves_by_uuid.get(uuid), scenes_by_uuid.get(uuid, []))[1]
+
+
+def _format_datetime(value: datetime) -> str:
+    """日時を, どちらのデータベースでも文字列の順序と時刻の順序が一致する書式に変換する関数"""
+    return value.strftime(DATETIME_FORMAT)
+
+
+def _to_datetime_str(value: datetime | str | None) -> str:
+    """データベースから読み込んだ日時を `DATETIME_FORMAT` の文字列に揃える関数. MySQLは datetime で返す"""
+    if value is None:
+        return UNKNOWN_CREATED_AT
+    return _format_datetime(value) if isinstance(value, datetime) else value
+
+
+def _index_conditions(
+        is_finished: bool | None,
+        created_since: datetime | None,
+        created_until: datetime | None,
+) -> tuple[list[str], list]:
+    """index_listテーブルを絞り込む条件とその値を作成する関数. 作成日時の範囲は created_at の索引で絞り込む"""
+    conditions, parameters = [], []
+    if is_finished is not None:
+        conditions.append("is_finished = %s")
+        parameters.append(is_finished)
+    if created_since is not None:
+        conditions.append("created_at >= %s")
+        parameters.append(_format_datetime(created_since))
+    if created_until is not None:
+        conditions.append("created_at < %s")
+        parameters.append(_format_datetime(created_until))
+    return conditions, parameters
+
+
+def _parse_title_date(title: str) -> str | None:
+    """履歴のタイトルの日付を, 作成日時の文字列に変換する関数. 日付でないタイトルのときは `None` を返す"""
+    try:
+        return _format_datetime(datetime.strptime(title.strip(), TITLE_DATE_FORMAT))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _to_str(value: str | bytes | bytearray) -> str:
+    """MySQLが文字列を bytearray で返したときに, 文字列に直す関数"""
+    return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+
+def _parse_version(version: str) -> tuple[int, ...]:
+    """"8.0.36-log" のようなサーバーのバージョンの文字列から, 先頭の数字の並びを取り出す関数"""
+    numbers = re.match(r"\d+(?:\.\d+)*", version)
+    return tuple(int(number) for number in numbers.group().split(".")) if numbers else ()
+
+
+def _is_disconnect(error: Exception) -> bool:
+    """例外がMySQLとの接続の切断(や接続の失敗)によるものかを判定する関数"""
+    return isinstance(error, (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError))
+
+
+class MySQLStorage(SQLHistoryStorage):
+    """MySQLのサーバーに保存する実装
+
+    接続はプールから操作ごとに借り, カーソルも操作ごとに作成する. 操作の途中で接続が切れたときは, 新しい接続で1度だけやり直す."""
+
+    backend = MYSQL_BACKEND
+
+    def __init__(self, database_info: dict):
+        """
+        Args:
+            database_info(dict): database_info.yaml の内容"""
+        if mysql is None:
+            raise StorageUnavailableError(self.backend, "mysql-connector-python is not installed")
+        self.pool = ConnectionPool(
+            lambda: self.connect(database_info),
+            _is_disconnect,
+            database_info.get("sql_pool_size", DEFAULT_POOL_SIZE),
+        )
+        self.run(self.initialize_schema, is_write=True)
+
+    @staticmethod
+    def connect(database_info: dict):
+        """データベースに接続するメソッド
+
+        プールに戻した接続が古いスナップショットを持ち続けないよう, 自動コミットを有効にする.
+        書き込む操作は `start_transaction` でトランザクションを始める."""
+        return mysql.connector.connect(
+            host = database_info["sql_host"],
+            user = database_info["sql_user"],
+            password = database_info["sql_password"],
+            database = database_info["sql_database"],
+            autocommit = True,
+        )
+
+    def run(self, operation: Callable[[Any], T], is_write: bool = False) -> T:
+        def run_with_cursor(conn) -> T:
+            if is_write:
+                conn.start_transaction()
+            with conn.cursor() as cursor:
+                result = operation(cursor)
+            if is_write:
+                # データベースの変更を確定
+                conn.commit()
+            return result
+
+        return self.pool.run(run_with_cursor)
+
+    def create_tables(self, cursor):
+        # 履歴の一覧を保存するテーブル
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {INDEX_LIST_TABLE_NAME}(
+                    uuid BINARY(16) PRIMARY KEY,
+                    title CHAR(10),
+                    is_finished BOOLEAN,
+                    created_at DATETIME NULL,
+                    finished_at DATETIME NULL
+            )
+        """)
+
+        # ターンごとの盤面状態を保存するテーブル(index_listテーブルと関連付け).
+        # InnoDBは主キーの順に行を並べるので, 1局のシーンは主キーの範囲の読み込みで番号の順に取り出せる
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCENE_LIST_TABLE_NAME}(
+                    history_id BINARY(16),
+                    turn_no SMALLINT UNSIGNED,
+                    board_status JSON,
+                    turn_player CHAR(5),
+                    PRIMARY KEY (history_id, turn_no),
+                    FOREIGN KEY (history_id) REFERENCES {INDEX_LIST_TABLE_NAME}(uuid)
+            )
+        """)
+
+        # 1局を手の並び(1手1バイト)で保存するテーブル. 最後の盤面は復元時の照合に使う
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {MOVE_LIST_TABLE_NAME}(
+                    history_id BINARY(16) PRIMARY KEY,
+                    moves VARBINARY(255),
+                    final_black BIGINT UNSIGNED,
+                    final_white BIGINT UNSIGNED,
+                    FOREIGN KEY (history_id) REFERENCES {INDEX_LIST_TABLE_NAME}(uuid)
+            )
+        """)
+
+    def table_names(self, cursor) -> set[str]:
+        cursor.execute("SHOW TABLES")
+        return {_to_str(row[0]) for row in cursor.fetchall()}
+
+    def column_names(self, cursor, table_name: str) -> set[str]:
+        cursor.execute(f"SHOW COLUMNS FROM {table_name}")
+        return {_to_str(row[0]) for row in cursor.fetchall()}
+
+    def index_names(self, cursor, table_name: str) -> set[str]:
+        cursor.execute(f"SHOW INDEX FROM {table_name}")
+        return {_to_str(row[2]) for row in cursor.fetchall()}
+
+    def upsert_index(
+            self, cursor, uuid: bytes, title: str, is_finished: bool, created_at: str, finished_at: str | None):
+        cursor.execute(f"""
+            INSERT INTO {INDEX_LIST_TABLE_NAME} (uuid, title, is_finished, created_at, finished_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE is_finished = VALUES(is_finished), finished_at = VALUES(finished_at)
+        """, (uuid, title, is_finished, created_at, finished_at))
+
+    def supports_window_functions(self, cursor) -> bool:
+        # ウィンドウ関数は MySQL 8.0 と MariaDB 10.2 から使える
+        cursor.execute("SELECT VERSION()")
+        version = _to_str(cursor.fetchone()[0])
+        return _parse_version(version) >= ((10, 2) if "mariadb" in version.lower() else (8, 0))
+
+    def upsert_moves(self, cursor, uuid: bytes, moves: bytes, final_black: int, final_white: int):
+        cursor.execute(f"""
+            INSERT INTO {MOVE_LIST_TABLE_NAME} (history_id, moves, final_black, final_white)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                moves = VALUES(moves), final_black = VALUES(final_black), final_white = VALUES(final_white)
+        """, (uuid, moves, final_black, final_white))
+
+    def close(self):
+        self.pool.close()
+
+
+class SQLiteStorage(SQLHistoryStorage):
+    """SQLiteのファイルに保存する実装
+
+    サーバーを用意しなくても履歴を保存できる. WALモードで開くので, 書き込み中も別のスレッドから読み込める.
+    接続はスレッドごとに1つ作成して使い回し, 書き込みは `BEGIN IMMEDIATE` で始めて1つのトランザクションで確定する."""
+
+    backend = SQLITE_BACKEND
+    datetime_type = "TEXT"
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        """
+        Args:
+            path(str, optional): データベースのファイルのパス. default to DEFAULT_SQLITE_PATH."""
+        self.path: str = path
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__connections: list[sqlite3.Connection] = []
+        self.run(self.initialize_schema, is_write=True)
+
+    def __connection(self) -> sqlite3.Connection:
+        """このスレッドの接続を返すメソッド. まだなければ作成する"""
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            # トランザクションは自分で始めるので, sqlite3 による暗黙のトランザクションを無効にする
+            connection = sqlite3.connect(
+                self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            # WALモードではコミットごとの fsync を省いても, 電源断で失うのは直前のコミットだけでファイルは壊れない
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            self.__local.connection = connection
+            with self.__lock:
+                self.__connections.append(connection)
+        return connection
+
+    def run(self, operation: Callable[[Any], T], is_write: bool = False) -> T:
+        connection = self.__connection()
+        cursor = connection.cursor()
+        try:
+            if not is_write:
+                return operation(cursor)
+            # 読み込んでから書き込む途中で, ほかの書き込みに割り込まれないよう, 始めに書き込みのロックを取る
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(cursor)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return result
+        finally:
+            cursor.close()
+
+    def sql(self, statement: str) -> str:
+        return statement.replace("%s", "?")
+
+    def create_tables(self, cursor):
+        # 履歴の一覧を保存するテーブル
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {INDEX_LIST_TABLE_NAME}(
+                    uuid BLOB PRIMARY KEY,
+                    title TEXT,
+                    is_finished INTEGER,
+                    created_at TEXT NULL,
+                    finished_at TEXT NULL
+            )
+        """)
+
+        # ターンごとの盤面状態を保存するテーブル(index_listテーブルと関連付け).
+        # WITHOUT ROWID で主キーの順に行を並べ, 1局のシーンを主キーの範囲の読み込みで番号の順に取り出す
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCENE_LIST_TABLE_NAME}(
+                    history_id BLOB REFERENCES {INDEX_LIST_TABLE_NAME}(uuid),
+                    turn_no INTEGER,
+                    board_status TEXT,
+                    turn_player TEXT,
+                    PRIMARY KEY (history_id, turn_no)
+            ) WITHOUT ROWID
+        """)
+
+        # 1局を手の並び(1手1バイト)で保存するテーブル. 最後の盤面は復元時の照合に使う
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {MOVE_LIST_TABLE_NAME}(
+                    history_id BLOB PRIMARY KEY REFERENCES {INDEX_LIST_TABLE_NAME}(uuid),
+                    moves BLOB,
+                    final_black INTEGER,
+                    final_white INTEGER
+            )
+        """)
+
+    def table_names(self, cursor) -> set[str]:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return {row[0] for row in cursor.fetchall()}
+
+    def column_names(self, cursor, table_name: str) -> set[str]:
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        return {row[1] for row in cursor.fetchall()}
+
+    def index_names(self, cursor, table_name: str) -> set[str]:
+        cursor.execute(f"PRAGMA index_list({table_name})")
+        return {row[1] for row in cursor.fetchall()}
+
+    def upsert_index(
+            self, cursor, uuid: bytes, title: str, is_finished: bool, created_at: str, finished_at: str | None):
+        cursor.execute(f"""
+            INSERT INTO {INDEX_LIST_TABLE_NAME} (uuid, title, is_finished, created_at, finished_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (uuid) DO UPDATE SET is_finished = excluded.is_finished, finished_at = excluded.finished_at
+        """, (uuid, title, is_finished, created_at, finished_at))
+
+    def upsert_moves(self, cursor, uuid: bytes, moves: bytes, final_black: int, final_white: int):
+        # SQLiteの整数は64bitの符号付きなので, 盤面は符号付きに直して保存する
+        cursor.execute(f"""
+            INSERT INTO {MOVE_LIST_TABLE_NAME} (history_id, moves, final_black, final_white) VALUES (?, ?, ?, ?)
+            ON CONFLICT (history_id) DO UPDATE SET
+                moves = excluded.moves, final_black = excluded.final_black, final_white = excluded.final_white
+        """, (uuid, moves, _to_signed(final_black), _to_signed(final_white)))
+
+    def to_position(self, value: int) -> int:
+        return value & POSITION_MASK
+
+    def supports_window_functions(self, cursor) -> bool:
+        # ウィンドウ関数は SQLite 3.25.0 から使える
+        return sqlite3.sqlite_version_info >= (3, 25, 0)
+
+    def close(self):
+        with self.__lock:
+            connections, self.__connections = self.__connections, []
+        for connection in connections:
+            connection.close()
+        self.__local = threading.local()
+
+
+POSITION_MASK = (1 << 64) - 1
+
+
+def _to_signed(position: int) -> int:
+    """64bitの符号なし整数の盤面を, 同じビット列の符号付き整数に変換する関数"""
+    return position - (1 << 64) if position >> 63 else position
+
+
+def open_storage(database_info: dict | None = None) -> HistoryStorage:
+    """database_info.yaml の `storage_backend` に従って保存先を開く関数
+
+    `storage_backend` が "sqlite" のときは `sqlite_path` のファイルに, それ以外のときはMySQLのサーバーに保存する.
+    テーブルがなければ作成する.
+
+    Args:
+        database_info(dict | None, optional): database_info.yaml の内容. `None` のときはファイルから読み込む. default to None.
+
+    Returns:
+        HistoryStorage: 開いた保存先
+
+    Raises:
+        StorageUnavailableError: 保存先に接続できないときに生じる"""
+    if database_info is None:
+        database_info = load_database_info()
+    backend = database_info.get("storage_backend", MYSQL_BACKEND)
+    try:
+        if backend == SQLITE_BACKEND:
+            return SQLiteStorage(database_info.get("sqlite_path", DEFAULT_SQLITE_PATH))
+        if backend == MYSQL_BACKEND:
+            return MySQLStorage(database_info)
+    except DATABASE_ERRORS as error:
+        raise StorageUnavailableError(backend, error) from error
+    raise ValueError(f"unknown storage backend: {backend}")
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
 from enum import Enum
+import os
 
 from yaml import safe_load
 
 from boardgame import Player
 
+from engine import AlphaBetaEngine, Evaluator, evaluate
+from parallel_search import ParallelSearchEngine
+from mcts import MCTSEngine, DEFAULT_EXPLORATION
+from endgame import EndgameSolver
+from opening_book import OpeningBook
+from evaluation import PatternEvaluator
+
 
 CONFIG_FILE_PATH = "config.yaml"
 DATABASE_INFO_FILE_PATH = "database_info.yaml"
@@ -44,3 +52,86 @@ class OthelloPlayer(Player):
         super().__init__(name)
         self.color = color
         self.can_put: bool = True
+
+
+class ComputerPlayer(OthelloPlayer):
+    """コンピュータのプレイヤー
+
+    自身のターンになると `GameManager` が `engine` で探索し、自動的に石を置く.
+
+    Attributes:
+        engine(AlphaBetaEngine | ParallelSearchEngine): 着手を決めるための探索エンジン"""
+
+    def __init__(
+            self,
+            color: Color,
+            name: str | None = None,
+            engine: AlphaBetaEngine | ParallelSearchEngine | None = None,
+    ):
+        super().__init__(color, name)
+        if engine is None:
+            engine = create_engine()
+        self.engine: AlphaBetaEngine | ParallelSearchEngine | MCTSEngine = engine
+
+
+def create_evaluator() -> Evaluator:
+    """コンフィグに従って、探索に使う評価関数を作成する関数
+
+    `COMPUTER_EVALUATION` が `"pattern"` のときは、`EVALUATION_WEIGHTS_PATH` の重みを読み込む.
+    重みのファイルがないときは初期値の重みを使う."""
+    if CONFIG.get("COMPUTER_EVALUATION") != "pattern":
+        return evaluate
+    path = CONFIG.get("EVALUATION_WEIGHTS_PATH")
+    if path is None or not os.path.exists(path):
+        return PatternEvaluator.default()
+    return PatternEvaluator.load(path)
+
+
+def create_engine() -> AlphaBetaEngine | ParallelSearchEngine | MCTSEngine:
+    """コンフィグに従って、コンピュータの探索エンジンを作成する関数"""
+    if CONFIG.get("COMPUTER_SEARCH_MODE") == "mcts":
+        return MCTSEngine(
+            CONFIG["COMPUTER_TIME_BUDGET"],
+            exploration=CONFIG.get("MCTS_EXPLORATION", DEFAULT_EXPLORATION),
+            max_workers=CONFIG.get("COMPUTER_SEARCH_WORKERS"),
+            endgame_solver=EndgameSolver(CONFIG["ENDGAME_SOLVER_EMPTIES"]),
+        )
+    if CONFIG.get("COMPUTER_SEARCH_MODE") == "parallel":
+        return ParallelSearchEngine(
+            CONFIG["COMPUTER_TIME_BUDGET"],
+            max_workers=CONFIG.get("COMPUTER_SEARCH_WORKERS"),
+            evaluator=create_evaluator(),
+            endgame_solver=EndgameSolver(CONFIG["ENDGAME_SOLVER_EMPTIES"]),
+        )
+    return AlphaBetaEngine(
+        CONFIG["COMPUTER_TIME_BUDGET"],
+        evaluator=create_evaluator(),
+        endgame_solver=EndgameSolver(CONFIG["ENDGAME_SOLVER_EMPTIES"]),
+    )
+
+
+def open_opening_book() -> OpeningBook | None:
+    """コンフィグの `OPENING_BOOK_PATH` の定石ファイルを開く関数
+
+    Returns:
+        OpeningBook | None: 開いた定石. パスが指定されていないときや、ファイルがないときは `None`"""
+    path = CONFIG.get("OPENING_BOOK_PATH")
+    if path is None or not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def create_player(color: Color, name: str | None = None) -> OthelloPlayer:
+    """コンフィグに従って、指定の色のプレイヤーを作成する関数
+
+    `COMPUTER_PLAYER_COLOR` に指定された色のプレイヤーはコンピュータになる.
+
+    Args:
+        color(Color): プレイヤーの色
+        name(str | None, optional): プレイヤーの名前. default to None.
+
+    Returns:
+        OthelloPlayer: 作成したプレイヤー"""
+    if CONFIG.get("COMPUTER_PLAYER_COLOR") == color.name:
+        return ComputerPlayer(color, name)
+    return OthelloPlayer(color, name)
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor, wait
+from typing import Any, Callable
+import os
+import queue
+import threading
+from tkinter import Misc
+
+
+DISPATCH_POLL_INTERVAL_MS = 20
+DEFAULT_MAX_WORKERS = 2
+LOCK_POLL_INTERVAL = .05     # ロックを待つ処理が, 取り消されていないかを確認する間隔(秒)
+
+
+class TkDispatcher:
+    """別スレッドから受け取った処理を tkinter のメインスレッドで実行するクラス
+
+    tkinter のウィジェットはメインスレッド以外から操作できないので,
+    ワーカーは `post` でキューに処理を積み, メインスレッドが `after` で定期的に取り出して実行する.
+
+    Attributes:
+        master(Misc): `after` を呼び出すウィジェット
+        poll_interval_ms(int): キューを確認する間隔(ミリ秒)"""
+
+    def __init__(self, master: Misc, poll_interval_ms: int = DISPATCH_POLL_INTERVAL_MS):
+        self.master = master
+        self.poll_interval_ms: int = poll_interval_ms
+        self.__queue: queue.SimpleQueue[tuple[Callable, tuple]] = queue.SimpleQueue()
+        self.__after_id: str | None = None
+        self.start()
+
+    def post(self, callback: Callable[..., None], *args: Any):
+        """メインスレッドで実行する処理を積むメソッド. どのスレッドからでも呼び出せる.
+
+        Args:
+            callback(Callable[..., None]): 実行する処理
+            *args(Any): 処理に渡す引数"""
+        self.__queue.put((callback, args))
+
+    def start(self):
+        """キューの確認を開始するメソッド"""
+        if self.__after_id is None:
+            self.__poll()
+
+    def stop(self):
+        """キューの確認を停止するメソッド"""
+        if self.__after_id is not None:
+            self.master.after_cancel(self.__after_id)
+            self.__after_id = None
+
+    def __poll(self):
+        while True:
+            try:
+                callback, args = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        self.__after_id = self.master.after(self.poll_interval_ms, self.__poll)
+
+
+def _run_after(preceding: Task, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """`preceding` が終わるのを待ってから処理を実行する関数
+
+    実行前に取り消された処理はすぐに終わるので, さらにその前の処理が終わるのも待つ."""
+    task: Task | None = preceding
+    while task is not None:
+        wait([task.future])
+        task = task.preceding
+    return function(*args, **kwargs)
+
+
+def _run_locked(
+        lock: threading.Lock,
+        cancel_event: threading.Event,
+        function: Callable[..., Any],
+        /,
+        *args: Any,
+        **kwargs: Any,
+) -> Any:
+    """`lock` を取得してから処理を実行する関数
+
+    ロックを待つ間に取り消されたときは, 処理を実行せずに `None` を返してワーカーを空ける."""
+    while not lock.acquire(timeout=LOCK_POLL_INTERVAL):
+        if cancel_event.is_set():
+            return None
+    try:
+        if cancel_event.is_set():
+            return None
+        return function(*args, **kwargs)
+    finally:
+        lock.release()
+
+
+class Task:
+    """バックグラウンドで実行している処理を表すクラス
+
+    Attributes:
+        future(Future): 処理の実行結果
+        stop_event(threading.Event): 処理に中断を求めるためのイベント. スレッドで実行するときのみ処理に渡される
+        preceding(Task | None): 先に終わるのを待つ処理. 処理が実行されたあとは `None`"""
+
+    def __init__(self, future: Future, stop_event: threading.Event, preceding: Task | None = None):
+        self.future: Future = future
+        self.stop_event: threading.Event = stop_event
+        self.preceding: Task | None = preceding
+        self.__is_cancelled: bool = False
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.__is_cancelled
+
+    @property
+    def is_done(self) -> bool:
+        return self.future.done()
+
+    def cancel(self):
+        """処理を取り消すメソッド
+
+        取り消された処理の結果はメインスレッドに届けられない.
+        実行中の処理には `stop_event` で中断を求める."""
+        self.__is_cancelled = True
+        self.stop_event.set()
+        self.future.cancel()
+
+
+class TaskExecutor:
+    """時間のかかる処理をスレッドまたはプロセスで実行し, 結果をメインスレッドに届けるクラス
+
+    Attributes:
+        dispatcher(TkDispatcher): 結果をメインスレッドに届けるディスパッチャ
+        executor(Executor): 処理を実行するプール
+        use_processes(bool): プロセスで実行するかどうか"""
+
+    def __init__(
+            self,
+            dispatcher: TkDispatcher,
+            max_workers: int | None = DEFAULT_MAX_WORKERS,
+            use_processes: bool = False,
+    ):
+        """コンストラクタ
+
+        Args:
+            dispatcher(TkDispatcher): 結果をメインスレッドに届けるディスパッチャ
+            max_workers(int | None, optional): ワーカーの数. `None` のときはCPUのコア数. default to DEFAULT_MAX_WORKERS.
+            use_processes(bool, optional): スレッドではなくプロセスで実行するかどうか. default to False."""
+        self.dispatcher: TkDispatcher = dispatcher
+        self.use_processes: bool = use_processes
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if use_processes:
+            self.executor: Executor = ProcessPoolExecutor(max_workers)
+        else:
+            self.executor: Executor = ThreadPoolExecutor(max_workers)
+        self.__tasks: set[Task] = set()
+
+    def submit(
+            self,
+            function: Callable[..., Any],
+            *args: Any,
+            on_done: Callable[[Any], None] | None = None,
+            on_error: Callable[[BaseException], None] | None = None,
+            pass_stop_event: bool = False,
+            wait_for: Task | None = None,
+            lock: threading.Lock | None = None,
+    ) -> Task:
+        """処理をバックグラウンドで実行するメソッド
+
+        `on_done` と `on_error` はメインスレッドで呼び出される.
+
+        Args:
+            function(Callable[..., Any]): 実行する処理
+            *args(Any): 処理に渡す引数
+            on_done(Callable[[Any], None] | None, optional): 処理が終わったときに結果を受け取る関数. default to None.
+            on_error(Callable[[BaseException], None] | None, optional): 処理が例外を投げたときに呼ばれる関数. default to None.
+            pass_stop_event(bool, optional): 処理にキーワード引数 `stop_event` を渡すかどうか. default to False.
+            wait_for(Task | None, optional): 先に終わるのを待つ処理. 同じオブジェクトを使う処理が同時に動かないようにするときに指定する. スレッドで実行するときのみ使用できる. default to None.
+            lock(threading.Lock | None, optional): 実行中に保持するロック. 同じロックを渡した処理は1つずつ実行される. `wait_for` の処理が終わってから取得する. スレッドで実行するときのみ使用できる. default to None.
+
+        Returns:
+            Task: 実行中の処理"""
+        stop_event = threading.Event()
+        kwargs = {"stop_event": stop_event} if pass_stop_event and not self.use_processes else {}
+        if lock is not None:
+            function, args = _run_locked, (lock, stop_event, function, *args)
+        if wait_for is not None:
+            future = self.executor.submit(_run_after, wait_for, function, *args, **kwargs)
+        else:
+            future = self.executor.submit(function, *args, **kwargs)
+        task = Task(future, stop_event, wait_for)
+        self.__tasks.add(task)
+        future.add_done_callback(lambda _: self.__on_future_done(task, on_done, on_error))
+        return task
+
+    def __on_future_done(
+            self,
+            task: Task,
+            on_done: Callable[[Any], None] | None,
+            on_error: Callable[[BaseException], None] | None,
+    ):
+        """処理が終わったときに別スレッドから呼ばれるメソッド"""
+        # 実行された処理の前の処理は全て終わっているので, 待つ処理のつながりを切って解放する.
+        # 実行前に取り消された処理は, 後の処理がさらに前の処理を待てるようにつながりを残す
+        if not task.future.cancelled():
+            task.preceding = None
+        self.dispatcher.post(self.__deliver, task, on_done, on_error)
+
+    def cancel_all(self):
+        """実行中の全ての処理を取り消すメソッド"""
+        for task in list(self.__tasks):
+            task.cancel()
+
+    def shutdown(self):
+        """全ての処理を取り消し, プールを終了するメソッド"""
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.dispatcher.stop()
+
+    def __deliver(
+            self,
+            task: Task,
+            on_done: Callable[[Any], None] | None,
+            on_error: Callable[[BaseException], None] | None,
+    ):
+        """メインスレッドで処理の結果を届けるメソッド"""
+        self.__tasks.discard(task)
+        if task.is_cancelled or task.future.cancelled():
+            return
+        error = task.future.exception()
+        if error is not None:
+            if on_error is None:
+                raise error
+            on_error(error)
+        elif on_done is not None:
+            on_done(task.future.result())
@@ -0,0 +1,639 @@
+# エンジン同士の自己対戦
+# 2つのエンジンを, 同じ序盤から先手と後手を入れ替えて対戦させ, 結果を1局1行のログに書き出す.
+# 対局は tkinter を使わずにビットボードのルール(`GameManager` と同じく, 置けなければパス, 両者とも置けなければ終局)で進め,
+# プロセスプールで並列に実行する. 勝敗からレーティング差(Elo)と SPRT の対数尤度比を求め, 判定が出れば打ち切る.
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, TextIO
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+from bitboard import (
+    legal_moves,
+    play,
+    iter_squares,
+    to_notation,
+    from_notation,
+    INITIAL_BLACK,
+    INITIAL_WHITE,
+    SQUARE_COUNT,
+    PASS,
+)
+from engine import AlphaBetaEngine, SearchEngine, SearchResult, evaluate
+from endgame import EndgameSolver, DEFAULT_ENDGAME_EMPTIES
+from mcts import MCTSEngine, DEFAULT_EXPLORATION
+from evaluation import PatternEvaluator
+
+
+DEFAULT_GAMES = 100
+DEFAULT_TIME_CONTROL = "0.1"
+DEFAULT_RANDOM_PLIES = 8
+DEFAULT_LOG_PATH = "tournament.log"
+DEFAULT_REPORT_INTERVAL = 100
+DEFAULT_SPRT_ALPHA = .05
+DEFAULT_SPRT_BETA = .05
+PENDING_GAMES_PER_WORKER = 2     # ワーカーごとに先に投入しておく対局の数
+MIN_MOVES_TO_GO = 10     # 持ち時間を配分するときに見込む残りの手数の下限
+MAX_BUDGET_RATIO = .5     # 1手に使える, 残りの持ち時間の割合. 探索が持ち時間を少し超えても時間切れにならないようにする
+PASS_NOTATION = "ps"
+ENGINE_NAMES = ("A", "B")
+ELO_CONFIDENCE_Z = 1.96     # レーティング差の95%信頼区間
+
+
+@dataclass
+class TimeControl:
+    """持ち時間の設定を保持するデータクラス
+
+    `"0.1"` のように数値だけを指定すると1手ごとの持ち時間, `"60+0.5"` のように指定すると
+    1局の持ち時間と1手ごとに加算する時間になる.
+
+    Attributes:
+        base(float): 1手ごと, または1局の持ち時間(秒)
+        increment(float): 1手ごとに加算する時間(秒)
+        is_per_move(bool): 1手ごとの持ち時間かどうか"""
+    base: float
+    increment: float = 0.
+    is_per_move: bool = True
+
+    @classmethod
+    def parse(cls, text: str) -> TimeControl:
+        """文字列から持ち時間の設定を作成するメソッド
+
+        Raises:
+            ValueError: 文字列の形式が正しくないときに生じる"""
+        if "+" in text:
+            base, increment = text.split("+", 1)
+            return cls(float(base), float(increment), False)
+        return cls(float(text))
+
+    def __str__(self) -> str:
+        if self.is_per_move:
+            return f"{self.base:g}"
+        return f"{self.base:g}+{self.increment:g}"
+
+    def budget(self, remaining: float, empties: int) -> float:
+        """1手に使う時間を求めるメソッド
+
+        Args:
+            remaining(float): 残りの持ち時間(秒)
+            empties(int): 空きマスの数
+
+        Returns:
+            float: 1手に使う時間(秒)"""
+        if self.is_per_move:
+            return self.base
+        moves_to_go = max((empties + 1) // 2, MIN_MOVES_TO_GO)
+        return max(min(remaining / moves_to_go + self.increment, remaining * MAX_BUDGET_RATIO), 0.)
+
+
+class RandomEngine:
+    """置ける手から無作為に選ぶエンジン. 他のエンジンの強さの基準に使う"""
+
+    def __init__(self):
+        self.__random = random.Random()
+
+    def seed(self, seed: int):
+        """乱数の種を設定するメソッド"""
+        self.__random.seed(seed)
+
+    def search(
+            self,
+            player: int,
+            opponent: int,
+            root_moves: int | None = None,
+            stop_event=None,
+            time_budget: float | None = None,
+    ) -> SearchResult:
+        """置ける手から無作為に1つ選ぶメソッド"""
+        moves = legal_moves(player, opponent)
+        if root_moves is not None:
+            moves &= root_moves
+        if moves == 0:
+            return SearchResult(PASS, 0, 0, 0, 0.)
+        return SearchResult(self.__random.choice(list(iter_squares(moves))), 0, 0, 0, 0.)
+
+    def shutdown(self):
+        """エンジンが使っている資源を解放するメソッド. このエンジンでは何もしない"""
+
+
+def parse_engine_spec(spec: str) -> tuple[str, dict[str, str]]:
+    """エンジンの指定("種類:キー=値,キー=値")を種類と設定に分ける関数
+
+    Raises:
+        ValueError: 指定の形式が正しくないときに生じる"""
+    kind, _, options_text = spec.partition(":")
+    options = {}
+    for option in filter(None, options_text.split(",")):
+        key, separator, value = option.partition("=")
+        if not separator:
+            raise ValueError(f"invalid engine option: {option!r}")
+        options[key.strip()] = value.strip()
+    return kind.strip(), options
+
+
+def create_engine(spec: str) -> SearchEngine:
+    """エンジンの指定からエンジンを作成する関数
+
+    指定できるエンジンと設定は次のとおり.
+
+    - `alphabeta`: `depth` (最大の深さ), `eval` (`simple` / `pattern` / 重みのファイルのパス), `endgame` (読み切る空きマスの数. 0 で読み切らない)
+    - `mcts`: `exploration`, `batch`, `endgame`
+    - `random`
+
+    Args:
+        spec(str): エンジンの指定. 例えば `"alphabeta:eval=pattern,endgame=14"`
+
+    Returns:
+        SearchEngine: 作成したエンジン
+
+    Raises:
+        ValueError: 指定の形式が正しくないときに生じる"""
+    kind, options = parse_engine_spec(spec)
+    endgame_empties = int(options.pop("endgame", DEFAULT_ENDGAME_EMPTIES))
+    endgame_solver = EndgameSolver(endgame_empties) if endgame_empties > 0 else None
+    if kind == "alphabeta":
+        evaluation = options.pop("eval", "simple")
+        if evaluation == "simple":
+            evaluator = evaluate
+        else:
+            evaluator = PatternEvaluator.default() if evaluation == "pattern" else PatternEvaluator.load(evaluation)
+        engine_kwargs = {}
+        if "depth" in options:
+            engine_kwargs["max_depth"] = int(options.pop("depth"))
+        engine = AlphaBetaEngine(evaluator=evaluator, endgame_solver=endgame_solver, **engine_kwargs)
+    elif kind == "mcts":
+        batch_size = options.pop("batch", None)
+        engine = MCTSEngine(
+            exploration=float(options.pop("exploration", DEFAULT_EXPLORATION)),
+            batch_size=None if batch_size is None else int(batch_size),
+            max_workers=1,
+            endgame_solver=endgame_solver,
+        )
+    elif kind == "random":
+        engine = RandomEngine()
+    else:
+        raise ValueError(f"unknown engine: {kind!r}")
+    if options:
+        raise ValueError(f"unknown options for {kind}: {', '.join(options)}")
+    return engine
+
+
+def format_moves(moves: Iterable[int]) -> str:
+    """手の並びを棋譜の文字列("f5d6c3..."、パスは "ps")に変換する関数"""
+    return "".join(PASS_NOTATION if move == PASS else to_notation(move) for move in moves)
+
+
+def parse_moves(text: str) -> list[int]:
+    """棋譜の文字列("f5d6c3..."、パスは "ps")を手の並びに変換する関数
+
+    Raises:
+        ValueError: 文字列の形式が正しくないときに生じる"""
+    text = text.strip()
+    if len(text) % 2 != 0:
+        raise ValueError(f"invalid move list: {text!r}")
+    return [
+        PASS if text[i:i + 2].lower() == PASS_NOTATION else from_notation(text[i:i + 2])
+        for i in range(0, len(text), 2)
+    ]
+
+
+def load_openings(path: str) -> list[list[int]]:
+    """1行に1つの序盤の棋譜を書いたファイルを読み込む関数. 空行と `#` で始まる行は無視する"""
+    openings = []
+    with open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                openings.append(parse_moves(line))
+    return openings
+
+
+def random_openings(count: int, plies: int, seed: int | None = None) -> list[list[int]]:
+    """無作為に打った重複のない序盤を作成する関数
+
+    Args:
+        count(int): 作成する序盤の数
+        plies(int): 序盤の手数
+        seed(int | None, optional): 乱数の種. default to None.
+
+    Returns:
+        list[list[int]]: 序盤の手の並び. 作れる序盤が `count` より少ないときは作れた分だけ返す"""
+    generator = random.Random(seed)
+    openings: dict[tuple[int, int], list[int]] = {}
+    attempts = 0
+    while len(openings) < count and attempts < count * 10:
+        attempts += 1
+        player, opponent = INITIAL_BLACK, INITIAL_WHITE
+        moves = []
+        while len(moves) < plies:
+            candidates = legal_moves(player, opponent)
+            if candidates == 0:
+                break
+            move = generator.choice(list(iter_squares(candidates)))
+            player, opponent = play(player, opponent, move)
+            moves.append(move)
+        if len(moves) == plies and legal_moves(player, opponent):
+            openings.setdefault((player, opponent), moves)
+    return list(openings.values())
+
+
+@dataclass
+class GameResult:
+    """1局の結果を保持するデータクラス
+
+    Attributes:
+        game_id(int): 対局の番号
+        opening_index(int): 序盤の番号
+        black(str): 黒を持ったエンジンの名前
+        moves(list[int]): 序盤を含む全ての手. パスは `PASS`
+        disc_difference(int): 黒から見た終局時の石差
+        time_forfeit(str | None): 時間切れで負けたエンジンの名前
+        elapsed(float): 対局にかかった秒数"""
+    game_id: int
+    opening_index: int
+    black: str
+    moves: list[int] = field(default_factory=list)
+    disc_difference: int = 0
+    time_forfeit: str | None = None
+    elapsed: float = 0.
+
+    @property
+    def black_score(self) -> float:
+        """黒の勝ち点. 勝ちを1, 引き分けを0.5とする"""
+        if self.time_forfeit is not None:
+            return 0. if self.time_forfeit == self.black else 1.
+        if self.disc_difference == 0:
+            return .5
+        return 1. if self.disc_difference > 0 else 0.
+
+    def score_of(self, name: str) -> float:
+        """指定のエンジンの勝ち点"""
+        return self.black_score if name == self.black else 1. - self.black_score
+
+    def to_log_line(self) -> str:
+        """ログに書き出す1行の文字列. 対局番号, 序盤の番号, 黒のエンジン, 結果, 黒から見た石差, 棋譜の順"""
+        result = {1.: "1-0", .5: "1/2", 0.: "0-1"}[self.black_score]
+        if self.time_forfeit is not None:
+            result += "t"
+        return f"{self.game_id} {self.opening_index} {self.black} {result} {self.disc_difference:+d} {format_moves(self.moves)}"
+
+
+def play_game(
+        engines: dict[str, SearchEngine],
+        black: str,
+        opening: list[int],
+        time_control: TimeControl,
+        game_id: int = 0,
+        opening_index: int = 0,
+) -> GameResult:
+    """エンジン同士で1局対戦させる関数
+
+    Args:
+        engines(dict[str, SearchEngine]): 名前ごとのエンジン. 2つ指定する
+        black(str): 黒を持つエンジンの名前
+        opening(list[int]): 序盤の手の並び
+        time_control(TimeControl): 持ち時間
+        game_id(int, optional): 対局の番号. default to 0.
+        opening_index(int, optional): 序盤の番号. default to 0.
+
+    Returns:
+        GameResult: 対局の結果
+
+    Raises:
+        ValueError: 序盤やエンジンの手が置けない手だったときに生じる"""
+    start = time.perf_counter()
+    white = [name for name in engines if name != black][0]
+    result = GameResult(game_id, opening_index, black)
+    player, opponent = INITIAL_BLACK, INITIAL_WHITE
+    turn, waiting = black, white
+    clocks = {name: time_control.base for name in engines}
+
+    def advance(move: int):
+        nonlocal player, opponent, turn, waiting
+        if move == PASS:
+            player, opponent = opponent, player
+        else:
+            if not legal_moves(player, opponent) >> move & 1:
+                raise ValueError(f"illegal move {to_notation(move)} in game {game_id}")
+            player, opponent = play(player, opponent, move)
+        turn, waiting = waiting, turn
+        result.moves.append(move)
+
+    for move in opening:
+        if move != PASS and legal_moves(player, opponent) == 0:
+            advance(PASS)
+        advance(move)
+
+    while True:
+        if legal_moves(player, opponent) == 0:
+            if legal_moves(opponent, player) == 0:
+                break
+            advance(PASS)
+            continue
+        empties = SQUARE_COUNT - (player | opponent).bit_count()
+        move_start = time.perf_counter()
+        search_result = engines[turn].search(
+            player,
+            opponent,
+            time_budget=time_control.budget(clocks[turn], empties),
+        )
+        if not time_control.is_per_move:
+            clocks[turn] -= time.perf_counter() - move_start
+            if clocks[turn] < 0:
+                result.time_forfeit = turn
+                break
+            clocks[turn] += time_control.increment
+        advance(search_result.move)
+
+    black_discs, white_discs = (player, opponent) if turn == black else (opponent, player)
+    result.disc_difference = black_discs.bit_count() - white_discs.bit_count()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def elo_from_score(score: float) -> float:
+    """勝率からレーティング差を求める関数"""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_from_elo(elo: float) -> float:
+    """レーティング差から期待される勝率を求める関数"""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+@dataclass
+class MatchStats:
+    """エンジンAから見た対戦成績を保持するデータクラス
+
+    Attributes:
+        wins(int): 勝ち数
+        draws(int): 引き分け数
+        losses(int): 負け数
+        time_forfeits(int): 時間切れで決着した対局数"""
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    time_forfeits: int = 0
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    @property
+    def score(self) -> float:
+        """勝率. 引き分けは0.5勝とする"""
+        if self.games == 0:
+            return .5
+        return (self.wins + self.draws / 2) / self.games
+
+    @property
+    def variance(self) -> float:
+        """1局あたりの勝ち点の分散"""
+        if self.games == 0:
+            return 0.
+        score = self.score
+        return (
+            self.wins * (1 - score) ** 2
+            + self.draws * (.5 - score) ** 2
+            + self.losses * score ** 2
+        ) / self.games
+
+    def add(self, result: GameResult, name: str = ENGINE_NAMES[0]):
+        """対局の結果を加えるメソッド
+
+        Args:
+            result(GameResult): 対局の結果
+            name(str, optional): 成績を数えるエンジンの名前. default to ENGINE_NAMES[0]."""
+        score = result.score_of(name)
+        if score == 1.:
+            self.wins += 1
+        elif score == 0.:
+            self.losses += 1
+        else:
+            self.draws += 1
+        if result.time_forfeit is not None:
+            self.time_forfeits += 1
+
+    def elo(self) -> tuple[float, float]:
+        """レーティング差とその95%信頼区間の幅を返すメソッド. 全勝や全敗のときは幅を無限大とする"""
+        elo = elo_from_score(self.score)
+        if self.variance == 0:
+            return elo, math.inf
+        margin = ELO_CONFIDENCE_Z * math.sqrt(self.variance / self.games)
+        upper = elo_from_score(self.score + margin)
+        lower = elo_from_score(self.score - margin)
+        return elo, (upper - lower) / 2
+
+    def llr(self, elo0: float, elo1: float) -> float:
+        """SPRT の対数尤度比を返すメソッド
+
+        帰無仮説をレーティング差 `elo0`, 対立仮説を `elo1` とし, 勝ち点の分布を正規分布で近似する.
+
+        Args:
+            elo0(float): 帰無仮説のレーティング差
+            elo1(float): 対立仮説のレーティング差
+
+        Returns:
+            float: 対数尤度比"""
+        if self.variance == 0:
+            return 0.
+        score0 = score_from_elo(elo0)
+        score1 = score_from_elo(elo1)
+        return self.games * (score1 - score0) * (2 * self.score - score0 - score1) / (2 * self.variance)
+
+
+def sprt_bounds(alpha: float, beta: float) -> tuple[float, float]:
+    """SPRT の対数尤度比の下限と上限を返す関数
+
+    Args:
+        alpha(float): 第一種の過誤の確率
+        beta(float): 第二種の過誤の確率"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+_worker_engines: dict[str, SearchEngine] = {}
+
+
+def _init_worker(specs: tuple[str, str]):
+    """ワーカープロセスの初期化. エンジンはプロセスごとに一度だけ作成する"""
+    global _worker_engines
+    _worker_engines = {name: create_engine(spec) for name, spec in zip(ENGINE_NAMES, specs)}
+
+
+def _play_job(
+        game_id: int,
+        opening_index: int,
+        opening: list[int],
+        black: str,
+        time_control: TimeControl,
+) -> GameResult:
+    """ワーカープロセスで1局対戦させる関数
+
+    前の対局の置換表は消し, 乱数の種は対局の番号にするので, 同じ条件の対局は同じ結果になる."""
+    for engine in _worker_engines.values():
+        transposition_table = getattr(engine, "transposition_table", None)
+        if transposition_table is not None:
+            transposition_table.clear()
+        if hasattr(engine, "seed"):
+            engine.seed(game_id)
+    return play_game(_worker_engines, black, opening, time_control, game_id, opening_index)
+
+
+def iter_jobs(openings: list[list[int]], games: int) -> Iterator[tuple[int, int, list[int], str]]:
+    """対局の番号, 序盤の番号, 序盤, 黒のエンジンの名前を順に返すジェネレータ
+
+    序盤ごとに先手と後手を入れ替えた2局を組にし, 序盤が足りなければ最初から繰り返す."""
+    for game_id in range(games):
+        pair, second = divmod(game_id, 2)
+        opening_index = pair % len(openings)
+        yield game_id, opening_index, openings[opening_index], ENGINE_NAMES[second]
+
+
+def format_summary(
+        stats: MatchStats,
+        elapsed: float,
+        sprt: tuple[float, float] | None,
+        bounds: tuple[float, float],
+) -> str:
+    """対戦成績の要約の文字列を作成する関数"""
+    elo, margin = stats.elo()
+    games_per_hour = stats.games / elapsed * 3600 if elapsed > 0 else 0.
+    text = (
+        f"games {stats.games} +{stats.wins} ={stats.draws} -{stats.losses} "
+        f"score {stats.score:.3f} elo {elo:+.1f} +/- {margin:.1f} "
+        f"({games_per_hour:.0f} games/h)"
+    )
+    if stats.time_forfeits:
+        text += f" time forfeits {stats.time_forfeits}"
+    if sprt is not None:
+        text += f" llr {stats.llr(*sprt):.2f} [{bounds[0]:.2f}, {bounds[1]:.2f}]"
+    return text
+
+
+def run_tournament(
+        specs: tuple[str, str],
+        openings: list[list[int]],
+        games: int,
+        time_control: TimeControl,
+        log: TextIO,
+        workers: int | None = None,
+        sprt: tuple[float, float] | None = None,
+        sprt_alpha: float = DEFAULT_SPRT_ALPHA,
+        sprt_beta: float = DEFAULT_SPRT_BETA,
+        report_interval: int = DEFAULT_REPORT_INTERVAL,
+        output: TextIO = sys.stdout,
+) -> MatchStats:
+    """エンジンAとBを対戦させ, 結果をログに書き出す関数
+
+    終わった対局から順にログに書き出す. 実行中の対局の数はワーカーの数の数倍に抑え,
+    SPRT の判定が出た時点で残りの対局を取り消す.
+
+    Args:
+        specs(tuple[str, str]): エンジンAとBの指定
+        openings(list[list[int]]): 序盤
+        games(int): 対局数
+        time_control(TimeControl): 持ち時間
+        log(TextIO): 1局1行のログの書き出し先
+        workers(int | None, optional): ワーカーの数. `None` のときはCPUのコア数. default to None.
+        sprt(tuple[float, float] | None, optional): SPRT の帰無仮説と対立仮説のレーティング差. default to None.
+        sprt_alpha(float, optional): SPRT の第一種の過誤の確率. default to DEFAULT_SPRT_ALPHA.
+        sprt_beta(float, optional): SPRT の第二種の過誤の確率. default to DEFAULT_SPRT_BETA.
+        report_interval(int, optional): 途中経過を表示する対局の間隔. default to DEFAULT_REPORT_INTERVAL.
+        output(TextIO, optional): 途中経過の表示先. default to sys.stdout.
+
+    Returns:
+        MatchStats: エンジンAから見た対戦成績"""
+    if not openings:
+        raise ValueError("no openings to play")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    stats = MatchStats()
+    bounds = sprt_bounds(sprt_alpha, sprt_beta)
+    start = time.perf_counter()
+    log.write(f"# A={specs[0]} B={specs[1]} tc={time_control}\n")
+
+    jobs = iter_jobs(openings, games)
+    pending: set[Future] = set()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(specs,)) as pool:
+        is_decided = False
+        while True:
+            while not is_decided and len(pending) < workers * PENDING_GAMES_PER_WORKER:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending.add(pool.submit(_play_job, *job, time_control))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                result: GameResult = future.result()
+                stats.add(result)
+                log.write(result.to_log_line() + "\n")
+                log.flush()
+                if stats.games % report_interval == 0:
+                    print(format_summary(stats, time.perf_counter() - start, sprt, bounds), file=output, flush=True)
+                if sprt is not None and not is_decided:
+                    llr = stats.llr(*sprt)
+                    if llr <= bounds[0] or llr >= bounds[1]:
+                        is_decided = True
+                        for other in pending:
+                            other.cancel()
+    print(format_summary(stats, time.perf_counter() - start, sprt, bounds), file=output)
+    if sprt is not None:
+        llr = stats.llr(*sprt)
+        verdict = "H1 accepted" if llr >= bounds[1] else "H0 accepted" if llr <= bounds[0] else "inconclusive"
+        print(f"sprt elo0={sprt[0]:g} elo1={sprt[1]:g}: {verdict}", file=output)
+    return stats
+
+
+def main():
+    """エンジン同士を自己対戦させるコマンド"""
+    parser = argparse.ArgumentParser(description="エンジン同士を自己対戦させ, 結果とレーティング差を表示する")
+    parser.add_argument("engine_a", help='エンジンAの指定. 例えば "alphabeta:eval=pattern", "mcts:exploration=1.2", "random"')
+    parser.add_argument("engine_b", help="エンジンBの指定")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="対局数. 先手と後手を入れ替えた2局を1組とする")
+    parser.add_argument("--tc", default=DEFAULT_TIME_CONTROL, help='持ち時間. "0.1" は1手0.1秒, "60+0.5" は1局60秒と1手ごとに0.5秒')
+    parser.add_argument("--openings", help="1行に1つの序盤の棋譜(例: f5d6c3)を書いたファイル")
+    parser.add_argument("--random-plies", type=int, default=DEFAULT_RANDOM_PLIES, help="序盤のファイルがないときに無作為に打つ手数")
+    parser.add_argument("--seed", type=int, default=None, help="無作為な序盤を作る乱数の種")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカーのプロセス数. 省略するとCPUのコア数")
+    parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="1局1行のログのパス")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"), help="SPRT の帰無仮説と対立仮説のレーティング差")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_SPRT_ALPHA, help="SPRT の第一種の過誤の確率")
+    parser.add_argument("--beta", type=float, default=DEFAULT_SPRT_BETA, help="SPRT の第二種の過誤の確率")
+    parser.add_argument("--report", type=int, default=DEFAULT_REPORT_INTERVAL, help="途中経過を表示する対局の間隔")
+    args = parser.parse_args()
+
+    specs = (args.engine_a, args.engine_b)
+    for spec in specs:
+        create_engine(spec).shutdown()
+    if args.openings is not None:
+        openings = load_openings(args.openings)
+    else:
+        openings = random_openings((args.games + 1) // 2, args.random_plies, args.seed)
+    with open(args.log, "a") as log:
+        run_tournament(
+            specs,
+            openings,
+            args.games,
+            TimeControl.parse(args.tc),
+            log,
+            workers=args.workers,
+            sprt=None if args.sprt is None else tuple(args.sprt),
+            sprt_alpha=args.alpha,
+            sprt_beta=args.beta,
+            report_interval=args.report,
+        )
+
+
+if __name__ == "__main__":
+    main()